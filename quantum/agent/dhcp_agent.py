@@ -58,6 +58,12 @@ class DhcpAgent(manager.Manager):
         cfg.StrOpt('dhcp_driver',
                    default='quantum.agent.linux.dhcp.Dnsmasq',
                    help=_("The driver used to manage the DHCP server.")),
+        cfg.IntOpt('num_sync_threads', default=4,
+                   help=_("Number of threads to use during sync process.")),
+        cfg.IntOpt('reload_allocations_interval', default=1,
+                   help=_("Interval in seconds between two reloads of the "
+                          "allocations of a network on port events. "
+                          "0 reloads on every event.")),
         cfg.BoolOpt('use_namespaces', default=True,
                     help=_("Allow overlapping IP.")),
         cfg.BoolOpt('enable_isolated_metadata', default=False,
@@ -71,6 +77,8 @@ class DhcpAgent(manager.Manager):
     def __init__(self, host=None):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync = False
+        # ids of the networks waiting for a reload of their allocations
+        self.pending_reloads = set()
         self.conf = cfg.CONF
         self.cache = NetworkCache()
         self.root_helper = config.get_root_helper(self.conf)
@@ -142,7 +150,11 @@ class DhcpAgent(manager.Manager):
             LOG.exception(_('Unable to update lease'))
 
     def sync_state(self):
-        """Sync the local DHCP state with Quantum."""
+        """Sync the local DHCP state with Quantum.
+
+        Only the networks whose revision differs from the cached one are
+        retrieved, in a single call, and they are configured concurrently.
+        """
         LOG.info(_('Synchronizing state'))
         known_networks = set(self.cache.get_network_ids())
 
@@ -151,12 +163,44 @@ class DhcpAgent(manager.Manager):
             for deleted_id in known_networks - active_networks:
                 self.disable_dhcp_helper(deleted_id)
 
-            for network_id in active_networks:
-                self.refresh_dhcp_helper(network_id)
+            revisions = {}
+            for network_id in active_networks & known_networks:
+                network = self.cache.get_network_by_id(network_id)
+                revision = getattr(network, 'revision', None)
+                if revision:
+                    revisions[network_id] = revision
+            try:
+                networks = self.plugin_rpc.get_networks_info(
+                    list(active_networks), revisions)
+            except AttributeError:
+                # This means the server does not support get_networks_info
+                LOG.debug(_('Quantum server does not support bulk network '
+                            'info retrieval, refreshing networks one by one'))
+                for network_id in active_networks:
+                    self.refresh_dhcp_helper(network_id)
+                return
+
+            pool = eventlet.GreenPool(self.conf.num_sync_threads)
+            for network in networks:
+                pool.spawn_n(self.configure_dhcp_for_network, network)
+            pool.waitall()
         except Exception:
             self.needs_resync = True
             LOG.exception(_('Unable to sync network state.'))
 
+    def configure_dhcp_for_network(self, network):
+        """Enable or refresh DHCP for a network retrieved from Quantum."""
+        try:
+            old_network = self.cache.get_network_by_id(network.id)
+            if old_network:
+                self._refresh_dhcp(old_network, network)
+            else:
+                self._enable_dhcp(network)
+        except Exception:
+            self.needs_resync = True
+            LOG.exception(_('Unable to configure DHCP for network %s.'),
+                          network.id)
+
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
         while True:
@@ -177,7 +221,9 @@ class DhcpAgent(manager.Manager):
             self.needs_resync = True
             LOG.exception(_('Network %s RPC info call failed.'), network_id)
             return
+        self._enable_dhcp(network)
 
+    def _enable_dhcp(self, network):
         if not network.admin_state_up:
             return
 
@@ -213,13 +259,17 @@ class DhcpAgent(manager.Manager):
             self.needs_resync = True
             LOG.exception(_('Network %s RPC info call failed.'), network_id)
             return
+        self._refresh_dhcp(old_network, network)
 
+    def _refresh_dhcp(self, old_network, network):
         old_cidrs = set(s.cidr for s in old_network.subnets if s.enable_dhcp)
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
         if new_cidrs and old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
-            self.cache.put(network)
+            # The cached network keeps its previous revision when the
+            # reload fails, so that the next resync retries it
+            if self.call_driver('reload_allocations', network):
+                self.cache.put(network)
         elif new_cidrs:
             if self.call_driver('restart', network):
                 self.cache.put(network)
@@ -270,7 +320,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload_allocations(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -282,6 +332,27 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
+            self.schedule_reload_allocations(network)
+
+    def schedule_reload_allocations(self, network):
+        """Reload the allocations of a network after port events.
+
+        The events received within reload_allocations_interval are applied
+        to the cache and coalesced into a single reload.
+        """
+        interval = self.conf.reload_allocations_interval
+        if not interval:
+            self.call_driver('reload_allocations', network)
+        elif network.id not in self.pending_reloads:
+            self.pending_reloads.add(network.id)
+            eventlet.spawn_after(interval, self._reload_allocations,
+                                 network.id)
+
+    @lockutils.synchronized('agent', 'dhcp-')
+    def _reload_allocations(self, network_id):
+        self.pending_reloads.discard(network_id)
+        network = self.cache.get_network_by_id(network_id)
+        if network:
             self.call_driver('reload_allocations', network)
 
     def enable_isolated_metadata_proxy(self, network):
@@ -366,6 +437,20 @@ class DhcpPluginApi(proxy.RpcProxy):
                                                  host=self.host),
                                    topic=self.topic))
 
+    def get_networks_info(self, network_ids, revisions):
+        """Make a remote process call to retrieve several networks info.
+
+        The networks whose revision is the one given in revisions are
+        omitted from the result.
+        """
+        networks = self.call(self.context,
+                             self.make_msg('get_networks_info',
+                                           network_ids=network_ids,
+                                           revisions=revisions,
+                                           host=self.host),
+                             topic=self.topic)
+        return [DictModel(network) for network in networks]
+
     def get_dhcp_port(self, network_id, device_id):
         """Make a remote process call to create the dhcp port."""
         return DictModel(self.call(self.context,
@@ -84,6 +84,14 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_members(self, sg_members):
+        """Update the members of remote security groups.
+
+        Drivers matching remote groups by their members, rather than by
+        the rules expanded by the server, should implement this method.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -17,6 +17,10 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import heapq
+import itertools
+import time
+
 import eventlet
 from eventlet import semaphore
 import netaddr
@@ -48,6 +52,9 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
+# Routers updated through RPC go before the ones of a full resync
+PRIORITY_RPC = 0
+PRIORITY_SYNC = 1
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -94,6 +101,9 @@ class RouterInfo(object):
         self.ex_gw_port = None
         self.internal_ports = []
         self.floating_ips = []
+        # revision of the router state applied, None if the server does
+        # not send revisions
+        self.revision = None
         self.root_helper = root_helper
         self.use_namespaces = use_namespaces
         self.router = router
@@ -109,8 +119,65 @@ class RouterInfo(object):
             return NS_PREFIX + self.router_id
 
 
+class RouterUpdateQueue(object):
+    """Updates of routers waiting to be processed, most urgent first.
+
+    The updates of a router are handed out together and in the order they
+    were queued, and never while the previous ones of the same router are
+    still being processed, so that a router is only processed by one
+    worker at a time.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        # router id => list of updates
+        self._updates = {}
+        # router id => most urgent priority of its updates
+        self._priorities = {}
+        self._busy = set()
+
+    def __len__(self):
+        return sum(len(updates) for updates in self._updates.itervalues())
+
+    def add(self, router_id, priority, update):
+        self._updates.setdefault(router_id, []).append(update)
+        current = self._priorities.get(router_id)
+        if current is None or priority < current:
+            self._priorities[router_id] = priority
+            if router_id not in self._busy:
+                self._push(router_id)
+
+    def _push(self, router_id):
+        heapq.heappush(self._heap, (self._priorities[router_id],
+                                    self._counter.next(), router_id))
+
+    def pop(self):
+        """Return a router id and its updates, or (None, []) if none."""
+        while self._heap:
+            router_id = heapq.heappop(self._heap)[2]
+            # the router may have been pushed again with a higher priority
+            if router_id in self._busy or router_id not in self._updates:
+                continue
+            self._busy.add(router_id)
+            del self._priorities[router_id]
+            return router_id, self._updates.pop(router_id)
+        return None, []
+
+    def done(self, router_id):
+        """Release a router returned by pop once its updates are processed."""
+        self._busy.discard(router_id)
+        if router_id in self._updates:
+            self._push(router_id)
+
+
 class L3NATAgent(manager.Manager):
 
+    # history
+    #   1.0 Initial version
+    #   1.1 Added router_delta_updated
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.StrOpt('external_network_bridge', default='br-ex',
                    help=_("Name of bridge used for external network "
@@ -139,6 +206,8 @@ class L3NATAgent(manager.Manager):
         cfg.StrOpt('gateway_external_network_id', default='',
                    help=_("UUID of external network for routers implemented "
                           "by the agents.")),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers processed concurrently.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -163,6 +232,14 @@ class L3NATAgent(manager.Manager):
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
         self.sync_sem = semaphore.Semaphore(1)
+        self.router_queue = RouterUpdateQueue()
+        self.router_pool = eventlet.GreenPool(
+            self.conf.router_processing_workers)
+        # seconds between the queueing and the end of the processing of
+        # the router updates, since the last state report
+        self.update_latency_sum = 0.0
+        self.update_latency_max = 0.0
+        self.updates_processed = 0
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
         super(L3NATAgent, self).__init__(host=self.conf.host)
@@ -287,6 +364,14 @@ class L3NATAgent(manager.Manager):
         port['ip_cidr'] = "%s/%s" % (ips[0]['ip_address'], prefixlen)
 
     def process_router(self, ri):
+        # all the NAT rules of the router are applied at once
+        ri.iptables_manager.defer_apply_on()
+        try:
+            self._process_router(ri)
+        finally:
+            ri.iptables_manager.defer_apply_off()
+
+    def _process_router(self, ri):
 
         ex_gw_port = self._get_ex_gw_port(ri)
         internal_ports = ri.router.get(l3_constants.INTERFACE_KEY, [])
@@ -328,45 +413,128 @@ class L3NATAgent(manager.Manager):
         self.routes_updated(ri)
 
     def process_router_floating_ips(self, ri, ex_gw_port):
+        """Make the floating IPs configured match the ones of ri.router.
+
+        ex_gw_port is None when the gateway of the router was removed, in
+        which case only the NAT rules of the floating IPs are removed.
+        """
         floating_ips = ri.router.get(l3_constants.FLOATINGIP_KEY, [])
-        existing_floating_ip_ids = set([fip['id'] for fip in ri.floating_ips])
-        cur_floating_ip_ids = set([fip['id'] for fip in floating_ips])
-
-        id_to_fip_map = {}
-
-        for fip in floating_ips:
-            if fip['port_id']:
-                if fip['id'] not in existing_floating_ip_ids:
-                    ri.floating_ips.append(fip)
-                    self.floating_ip_added(ri, ex_gw_port,
-                                           fip['floating_ip_address'],
-                                           fip['fixed_ip_address'])
-
-                # store to see if floatingip was remapped
-                id_to_fip_map[fip['id']] = fip
-
-        floating_ip_ids_to_remove = (existing_floating_ip_ids -
-                                     cur_floating_ip_ids)
-        for fip in ri.floating_ips:
-            if fip['id'] in floating_ip_ids_to_remove:
-                ri.floating_ips.remove(fip)
-                self.floating_ip_removed(ri, ri.ex_gw_port,
-                                         fip['floating_ip_address'],
-                                         fip['fixed_ip_address'])
-            else:
-                # handle remapping of a floating IP
-                new_fip = id_to_fip_map[fip['id']]
-                new_fixed_ip = new_fip['fixed_ip_address']
-                existing_fixed_ip = fip['fixed_ip_address']
-                if (new_fixed_ip and existing_fixed_ip and
-                        new_fixed_ip != existing_fixed_ip):
-                    floating_ip = fip['floating_ip_address']
-                    self.floating_ip_removed(ri, ri.ex_gw_port,
-                                             floating_ip, existing_fixed_ip)
-                    self.floating_ip_added(ri, ri.ex_gw_port,
-                                           floating_ip, new_fixed_ip)
-                    ri.floating_ips.remove(fip)
-                    ri.floating_ips.append(new_fip)
+        id_to_fip_map = dict((fip['id'], fip) for fip in floating_ips
+                             if fip['port_id'])
+        # a remapped floating IP is removed and added again
+        removed = [fip for fip in ri.floating_ips
+                   if fip['id'] not in id_to_fip_map or
+                   id_to_fip_map[fip['id']]['fixed_ip_address'] !=
+                   fip['fixed_ip_address']]
+        kept_ids = (set([fip['id'] for fip in ri.floating_ips]) -
+                    set([fip['id'] for fip in removed]))
+        added = [fip for fip in id_to_fip_map.values()
+                 if fip['id'] not in kept_ids]
+        self._update_floating_ips(ri, ex_gw_port, removed, added)
+
+    def _update_floating_ips(self, ri, ex_gw_port, removed, added):
+        """Remove and add floating IPs of a router in one batch.
+
+        The addresses are changed with a single request to the root
+        helper, the NAT rules with a single iptables apply, and the
+        gratuitous ARPs for the new addresses are sent in the background.
+        """
+        if not removed and not added:
+            return
+        nat = ri.iptables_manager.ipv4['nat']
+        removed_cidrs = set()
+        for fip in removed:
+            ri.floating_ips.remove(fip)
+            for chain, rule in self.floating_forward_rules(
+                    fip['floating_ip_address'], fip['fixed_ip_address']):
+                nat.remove_rule(chain, rule)
+            removed_cidrs.add(fip['floating_ip_address'] + '/32')
+        if not ex_gw_port:
+            # the gateway device, and its addresses, are gone
+            ri.iptables_manager.apply()
+            return
+        added_cidrs = set()
+        for fip in added:
+            ri.floating_ips.append(fip)
+            for chain, rule in self.floating_forward_rules(
+                    fip['floating_ip_address'], fip['fixed_ip_address']):
+                nat.add_rule(chain, rule)
+            added_cidrs.add(fip['floating_ip_address'] + '/32')
+
+        interface_name = self.get_external_device_name(ex_gw_port['id'])
+        device = ip_lib.IPDevice(interface_name, self.root_helper,
+                                 namespace=ri.ns_name())
+        existing_cidrs = set([addr['cidr'] for addr in device.addr.list()])
+        # the address of a remapped floating IP is kept
+        deleted_cidrs = sorted((removed_cidrs - added_cidrs) & existing_cidrs)
+        new_cidrs = sorted(added_cidrs - existing_cidrs)
+        # the broadcast address of a /32 is the address itself
+        device.addr.update(
+            adds=[(netaddr.IPNetwork(ip_cidr).version, ip_cidr,
+                   ip_cidr.split('/')[0]) for ip_cidr in new_cidrs],
+            deletes=[(netaddr.IPNetwork(ip_cidr).version, ip_cidr)
+                     for ip_cidr in deleted_cidrs])
+        ri.iptables_manager.apply()
+        for ip_cidr in new_cidrs:
+            eventlet.spawn_n(self._send_gratuitous_arp_packet, ri,
+                             interface_name, ip_cidr.split('/')[0])
+
+    def _process_router_delta(self, ri, delta):
+        """Apply the interfaces and floating IPs changed on a router.
+
+        Only the items of the delta are processed, and ri.router is patched
+        to be the same as the router returned by a full sync.
+        """
+        ex_gw_port = ri.ex_gw_port
+        interfaces = delta.get(l3_constants.INTERFACE_KEY)
+        if interfaces:
+            removed_ids = set(interfaces.get('removed', []))
+            updated = interfaces.get('updated', [])
+            for p in [p for p in ri.internal_ports
+                      if p['id'] in removed_ids]:
+                ri.internal_ports.remove(p)
+                self.internal_network_removed(ri, ex_gw_port, p['id'],
+                                              p['ip_cidr'])
+            existing_port_ids = set([p['id'] for p in ri.internal_ports])
+            for p in updated:
+                if p['id'] in existing_port_ids or not p['admin_state_up']:
+                    continue
+                self._set_subnet_info(p)
+                ri.internal_ports.append(p)
+                self.internal_network_added(ri, ex_gw_port,
+                                            p['network_id'], p['id'],
+                                            p['ip_cidr'], p['mac_address'])
+            self._patch_router_items(ri, l3_constants.INTERFACE_KEY,
+                                     removed_ids, updated)
+
+        floating_ips = delta.get(l3_constants.FLOATINGIP_KEY)
+        if floating_ips:
+            removed_ids = set(floating_ips.get('removed', []))
+            updated = floating_ips.get('updated', [])
+            if ex_gw_port:
+                id_to_fip_map = dict((fip['id'], fip) for fip in updated
+                                     if fip['port_id'])
+                removed = []
+                for fip in ri.floating_ips:
+                    new_fip = id_to_fip_map.get(fip['id'])
+                    remapped = (new_fip and new_fip['fixed_ip_address'] !=
+                                fip['fixed_ip_address'])
+                    if fip['id'] in removed_ids or remapped:
+                        removed.append(fip)
+                kept_ids = (set([fip['id'] for fip in ri.floating_ips]) -
+                            set([fip['id'] for fip in removed]))
+                added = [fip for fip in id_to_fip_map.values()
+                         if fip['id'] not in kept_ids]
+                self._update_floating_ips(ri, ex_gw_port, removed, added)
+            self._patch_router_items(ri, l3_constants.FLOATINGIP_KEY,
+                                     removed_ids, updated)
+
+    def _patch_router_items(self, ri, key, removed_ids, updated):
+        updated_ids = set([item['id'] for item in updated])
+        items = [item for item in ri.router.get(key, [])
+                 if item['id'] not in removed_ids and
+                 item['id'] not in updated_ids]
+        ri.router[key] = items + updated
 
     def _get_ex_gw_port(self, ri):
         return ri.router.get('gw_port')
@@ -512,34 +680,6 @@ class L3NATAgent(manager.Manager):
                  (internal_cidr, ex_gw_ip))]
         return rules
 
-    def floating_ip_added(self, ri, ex_gw_port, floating_ip, fixed_ip):
-        ip_cidr = str(floating_ip) + '/32'
-        interface_name = self.get_external_device_name(ex_gw_port['id'])
-        device = ip_lib.IPDevice(interface_name, self.root_helper,
-                                 namespace=ri.ns_name())
-
-        if ip_cidr not in [addr['cidr'] for addr in device.addr.list()]:
-            net = netaddr.IPNetwork(ip_cidr)
-            device.addr.add(net.version, ip_cidr, str(net.broadcast))
-            self._send_gratuitous_arp_packet(ri, interface_name, floating_ip)
-
-        for chain, rule in self.floating_forward_rules(floating_ip, fixed_ip):
-            ri.iptables_manager.ipv4['nat'].add_rule(chain, rule)
-        ri.iptables_manager.apply()
-
-    def floating_ip_removed(self, ri, ex_gw_port, floating_ip, fixed_ip):
-        ip_cidr = str(floating_ip) + '/32'
-        net = netaddr.IPNetwork(ip_cidr)
-        interface_name = self.get_external_device_name(ex_gw_port['id'])
-
-        device = ip_lib.IPDevice(interface_name, self.root_helper,
-                                 namespace=ri.ns_name())
-        device.addr.delete(net.version, ip_cidr)
-
-        for chain, rule in self.floating_forward_rules(floating_ip, fixed_ip):
-            ri.iptables_manager.ipv4['nat'].remove_rule(chain, rule)
-        ri.iptables_manager.apply()
-
     def floating_forward_rules(self, floating_ip, fixed_ip):
         return [('PREROUTING', '-d %s -j DNAT --to %s' %
                  (floating_ip, fixed_ip)),
@@ -551,14 +691,8 @@ class L3NATAgent(manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         with self.sync_sem:
-            if router_id in self.router_info:
-                try:
-                    self._router_removed(router_id)
-                except Exception:
-                    msg = _("Failed dealing with router "
-                            "'%s' deletion RPC message")
-                    LOG.debug(msg, router_id)
-                    self.fullsync = True
+            self._queue_router_update(router_id, PRIORITY_RPC,
+                                      self._remove_router, router_id)
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -572,13 +706,96 @@ class L3NATAgent(manager.Manager):
                 LOG.debug(msg)
                 self.fullsync = True
 
+    def router_delta_updated(self, context, payload):
+        """Deal with the changes of a router interfaces and floating IPs."""
+        with self.sync_sem:
+            self._queue_router_update(payload['router_id'], PRIORITY_RPC,
+                                      self._apply_router_delta,
+                                      payload['router_id'],
+                                      payload['revision'], payload['delta'])
+
     def router_removed_from_agent(self, context, payload):
         self.router_deleted(context, payload['router_id'])
 
     def router_added_to_agent(self, context, payload):
         self.routers_updated(context, payload)
 
-    def _process_routers(self, routers, all_routers=False):
+    def _queue_router_update(self, router_id, priority, func, *args):
+        self.router_queue.add(router_id, priority, (func, args, time.time()))
+        if self.router_pool.free():
+            self.router_pool.spawn_n(self._process_router_queue)
+
+    def _process_router_queue(self):
+        """Process the queued router updates until there are none left."""
+        while True:
+            router_id, updates = self.router_queue.pop()
+            if router_id is None:
+                return
+            try:
+                for func, args, queued_at in updates:
+                    try:
+                        func(*args)
+                    except Exception:
+                        LOG.exception(_("Failed processing router %s"),
+                                      router_id)
+                        self.fullsync = True
+                    latency = time.time() - queued_at
+                    self.update_latency_sum += latency
+                    self.update_latency_max = max(self.update_latency_max,
+                                                  latency)
+                    self.updates_processed += 1
+            finally:
+                self.router_queue.done(router_id)
+
+    def _remove_router(self, router_id):
+        if router_id in self.router_info:
+            self._router_removed(router_id)
+
+    def _update_router(self, router):
+        if router['id'] not in self.router_info:
+            self._router_added(router['id'], router)
+        ri = self.router_info[router['id']]
+        revision = router.get('revision')
+        if (revision is not None and ri.revision is not None and
+            revision < ri.revision):
+            # a late notification, the deltas applied since are newer
+            return
+        ri.router = router
+        self.process_router(ri)
+        ri.revision = revision
+
+    def _apply_router_delta(self, router_id, revision, delta):
+        ri = self.router_info.get(router_id)
+        if not ri or ri.revision is None:
+            # the router is not handled by this agent
+            return
+        if revision <= ri.revision:
+            LOG.debug(_("Ignoring revision %(revision)s of router "
+                        "%(router_id)s, already at %(current)s"),
+                      {'revision': revision, 'router_id': router_id,
+                       'current': ri.revision})
+            return
+        if revision > ri.revision + 1:
+            LOG.info(_("Missed revisions of router %(router_id)s "
+                       "before %(revision)s, synchronizing routers"),
+                     {'revision': revision, 'router_id': router_id})
+            self.fullsync = True
+            return
+        ri.iptables_manager.defer_apply_on()
+        try:
+            self._process_router_delta(ri, delta)
+        finally:
+            ri.iptables_manager.defer_apply_off()
+        ri.revision = revision
+
+    def _process_routers(self, routers, all_routers=False,
+                         priority=PRIORITY_RPC):
+        """Queue the processing of routers.
+
+        The routers which are not to be handled by the agent are removed,
+        as are the routers the agent has which are not in routers if they
+        are all the routers of the agent.
+        """
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
@@ -590,12 +807,13 @@ class L3NATAgent(manager.Manager):
         # starting or when error occurs during running), we seek the
         # routers which should be removed.
         # If routers are from server side notification, we seek them
-        # from subset of incoming routers and ones we have now.
+        # from the incoming routers, including the ones still queued to be
+        # added.
         if all_routers:
             prev_router_ids = set(self.router_info)
         else:
-            prev_router_ids = set(self.router_info) & set(
-                [router['id'] for router in routers])
+            prev_router_ids = set()
+        prev_router_ids.update([router['id'] for router in routers])
         cur_router_ids = set()
         for r in routers:
             if not r['admin_state_up']:
@@ -614,14 +832,12 @@ class L3NATAgent(manager.Manager):
             if ex_net_id and ex_net_id != target_ex_net_id:
                 continue
             cur_router_ids.add(r['id'])
-            if r['id'] not in self.router_info:
-                self._router_added(r['id'], r)
-            ri = self.router_info[r['id']]
-            ri.router = r
-            self.process_router(ri)
+            self._queue_router_update(r['id'], priority,
+                                      self._update_router, r)
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            self._router_removed(router_id)
+            self._queue_router_update(router_id, priority,
+                                      self._remove_router, router_id)
 
     @periodic_task.periodic_task
     def _sync_routers_task(self, context):
@@ -635,7 +851,10 @@ class L3NATAgent(manager.Manager):
                         router_id = None
                     routers = self.plugin_rpc.get_routers(
                         context, router_id)
-                    self._process_routers(routers, all_routers=True)
+                    # the routers are processed in the background, after
+                    # the ones updated through RPC
+                    self._process_routers(routers, all_routers=True,
+                                          priority=PRIORITY_SYNC)
                     self.fullsync = False
                 except Exception:
                     LOG.exception(_("Failed synchronizing routers"))
@@ -719,6 +938,14 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        configurations['router_updates_queued'] = len(self.router_queue)
+        # latencies in seconds of the updates processed since last report
+        configurations['router_update_latency'] = round(
+            self.update_latency_sum / max(self.updates_processed, 1), 3)
+        configurations['router_update_max_latency'] = round(
+            self.update_latency_max, 3)
+        self.update_latency_sum = self.update_latency_max = 0.0
+        self.updates_processed = 0
         try:
             self.state_rpc.report_state(self.context,
                                         self.agent_state)
@@ -213,6 +213,9 @@ class Dnsmasq(DhcpLocalProcess):
 
     _TAG_PREFIX = 'tag%d'
 
+    # set when a config file is written
+    _files_changed = False
+
     QUANTUM_NETWORK_ID_KEY = 'QUANTUM_NETWORK_ID'
     QUANTUM_RELAY_SOCKET_PATH_KEY = 'QUANTUM_RELAY_SOCKET_PATH'
 
@@ -299,8 +302,13 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
+        self._files_changed = False
         self._output_hosts_file()
         self._output_opts_file()
+        if not self._files_changed:
+            LOG.debug(_('Allocations of network %s are unchanged'),
+                      self.network.id)
+            return
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -321,7 +329,7 @@ class Dnsmasq(DhcpLocalProcess):
                           (port.mac_address, name, alloc.ip_address))
 
         name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+        self._replace_file_if_changed(name, buf.getvalue())
         return name
 
     def _output_opts_file(self):
@@ -367,9 +375,24 @@ class Dnsmasq(DhcpLocalProcess):
                     options.append(self._format_option(i, 'router'))
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_file_if_changed(name, '\n'.join(options))
         return name
 
+    def _replace_file_if_changed(self, name, data):
+        """Write a config file unless it already holds this content.
+
+        dnsmasq only needs to be signaled when one of its files was
+        written, which is recorded in self._files_changed.
+        """
+        try:
+            with open(name) as f:
+                if f.read() == data:
+                    return
+        except IOError:
+            pass
+        utils.replace_file(name, data)
+        self._files_changed = True
+
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
             self.interface_name,
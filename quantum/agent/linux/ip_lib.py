@@ -49,13 +49,17 @@ class SubProcessBase(object):
     @classmethod
     def _execute(cls, options, command, args, root_helper=None,
                  namespace=None):
+        return utils.execute(cls._ip_cmd(options, command, args, namespace),
+                             root_helper=root_helper)
+
+    @staticmethod
+    def _ip_cmd(options, command, args, namespace=None):
         opt_list = ['-%s' % o for o in options]
         if namespace:
             ip_cmd = ['ip', 'netns', 'exec', namespace, 'ip']
         else:
             ip_cmd = ['ip']
-        return utils.execute(ip_cmd + opt_list + [command] + list(args),
-                             root_helper=root_helper)
+        return ip_cmd + opt_list + [command] + list(args)
 
 
 class IPWrapper(SubProcessBase):
@@ -264,6 +268,30 @@ class IpAddrCommand(IpDeviceCommandBase):
                       self.name,
                       options=[ip_version])
 
+    def update(self, adds=None, deletes=None):
+        """Add and delete several addresses at once.
+
+        The commands are sent in a single request when a root helper daemon
+        is configured.
+
+        :param adds: a list of (ip_version, cidr, broadcast) tuples
+        :param deletes: a list of (ip_version, cidr) tuples
+        """
+        if not self._parent.root_helper:
+            raise exceptions.SudoRequired()
+        namespace = self._parent.namespace
+        cmds = [self._parent._ip_cmd([ip_version], self.COMMAND,
+                                     ('del', cidr, 'dev', self.name),
+                                     namespace)
+                for ip_version, cidr in deletes or []]
+        cmds += [self._parent._ip_cmd([ip_version], self.COMMAND,
+                                      ('add', cidr, 'brd', broadcast,
+                                       'scope', 'global', 'dev', self.name),
+                                      namespace)
+                 for ip_version, cidr, broadcast in adds or []]
+        if cmds:
+            utils.execute_batch(cmds, root_helper=self._parent.root_helper)
+
     def flush(self):
         self._as_root('flush', self.name)
 
@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+from quantum.agent.linux import utils
+from quantum.common import constants
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+IPSET_FAMILY = {constants.IPv4: 'inet',
+                constants.IPv6: 'inet6'}
+# The kernel limit on the length of set names is 31 characters
+IPSET_NAME_MAX_LENGTH = 31
+# All the sets created by the agent start with this prefix
+IPSET_NAME_PREFIX = 'qsg-'
+
+
+def get_set_name(ethertype, name):
+    """Returns the name of the set of a security group.
+
+    The id of the group is too long to be part of the name, a digest of it
+    is used instead so that distinct groups do not share a set.
+    """
+    set_name = '%s%s-%s' % (IPSET_NAME_PREFIX, ethertype,
+                            hashlib.sha1(name).hexdigest())
+    return set_name[:IPSET_NAME_MAX_LENGTH]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    The manager remembers the members of the sets it created, so that an
+    update only sends the addresses being added or removed, with a single
+    'ipset restore' for all the sets.
+    """
+
+    def __init__(self, _execute=None, root_helper=None):
+        if _execute:
+            self.execute = _execute
+        else:
+            self.execute = utils.execute
+        self.root_helper = root_helper
+        # set name => set of member addresses
+        self.sets = {}
+
+    def set_members(self, members_by_set):
+        """Make the sets contain exactly the given addresses.
+
+        :param members_by_set: a dict mapping set names to (ethertype,
+            addresses) tuples. Missing sets are created, and sets left over
+            from a previous run are flushed before being used.
+        """
+        lines = []
+        updated = {}
+        for set_name, (ethertype, members) in members_by_set.iteritems():
+            members = set(members)
+            current = self.sets.get(set_name)
+            if current is None:
+                lines.append('create %s hash:ip family %s' %
+                             (set_name, IPSET_FAMILY[ethertype]))
+                lines.append('flush %s' % set_name)
+                current = set()
+            lines += ['add %s %s' % (set_name, ip)
+                      for ip in sorted(members - current)]
+            lines += ['del %s %s' % (set_name, ip)
+                      for ip in sorted(current - members)]
+            updated[set_name] = members
+        if lines:
+            self.execute(['ipset', 'restore', '-exist'],
+                         process_input='\n'.join(lines) + '\n',
+                         root_helper=self.root_helper)
+        self.sets.update(updated)
+
+    def destroy_sets(self, set_names):
+        """Destroy sets, which must not be referenced by iptables anymore."""
+        for set_name in set_names:
+            if set_name not in self.sets:
+                continue
+            del self.sets[set_name]
+            try:
+                self.execute(['ipset', 'destroy', set_name],
+                             root_helper=self.root_helper)
+            except RuntimeError:
+                LOG.exception(_("Failed to destroy ipset %s"), set_name)
+
+    def destroy_stale_sets(self):
+        """Destroy the sets of the agent left over by a previous run.
+
+        The iptables rules of the previous run must have been replaced.
+        """
+        set_names = self.execute(['ipset', 'list', '-name'],
+                                 root_helper=self.root_helper).split()
+        stale_sets = [set_name for set_name in set_names
+                      if set_name.startswith(IPSET_NAME_PREFIX) and
+                      set_name not in self.sets]
+        # Destroyed through destroy_sets, as if created by this run
+        self.sets.update(dict.fromkeys(stale_sets))
+        self.destroy_sets(stale_sets)
@@ -19,6 +19,7 @@ import netaddr
 from oslo.config import cfg
 
 from quantum.agent import firewall
+from quantum.agent.linux import ipset_manager
 from quantum.agent.linux import iptables_manager
 from quantum.common import constants
 from quantum.openstack.common import log as logging
@@ -30,7 +31,11 @@ INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 LINUX_DEV_LEN = 14
+cfg.CONF.import_opt('enable_ipset', 'quantum.agent.securitygroups_rpc',
+                    group='SECURITYGROUP')
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -44,19 +49,55 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             use_ipv6=True)
         # list of port which has security group
         self.filtered_ports = {}
+        self.ipset = None
+        if cfg.CONF.SECURITYGROUP.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
+        # remote security group id => {ethertype: [member ip, ...]}
+        self.sg_members = {}
+        # sets matched by the rules of the filtered ports:
+        # set name => (ethertype, remote security group id)
+        self.referenced_sets = {}
+        # the sets of a previous run are destroyed after the first apply,
+        # which replaces the rules referencing them
+        self._stale_sets_destroyed = False
         self._add_fallback_chain_v4v6()
 
     @property
     def ports(self):
         return self.filtered_ports
 
+    def update_security_group_members(self, sg_members):
+        """Update the members of remote security groups.
+
+        Only used with ipset, where the rules refer to the remote groups
+        instead of listing their members. Their sets are updated in place,
+        without touching the iptables chains.
+
+        :param sg_members: a dict mapping security group ids to dicts of
+            member addresses by ethertype.
+        """
+        if not self.ipset:
+            return
+        self.sg_members.update(sg_members)
+        members_by_set = {}
+        for sg_id, members in sg_members.iteritems():
+            for ethertype in ipset_manager.IPSET_FAMILY:
+                set_name = ipset_manager.get_set_name(ethertype, sg_id)
+                # Only keep the sets of the groups which are referenced
+                if (set_name in self.ipset.sets or
+                        set_name in self.referenced_sets):
+                    members_by_set[set_name] = (ethertype,
+                                                members.get(ethertype, []))
+        self.ipset.set_members(members_by_set)
+
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -67,7 +108,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -78,10 +119,46 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def _apply(self):
+        self._create_referenced_sets()
         self.iptables.apply()
+        if not self.iptables.iptables_apply_deferred:
+            self._destroy_unreferenced_sets()
+
+    def _create_referenced_sets(self):
+        """Create the sets matched by the rules, before applying them."""
+        if not self.ipset:
+            return
+        members_by_set = {}
+        for set_name, (ethertype, sg_id) in self.referenced_sets.iteritems():
+            if set_name not in self.ipset.sets:
+                members = self.sg_members.get(sg_id, {}).get(ethertype, [])
+                members_by_set[set_name] = (ethertype, members)
+        self.ipset.set_members(members_by_set)
+
+    def _destroy_unreferenced_sets(self):
+        """Destroy the sets no longer matched, once the rules are applied."""
+        if not self.ipset:
+            return
+        self.ipset.destroy_sets([set_name for set_name in self.ipset.sets
+                                 if set_name not in self.referenced_sets])
+        if not self._stale_sets_destroyed:
+            try:
+                self.ipset.destroy_stale_sets()
+                self._stale_sets_destroyed = True
+            except RuntimeError:
+                LOG.exception(_("Failed to list the existing ipsets"))
+        referenced_groups = set(sg_id for ethertype, sg_id
+                                in self.referenced_sets.itervalues())
+        for sg_id in self.sg_members.keys():
+            if sg_id not in referenced_groups:
+                del self.sg_members[sg_id]
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
+        self.referenced_sets = {}
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in self.filtered_ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -234,6 +311,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                         rule.get('source_ip_prefix'))
             args += self._ip_prefix_arg('d',
                                         rule.get('dest_ip_prefix'))
+            args += self._remote_group_arg(rule)
             iptables_rules += [' '.join(args)]
 
         iptables_rules += ['-j $sg-fallback']
@@ -273,6 +351,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _remote_group_arg(self, rule):
+        # NOTE: the server only leaves remote_group_id in the rules, instead
+        # of expanding them to the members of the group, when ipset is used
+        remote_group_id = rule.get('remote_group_id')
+        if not (self.ipset and remote_group_id):
+            return []
+        set_name = ipset_manager.get_set_name(rule['ethertype'],
+                                              remote_group_id)
+        self.referenced_sets[set_name] = (rule['ethertype'], remote_group_id)
+        return ['-m set --match-set', set_name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
@@ -281,7 +371,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables.defer_apply_on()
 
     def filter_defer_apply_off(self):
+        self._create_referenced_sets()
         self.iptables.defer_apply_off()
+        self._destroy_unreferenced_sets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
@@ -25,6 +25,7 @@ import inspect
 import os
 
 from quantum.agent.linux import utils
+from quantum.openstack.common import excutils
 from quantum.openstack.common import lockutils
 from quantum.openstack.common import log as logging
 
@@ -47,6 +48,19 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _weed_out_duplicates(lines):
+    """Filter duplicates, letting the *last* occurrence take precedence."""
+    seen_lines = set()
+    result = []
+    for line in reversed(lines):
+        stripped = line.strip()
+        if stripped not in seen_lines:
+            seen_lines.add(stripped)
+            result.append(line)
+    result.reverse()
+    return result
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -85,6 +99,18 @@ class IptablesTable(object):
         self.rules = []
         self.chains = set()
         self.unwrapped_chains = set()
+        # Rules of the wrapped chains as of the last successful apply, and
+        # the wrapped chains touched since then. Changes outside of the
+        # wrapped chains can't be applied chain by chain and set full_sync.
+        self.applied_chains = {}
+        self.dirty_chains = set()
+        self.full_sync = True
+
+    def _mark_dirty(self, chain, wrap):
+        if wrap:
+            self.dirty_chains.add(chain)
+        else:
+            self.full_sync = True
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -99,10 +125,10 @@ class IptablesTable(object):
 
         """
         name = get_chain_name(name, wrap)
-        if wrap:
-            self.chains.add(name)
-        else:
-            self.unwrapped_chains.add(name)
+        chain_set = self._select_chain_set(wrap)
+        if name not in chain_set:
+            chain_set.add(name)
+            self._mark_dirty(name, wrap)
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -141,13 +167,19 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
-        self.rules = filter(lambda r: r.chain != name, self.rules)
+        self._mark_dirty(name, wrap)
         if wrap:
             jump_snippet = '-j %s-%s' % (binary_name, name)
         else:
             jump_snippet = '-j %s' % (name,)
 
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+        rules = []
+        for rule in self.rules:
+            if rule.chain == name or jump_snippet in rule.rule:
+                self._mark_dirty(rule.chain, rule.wrap)
+            else:
+                rules.append(rule)
+        self.rules = rules
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -168,6 +200,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top))
+        self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -185,6 +218,7 @@ class IptablesTable(object):
         chain = get_chain_name(chain, wrap)
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
+            self._mark_dirty(chain, wrap)
         except ValueError:
             LOG.warn(_('Tried to remove rule that was not there:'
                        ' %(chain)r %(rule)r %(wrap)r %(top)r'),
@@ -194,10 +228,23 @@ class IptablesTable(object):
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
         chain = get_chain_name(chain, wrap)
-        chained_rules = [rule for rule in self.rules
-                         if rule.chain == chain and rule.wrap == wrap]
-        for rule in chained_rules:
-            self.rules.remove(rule)
+        self.rules = [rule for rule in self.rules
+                      if rule.chain != chain or rule.wrap != wrap]
+        self._mark_dirty(chain, wrap)
+
+    def get_wrapped_chain_rules(self, chains):
+        """Returns the rule lines of the given wrapped chains.
+
+        The result maps each chain name to its rules in the order they are
+        applied, with duplicates removed the same way a full restore does.
+        """
+        chain_rules = dict((name, []) for name in chains)
+        for rule in self.rules:
+            if rule.wrap and rule.chain in chain_rules:
+                chain_rules[rule.chain].append(str(rule))
+        for name, lines in chain_rules.iteritems():
+            chain_rules[name] = _weed_out_duplicates(lines)
+        return chain_rules
 
 
 class IptablesManager(object):
@@ -311,9 +358,14 @@ class IptablesManager(object):
     def _apply(self):
         """Apply the current in-memory set of iptables rules.
 
-        This will blow away any rules left over from previous runs of the
-        same component of Nova, and replace them with our current set of
-        rules. This happens atomically, thanks to iptables-restore.
+        The first time a table is applied, and whenever rules outside of
+        our wrapped chains change, this will blow away any rules left over
+        from previous runs of the same component and replace them with our
+        current set of rules, atomically thanks to iptables-restore.
+
+        Otherwise only the wrapped chains whose rules differ from what was
+        last applied are rewritten, with a single 'iptables-restore
+        --noflush' per address family, and untouched tables are skipped.
 
         """
         s = [('iptables', self.ipv4)]
@@ -321,31 +373,92 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            updates = []
             for table in tables:
-                args = ['%s-save' % cmd, '-t', table]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                current_table = (self.execute(args,
-                                 root_helper=self.root_helper))
-                current_lines = current_table.split('\n')
-                new_filter = self._modify_rules(current_lines,
-                                                tables[table])
-                args = ['%s-restore' % (cmd)]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                self.execute(args,
-                             process_input='\n'.join(new_filter),
-                             root_helper=self.root_helper)
+                if tables[table].full_sync:
+                    self._restore_table(cmd, table, tables[table])
+                elif tables[table].dirty_chains:
+                    updates.append(table)
+            if updates:
+                self._update_chains(cmd, tables, updates)
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _get_cmd(self, *args):
+        args = list(args)
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return args
+
+    def _restore_table(self, cmd, table_name, table):
+        current_table = self.execute(
+            self._get_cmd('%s-save' % cmd, '-t', table_name),
+            root_helper=self.root_helper)
+        current_lines = current_table.split('\n')
+        new_filter = self._modify_rules(current_lines, table)
+        # A failed restore leaves full_sync set so the next apply retries.
+        self.execute(self._get_cmd('%s-restore' % cmd),
+                     process_input='\n'.join(new_filter),
+                     root_helper=self.root_helper)
+        table.applied_chains = table.get_wrapped_chain_rules(table.chains)
+        table.dirty_chains = set()
+        table.full_sync = False
+
+    def _update_chains(self, cmd, tables, table_names):
+        lines = []
+        changes = []
+        for table_name in table_names:
+            table = tables[table_name]
+            chains = table.dirty_chains & table.chains
+            removed = sorted(name for name in table.dirty_chains - chains
+                             if name in table.applied_chains)
+            new_rules = table.get_wrapped_chain_rules(chains)
+            changed = sorted(name for name in chains
+                             if new_rules[name] !=
+                             table.applied_chains.get(name))
+            changes.append((table, changed, removed, new_rules))
+            if not (changed or removed):
+                continue
+            lines.append('*%s' % table_name)
+            # With --noflush, declaring an existing chain flushes it. The
+            # removed chains are flushed too, as -X fails on a non empty
+            # chain.
+            lines += [':%s-%s - [0:0]' % (binary_name, name)
+                      for name in changed + removed]
+            for name in changed:
+                lines += new_rules[name]
+            lines += ['-X %s-%s' % (binary_name, name) for name in removed]
+            lines.append('COMMIT')
+
+        if lines:
+            try:
+                self.execute(self._get_cmd('%s-restore' % cmd, '--noflush'),
+                             process_input='\n'.join(lines) + '\n',
+                             root_helper=self.root_helper)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    for table, changed, removed, new_rules in changes:
+                        table.full_sync = True
+
+        for table, changed, removed, new_rules in changes:
+            for name in changed:
+                table.applied_chains[name] = new_rules[name]
+            for name in removed:
+                del table.applied_chains[name]
+            table.dirty_chains = set()
+
     def _modify_rules(self, current_lines, table, binary=None):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
         rules = table.rules
 
-        # Remove any trace of our rules
-        new_filter = filter(lambda line: binary_name
-                            not in line, current_lines)
+        # Remove any trace of our rules. rule.top == True means we want
+        # the rule to be at the top, so existing copies of it are dropped
+        # here rather than by the duplicate filtering below, which keeps
+        # the bottom-most occurrence.
+        top_rules = set(str(rule).strip() for rule in rules if rule.top)
+        new_filter = [line for line in current_lines
+                      if binary_name not in line and
+                      line.strip() not in top_rules]
 
         seen_chains = False
         rules_index = 0
@@ -357,16 +470,7 @@ class IptablesManager(object):
                 if not rule.startswith(':'):
                     break
 
-        our_rules = []
-        for rule in rules:
-            rule_str = str(rule)
-            if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            our_rules += [rule_str]
+        our_rules = [str(rule) for rule in rules]
 
         new_filter[rules_index:rules_index] = our_rules
 
@@ -376,19 +480,4 @@ class IptablesManager(object):
                                                (binary_name, name)
                                                for name in chains]
 
-        seen_lines = set()
-
-        def _weed_out_duplicates(line):
-            line = line.strip()
-            if line in seen_lines:
-                return False
-            else:
-                seen_lines.add(line)
-                return True
-
-        # We filter duplicates, letting the *last* occurrence take
-        # precedence.
-        new_filter.reverse()
-        new_filter = filter(_weed_out_duplicates, new_filter)
-        new_filter.reverse()
-        return new_filter
+        return _weed_out_duplicates(new_filter)
@@ -18,13 +18,15 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
-import re
-
 from quantum.agent.linux import utils
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+# Interface columns needed to build a VifPort
+INTERFACE_COLUMNS = ['name', 'ofport', 'external_ids']
+
 
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
@@ -45,20 +47,6 @@ class OVSBridge:
     def __init__(self, br_name, root_helper):
         self.br_name = br_name
         self.root_helper = root_helper
-        self.re_id = self.re_compile_id()
-
-    def re_compile_id(self):
-        external = 'external_ids\s*'
-        mac = 'attached-mac="(?P<vif_mac>([a-fA-F\d]{2}:){5}([a-fA-F\d]{2}))"'
-        iface = 'iface-id="(?P<vif_id>[^"]+)"'
-        name = 'name\s*:\s"(?P<port_name>[^"]*)"'
-        port = 'ofport\s*:\s(?P<ofport>-?\d+)'
-        _re = ('%(external)s:\s{ ( %(mac)s,? | %(iface)s,? | . )* }'
-               ' \s+ %(name)s \s+ %(port)s' % {'external': external,
-                                               'mac': mac,
-                                               'iface': iface, 'name': name,
-                                               'port': port})
-        return re.compile(_re, re.M | re.X)
 
     def run_vsctl(self, args):
         full_args = ["ovs-vsctl", "--timeout=2"] + args
@@ -191,6 +179,31 @@ class OVSBridge:
         if output:
             return output.rstrip("\n\r")
 
+    def db_list(self, table, columns, conditions=None):
+        """Returns rows of a table as dicts using a single ovs-vsctl call.
+
+        :param table: the table to read.
+        :param columns: the columns to return for each row.
+        :param conditions: if given, only the rows matching these 'find'
+            conditions are returned.
+        """
+        if conditions:
+            cmd = ['find', table] + conditions
+        else:
+            cmd = ['list', table]
+        output = self.run_vsctl(['--format=json', '--',
+                                 '--columns=%s' % ','.join(columns)] + cmd)
+        if not output:
+            return []
+        try:
+            result = jsonutils.loads(output)
+        except ValueError:
+            LOG.error(_("Unable to parse ovs-vsctl output: %s"), output)
+            return []
+        headings = result['headings']
+        return [dict(zip(headings, [ovsdb_value_to_python(v) for v in row]))
+                for row in result['data']]
+
     def db_str_to_map(self, full_str):
         list = full_str.strip("{}").split(", ")
         ret = {}
@@ -219,60 +232,65 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
+    def get_vif_port_map(self, interfaces=None):
+        """Returns a dict mapping iface-id to VifPort for the bridge VIFs.
+
+        :param interfaces: Interface rows with 'name', 'ofport' and
+            'external_ids'. All interfaces are read with a single ovs-vsctl
+            call if not given.
+        """
+        port_names = set(self.get_port_name_list())
+        if interfaces is None:
+            interfaces = self.db_list("Interface", INTERFACE_COLUMNS)
+        vif_ports = {}
+        for iface in interfaces:
+            if iface['name'] not in port_names:
+                continue
+            vif_port = self._vif_port_from_interface(iface)
+            if vif_port:
+                vif_ports[vif_port.vif_id] = vif_port
+        return vif_ports
+
+    def _vif_port_from_interface(self, iface):
+        external_ids = iface['external_ids']
+        vif_id = self.get_vif_id(external_ids)
+        if vif_id is None:
+            return
+        ofport = iface['ofport']
+        if not isinstance(ofport, int):
+            # ofport is an empty set until the port is attached
+            ofport = -1
+        return VifPort(iface['name'], ofport, vif_id,
+                       external_ids["attached-mac"], self)
+
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
-        edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-
-        return edge_ports
+        return self.get_vif_port_map().values()
+
+    def get_vif_id(self, external_ids):
+        """Returns the iface-id of a VIF given its Interface external_ids.
+
+        Returns None if the external_ids do not describe a VIF.
+        """
+        if "iface-id" in external_ids and "attached-mac" in external_ids:
+            return external_ids['iface-id']
+        elif ("xs-vif-uuid" in external_ids and
+              "attached-mac" in external_ids):
+            # if this is a xenserver and iface-id is not automatically
+            # synced to OVS from XAPI, we grab it from XAPI directly
+            return self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
 
     def get_vif_port_set(self):
-        edge_ports = set()
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
-        return edge_ports
+        return set(self.get_vif_port_map())
 
     def get_vif_port_by_id(self, port_id):
-        args = ['--', '--columns=external_ids,name,ofport',
-                'find', 'Interface',
-                'external_ids:iface-id="%s"' % port_id]
-        result = self.run_vsctl(args)
-        if not result:
-            return
-        match = self.re_id.search(result)
-        try:
-            vif_mac = match.group('vif_mac')
-            vif_id = match.group('vif_id')
-            port_name = match.group('port_name')
-            ofport = int(match.group('ofport'))
-            return VifPort(port_name, ofport, vif_id, vif_mac, self)
-        except Exception as e:
-            LOG.info(_("Unable to parse regex results. Exception: %s"), e)
-            return
+        interfaces = self.db_list(
+            "Interface", INTERFACE_COLUMNS,
+            ['external_ids:iface-id="%s"' % port_id])
+        for iface in interfaces:
+            vif_port = self._vif_port_from_interface(iface)
+            if vif_port:
+                return vif_port
 
     def delete_ports(self, all_ports=False):
         if all_ports:
@@ -284,6 +302,22 @@ class OVSBridge:
             self.delete_port(port_name)
 
 
+def ovsdb_value_to_python(value):
+    """Converts a value in OVSDB JSON notation to a python value.
+
+    Compound values are encoded as ["map", [[key, value], ...]] and
+    ["set", [...]], and atoms such as uuids as ["uuid", "..."].
+    """
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind == 'map':
+            return dict((k, ovsdb_value_to_python(v)) for k, v in data)
+        elif kind == 'set':
+            return [ovsdb_value_to_python(v) for v in data]
+        return data
+    return value
+
+
 def get_bridge_for_iface(root_helper, iface):
     args = ["ovs-vsctl", "--timeout=2", "iface-to-br", iface]
     try:
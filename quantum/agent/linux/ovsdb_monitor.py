@@ -0,0 +1,173 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shlex
+
+import eventlet
+from eventlet import queue
+from eventlet.green import subprocess
+
+from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import utils
+from quantum.common import utils as q_utils
+from quantum.openstack.common import jsonutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class OvsdbMonitor(object):
+    """Tracks a table of the local OVSDB with 'ovsdb-client monitor'.
+
+    A single long-lived ovsdb-client process streams the initial content
+    of the table followed by every later change, so the caller can keep
+    an up to date view of the table without forking one ovs-vsctl per
+    row and per poll.
+    """
+
+    def __init__(self, table_name, columns=None, root_helper=None):
+        self.table_name = table_name
+        self.columns = columns or []
+        self.root_helper = root_helper
+        self._process = None
+        self._reader = None
+        self._updates = queue.LightQueue()
+        self.rows = {}
+
+    def _get_cmd(self):
+        cmd = ['ovsdb-client', 'monitor', self.table_name]
+        if self.columns:
+            cmd.append(','.join(self.columns))
+        cmd.append('--format=json')
+        if self.root_helper:
+            cmd = shlex.split(self.root_helper) + cmd
+        return cmd
+
+    def start(self):
+        """Spawn the monitor process and the thread consuming its output."""
+        if self.is_active():
+            return
+        self.rows = {}
+        cmd = self._get_cmd()
+        LOG.debug(_("Starting ovsdb monitor: %s"), cmd)
+        self._process = q_utils.subprocess_popen(cmd,
+                                                 stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE,
+                                                 stderr=subprocess.PIPE)
+        self._reader = eventlet.spawn(self._read_stdout, self._process)
+
+    def stop(self):
+        """Terminate the monitor process."""
+        process = self._process
+        self._process = None
+        if process is None or process.poll() is not None:
+            return
+        if self.root_helper:
+            # The monitor runs with elevated privileges as a grandchild of
+            # the root helper; kill the real ovsdb-client process.
+            pid = self._get_leaf_pid(process.pid)
+            try:
+                utils.execute(['kill', '-9', pid], self.root_helper)
+            except RuntimeError:
+                LOG.exception(_("Unable to kill ovsdb monitor %s"), pid)
+        else:
+            process.kill()
+        process.wait()
+
+    def _get_leaf_pid(self, pid):
+        while True:
+            try:
+                children = utils.execute(['ps', '--ppid', pid, '-o', 'pid='],
+                                         check_exit_code=False).split()
+            except RuntimeError:
+                children = []
+            if not children:
+                return pid
+            pid = children[0].strip()
+
+    def is_active(self):
+        return self._process is not None and self._process.poll() is None
+
+    def _read_stdout(self, process):
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._process_output(jsonutils.loads(line))
+            except Exception:
+                LOG.exception(_("Unable to parse ovsdb monitor output: %s"),
+                              line)
+        LOG.warn(_("ovsdb monitor for table %s exited"), self.table_name)
+        # Wake up any waiter so that it can notice the monitor is gone.
+        self._updates.put(False)
+
+    def _process_output(self, output):
+        headings = output.get('headings', [])
+        changed = False
+        for data in output.get('data', []):
+            row = dict(zip(headings, data))
+            uuid = row.pop('row')
+            action = row.pop('action')
+            if action == 'delete':
+                self.rows.pop(uuid, None)
+            elif action == 'old':
+                # 'old' only carries the previous values of modified columns,
+                # the following 'new' entry has the complete row.
+                continue
+            else:
+                self.rows[uuid] = self._convert_row(row)
+            changed = True
+        if changed:
+            self._updates.put(True)
+
+    def _convert_row(self, row):
+        return dict((column, ovs_lib.ovsdb_value_to_python(value))
+                    for column, value in row.iteritems())
+
+    def wait_for_updates(self, timeout):
+        """Block until the table changes or timeout seconds elapse.
+
+        :returns: True if changes were received while waiting.
+        """
+        try:
+            updated = self._updates.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        # Drain the notifications that arrived in the same burst.
+        while True:
+            try:
+                updated = self._updates.get_nowait() or updated
+            except queue.Empty:
+                break
+        return updated
+
+
+class InterfaceMonitor(OvsdbMonitor):
+    """Keeps an in-memory view of the Interface table."""
+
+    def __init__(self, root_helper=None):
+        super(InterfaceMonitor, self).__init__(
+            'Interface', ovs_lib.INTERFACE_COLUMNS, root_helper=root_helper)
+
+    def get_interfaces(self):
+        """Returns the Interface rows, see OVSBridge.get_vif_port_map."""
+        return [row for row in self.rows.itervalues() if 'name' in row]
@@ -24,18 +24,114 @@ import socket
 import struct
 import tempfile
 
+from eventlet import semaphore
 from eventlet.green import subprocess
+from oslo.config import cfg
 
 from quantum.common import utils
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
 
+class RootwrapDaemonClient(object):
+    """Runs commands through a quantum-rootwrap-daemon process.
+
+    The daemon is spawned on first use and respawned if it died. It exits
+    by itself when this process closes its stdin.
+    """
+
+    def __init__(self, daemon_cmd):
+        self.daemon_cmd = daemon_cmd
+        self._process = None
+        self._socket_path = None
+        self._start_lock = semaphore.Semaphore()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            cmd = shlex.split(self.daemon_cmd)
+            LOG.debug(_("Starting root helper daemon: %s"), cmd)
+            self._process = utils.subprocess_popen(cmd,
+                                                   stdin=subprocess.PIPE,
+                                                   stdout=subprocess.PIPE)
+            self._socket_path = self._process.stdout.readline().strip()
+            if not self._socket_path:
+                self._process = None
+                raise RuntimeError(_("Unable to start root helper daemon "
+                                     "%s") % self.daemon_cmd)
+
+    def execute(self, commands):
+        """Runs a batch of commands in a single request.
+
+        :param commands: a list of dicts with the cmd, process_input and
+                         check_exit_code of each command.
+        :returns: a list of (returncode, stdout, stderr) tuples, which stops
+                  at the first failed command whose exit code is checked.
+        """
+        self._ensure_started()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._socket_path)
+            sock.sendall(jsonutils.dumps({'commands': commands}) + '\n')
+            sock.shutdown(socket.SHUT_WR)
+            response = jsonutils.loads(sock.makefile().read())
+        finally:
+            sock.close()
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return [(result['returncode'], result['stdout'].encode('utf-8'),
+                 result['stderr'].encode('utf-8'))
+                for result in response['results']]
+
+
+_rootwrap_daemon_clients = {}
+
+
+def _get_rootwrap_daemon_client():
+    try:
+        daemon_cmd = cfg.CONF.AGENT.root_helper_daemon
+    except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+        return None
+    if not daemon_cmd:
+        return None
+    if daemon_cmd not in _rootwrap_daemon_clients:
+        _rootwrap_daemon_clients[daemon_cmd] = RootwrapDaemonClient(daemon_cmd)
+    return _rootwrap_daemon_clients[daemon_cmd]
+
+
+def _process_result(cmd, returncode, stdout, stderr, check_exit_code):
+    m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
+                                   'stdout': stdout, 'stderr': stderr}
+    LOG.debug(m)
+    if returncode and check_exit_code:
+        raise RuntimeError(m)
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False):
     if root_helper:
+        client = _get_rootwrap_daemon_client()
+        if client:
+            if addl_env:
+                # The daemon runs the commands with the environment set by
+                # the filters only
+                raise ValueError(_("Additional environment variables are "
+                                   "not supported by the root helper "
+                                   "daemon: %s") % addl_env)
+            cmd = map(str, cmd)
+            LOG.debug(_("Running command through root helper daemon: %s"),
+                      cmd)
+            [(returncode, _stdout, _stderr)] = client.execute(
+                [{'cmd': cmd, 'process_input': process_input,
+                  'check_exit_code': check_exit_code}])
+            _process_result(cmd, returncode, _stdout, _stderr,
+                            check_exit_code)
+            return return_stderr and (_stdout, _stderr) or _stdout
         cmd = shlex.split(root_helper) + cmd
     cmd = map(str, cmd)
 
@@ -53,16 +149,34 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
                         obj.communicate(process_input) or
                         obj.communicate())
     obj.stdin.close()
-    m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
-                                   'stdout': _stdout, 'stderr': _stderr}
-    LOG.debug(m)
-    if obj.returncode and check_exit_code:
-        raise RuntimeError(m)
+    _process_result(cmd, obj.returncode, _stdout, _stderr, check_exit_code)
 
     return return_stderr and (_stdout, _stderr) or _stdout
 
 
+def execute_batch(cmds, root_helper=None, check_exit_code=True):
+    """Runs several commands, in order.
+
+    With a root helper daemon configured, all the commands are sent in a
+    single request. When check_exit_code is set, a RuntimeError is raised
+    for the first failed command and the following ones are not run.
+
+    :returns: the list of the stdout of each command.
+    """
+    client = root_helper and _get_rootwrap_daemon_client()
+    if not client:
+        return [execute(cmd, root_helper=root_helper,
+                        check_exit_code=check_exit_code) for cmd in cmds]
+
+    cmds = [map(str, cmd) for cmd in cmds]
+    LOG.debug(_("Running commands through root helper daemon: %s"), cmds)
+    results = client.execute([{'cmd': cmd, 'check_exit_code': check_exit_code}
+                              for cmd in cmds])
+    for cmd, (returncode, _stdout, _stderr) in zip(cmds, results):
+        _process_result(cmd, returncode, _stdout, _stderr, check_exit_code)
+    return [_stdout for returncode, _stdout, _stderr in results]
+
+
 def get_interface_mac(interface):
     DEVICE_NAME_LEN = 15
     MAC_START = 18
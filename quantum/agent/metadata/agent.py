@@ -16,13 +16,16 @@
 #
 # @author: Mark McClain, DreamHost
 
+import collections
 import hashlib
 import hmac
 import os
 import socket
+import time
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from oslo.config import cfg
 from quantumclient.v2_0 import client
@@ -38,6 +41,39 @@ LOG = logging.getLogger(__name__)
 DEVICE_OWNER_ROUTER_INTF = "network:router_interface"
 
 
+class TTLCache(object):
+    """A size bounded LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry and entry[0] > time.time():
+            # the most recently used entries are the last ones
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+    def put(self, key, value):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time() + self.ttl, value)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)}
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -61,25 +97,60 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_("Seconds during which the instance of an address "
+                          "and the networks of a router are remembered. "
+                          "0 disables the cache.")),
+        cfg.IntOpt('metadata_cache_size', default=1000,
+                   help=_("Maximum number of entries of each cache.")),
+        cfg.IntOpt('nova_metadata_pool_size', default=16,
+                   help=_("Maximum number of connections kept open to the "
+                          "Nova metadata server.")),
+        cfg.IntOpt('quantum_client_pool_size', default=4,
+                   help=_("Maximum number of concurrent requests to the "
+                          "Quantum server."))
     ]
 
     def __init__(self, conf):
         self.conf = conf
+        # Token and endpoint of the last request, reused by the new clients
         self.auth_info = {}
+        # quantumclient connections can't be shared by concurrent requests
+        self._qclient_pool = pools.Pool(
+            max_size=conf.quantum_client_pool_size,
+            create=self._get_quantum_client)
+        # (router or network id, remote address) => instance id
+        self._instance_cache = TTLCache(conf.metadata_cache_size,
+                                        conf.metadata_cache_ttl)
+        # router id => ids of the networks on its interfaces
+        self._router_cache = TTLCache(conf.metadata_cache_size,
+                                      conf.metadata_cache_ttl)
+        self._http_pool = pools.Pool(max_size=conf.nova_metadata_pool_size,
+                                     create=lambda: httplib2.Http())
 
     def _get_quantum_client(self):
-        qclient = client.Client(
+        # The client authenticates again by itself when its token expires
+        return client.Client(
             username=self.conf.admin_user,
             password=self.conf.admin_password,
             tenant_name=self.conf.admin_tenant_name,
             auth_url=self.conf.auth_url,
             auth_strategy=self.conf.auth_strategy,
             region_name=self.conf.auth_region,
-            auth_token=self.auth_info.get('auth_token'),
+            token=self.auth_info.get('auth_token'),
             endpoint_url=self.auth_info.get('endpoint_url'),
         )
-        return qclient
+
+    def _list_ports(self, **filters):
+        with self._qclient_pool.item() as qclient:
+            ports = qclient.list_ports(**filters)['ports']
+            self.auth_info = qclient.httpclient.get_auth_info()
+        return ports
+
+    def get_cache_stats(self):
+        return {'instances': self._instance_cache.get_stats(),
+                'routers': self._router_cache.get_stats()}
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
@@ -98,30 +169,42 @@ class MetadataProxyHandler(object):
                     'Please try your request again.')
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
-    def _get_instance_id(self, req):
-        qclient = self._get_quantum_client()
+    def _get_router_networks(self, router_id):
+        networks = self._router_cache.get(router_id)
+        if networks is None:
+            internal_ports = self._list_ports(
+                device_id=router_id,
+                device_owner=DEVICE_OWNER_ROUTER_INTF)
+
+            networks = [p['network_id'] for p in internal_ports]
+            if networks:
+                self._router_cache.put(router_id, networks)
+        return networks
 
+    def _get_instance_id(self, req):
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Quantum-Network-ID')
         router_id = req.headers.get('X-Quantum-Router-ID')
 
+        cache_key = (network_id or router_id, remote_address)
+        instance_id = self._instance_cache.get(cache_key)
+        if instance_id:
+            return instance_id
+        LOG.debug(_("Metadata cache statistics: %s"), self.get_cache_stats())
+
         if network_id:
             networks = [network_id]
         else:
-            internal_ports = qclient.list_ports(
-                device_id=router_id,
-                device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
-
-            networks = [p['network_id'] for p in internal_ports]
+            networks = self._get_router_networks(router_id)
 
-        ports = qclient.list_ports(
+        ports = self._list_ports(
             network_id=networks,
-            fixed_ips=['ip_address=%s' % remote_address])['ports']
-
-        self.auth_info = qclient.get_auth_info()
+            fixed_ips=['ip_address=%s' % remote_address])
 
         if len(ports) == 1:
-            return ports[0]['device_id']
+            instance_id = ports[0]['device_id']
+            self._instance_cache.put(cache_key, instance_id)
+            return instance_id
 
     def _proxy_request(self, instance_id, req):
         headers = {
@@ -138,9 +221,10 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        # The connections to Nova are kept alive between the requests
+        with self._http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
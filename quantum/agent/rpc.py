@@ -87,6 +87,43 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        """Returns the details of several devices in a single call.
+
+        Falls back to one get_device_details call per device when the
+        server does not support the bulk call.
+        """
+        try:
+            return self.call(context,
+                             self.make_msg('get_devices_details_list',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic)
+        except AttributeError:
+            # Servers that predate the bulk call raise AttributeError
+            LOG.debug(_("get_devices_details_list not supported by the "
+                        "server, falling back to get_device_details"))
+            return [self.get_device_details(context, device, agent_id)
+                    for device in devices]
+
+    def update_devices_down(self, context, devices, agent_id):
+        """Reports several devices as down in a single call.
+
+        Falls back to one update_device_down call per device when the
+        server does not support the bulk call.
+        """
+        try:
+            return self.call(context,
+                             self.make_msg('update_devices_down',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic)
+        except AttributeError:
+            LOG.debug(_("update_devices_down not supported by the server, "
+                        "falling back to update_device_down"))
+            return [self.update_device_down(context, device, agent_id)
+                    for device in devices]
+
     def update_device_up(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_up', device=device,
@@ -16,6 +16,7 @@
 #    under the License.
 #
 
+import eventlet
 from oslo.config import cfg
 
 from quantum.common import topics
@@ -24,11 +25,19 @@ from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# Version of the plugin RPC API providing security_group_info_for_devices
+SG_INFO_RPC_VERSION = "1.2"
 
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
-        default='quantum.agent.firewall.NoopFirewallDriver')
+        default='quantum.agent.firewall.NoopFirewallDriver'),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with ipset '
+               'sets, updated on membership changes, instead of one '
+               'iptables rule per member'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -56,6 +65,15 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -95,20 +113,74 @@ class SecurityGroupAgentRpcMixin(object):
     support in agent implementations.
     """
 
+    # Seconds during which the notifications are gathered before
+    # refreshing the firewall of the devices they affect
+    refresh_firewall_delay = 0.2
+
     def init_firewall(self):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
+        # device attribute => {security group id => set of device ids}
+        self.sg_device_index = {'security_groups': {},
+                                'security_group_source_groups': {}}
+        # device id => device, as indexed
+        self.indexed_devices = {}
+        self.devices_to_refresh = set()
+        self.refresh_all_devices = False
+        self.refresh_scheduled = False
+
+    def _index_devices(self, devices):
+        for device in devices:
+            self._unindex_device(device['device'])
+            if device['device'] not in self.firewall.ports:
+                continue
+            self.indexed_devices[device['device']] = device
+            for attribute, index in self.sg_device_index.iteritems():
+                for sg_id in device.get(attribute, []):
+                    index.setdefault(sg_id, set()).add(device['device'])
+
+    def _unindex_device(self, device_id):
+        device = self.indexed_devices.pop(device_id, None)
+        if not device:
+            return
+        for attribute, index in self.sg_device_index.iteritems():
+            for sg_id in device.get(attribute, []):
+                device_ids = index.get(sg_id, set())
+                device_ids.discard(device_id)
+                if not device_ids:
+                    index.pop(sg_id, None)
+
+    def _get_devices_for_security_groups(self, security_groups, attribute):
+        device_ids = set()
+        index = self.sg_device_index[attribute]
+        for sg_id in security_groups:
+            device_ids.update(index.get(sg_id, []))
+        return device_ids
+
+    def _get_devices_rules(self, device_ids):
+        """Return the devices with their security group rules.
+
+        With ipset, the rules refer to the remote groups, whose members
+        are passed to the firewall along the way.
+        """
+        if not cfg.CONF.SECURITYGROUP.enable_ipset:
+            return self.plugin_rpc.security_group_rules_for_devices(
+                self.context, list(device_ids))
+        info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(device_ids))
+        self.firewall.update_security_group_members(info['sg_member_ips'])
+        return info['devices']
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_rules(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
+        self._index_devices(devices.values())
 
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
@@ -120,22 +192,71 @@ class SecurityGroupAgentRpcMixin(object):
     def security_groups_member_updated(self, security_groups):
         LOG.info(_("Security group "
                    "member updated %r"), security_groups)
+        if cfg.CONF.SECURITYGROUP.enable_ipset:
+            self._security_group_members_updated(security_groups)
+            return
         self._security_group_updated(
             security_groups,
             'security_group_source_groups')
 
+    def _security_group_members_updated(self, security_groups):
+        """Update the members of the groups, leaving the rules untouched.
+
+        The members of a group are the same for all the devices, so they
+        are fetched for one device referring to each group.
+        """
+        index = self.sg_device_index['security_group_source_groups']
+        device_ids = set()
+        for sg_id in security_groups:
+            if index.get(sg_id):
+                device_ids.add(next(iter(index[sg_id])))
+        if not device_ids:
+            return
+        info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(device_ids))
+        self.firewall.update_security_group_members(info['sg_member_ips'])
+
     def _security_group_updated(self, security_groups, attribute):
-        #check need update or not
-        for device in self.firewall.ports.values():
-            if set(device.get(attribute,
-                              [])).intersection(
-                    set(security_groups)):
-                    self.refresh_firewall()
-                    return
+        device_ids = self._get_devices_for_security_groups(security_groups,
+                                                           attribute)
+        if device_ids:
+            self._schedule_refresh_firewall(device_ids)
 
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
-        self.refresh_firewall()
+        self._schedule_refresh_firewall()
+
+    def _schedule_refresh_firewall(self, device_ids=None):
+        """Refresh the devices, along with the ones of close notifications.
+
+        The devices are refreshed after refresh_firewall_delay, or once the
+        refresh in progress is done, with a single firewall update.
+
+        :param device_ids: the devices to refresh, all of them if None
+        """
+        if device_ids is None:
+            self.refresh_all_devices = True
+        else:
+            self.devices_to_refresh.update(device_ids)
+        if not self.refresh_scheduled:
+            self.refresh_scheduled = True
+            eventlet.spawn_after(self.refresh_firewall_delay,
+                                 self._refresh_scheduled_devices)
+
+    def _refresh_scheduled_devices(self):
+        try:
+            while self.refresh_all_devices or self.devices_to_refresh:
+                device_ids = self.devices_to_refresh
+                if self.refresh_all_devices:
+                    device_ids = None
+                self.devices_to_refresh = set()
+                self.refresh_all_devices = False
+                try:
+                    self.refresh_firewall(device_ids)
+                except Exception:
+                    LOG.exception(_("Failed to refresh the firewall rules"))
+        finally:
+            self.refresh_scheduled = False
 
     def remove_devices_filter(self, device_ids):
         if not device_ids:
@@ -143,22 +264,32 @@ class SecurityGroupAgentRpcMixin(object):
         LOG.info(_("Remove device filter for %r"), device_ids)
         with self.firewall.defer_apply():
             for device_id in device_ids:
+                self._unindex_device(device_id)
                 device = self.firewall.ports.get(device_id)
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
 
-    def refresh_firewall(self):
+    def refresh_firewall(self, device_ids=None):
+        """Fetch the rules of the devices again and update their filters.
+
+        :param device_ids: the devices to refresh, all the filtered devices
+            if None
+        """
         LOG.info(_("Refresh firewall rules"))
-        device_ids = self.firewall.ports.keys()
+        if device_ids is None:
+            device_ids = self.firewall.ports.keys()
+        else:
+            device_ids = [device_id for device_id in device_ids
+                          if device_id in self.firewall.ports]
         if not device_ids:
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_devices_rules(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device)
                 self.firewall.update_port_filter(device)
+        self._index_devices(devices.values())
 
 
 class SecurityGroupAgentRpcApiMixin(object):
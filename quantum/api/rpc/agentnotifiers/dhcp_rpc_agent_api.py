@@ -69,8 +69,9 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                 adminContext = (context if context.is_admin else
                                 context.elevated())
                 network = plugin.get_network(adminContext, network_id)
-                chosen_agent = plugin.schedule_network(adminContext, network)
-                if chosen_agent:
+                chosen_agents = plugin.schedule_network(adminContext,
+                                                        network)
+                for chosen_agent in chosen_agents or []:
                     self._notification_host(
                         context, 'network_create_end',
                         {'network': {'id': network_id}},
@@ -180,6 +180,36 @@ class Controller(object):
             return api_common.SortingEmulatedHelper(request, self._attr_info)
         return api_common.NoSortingHelper(request, self._attr_info)
 
+    def _push_down_authz_filters(self, filters, authz_filters):
+        """Restrict the query of the plugin to the objects the policy allows.
+
+        This is possible when a single set of attribute values grants the
+        access, e.g. the tenant_id for the owner.
+        """
+        if len(authz_filters) != 1:
+            return
+        authz_filter = authz_filters[0]
+        if not all(self._attr_info.get(key) for key in authz_filter):
+            return
+        for key, value in authz_filter.iteritems():
+            filters[key] = [v for v in filters.get(key, [value])
+                            if v == value]
+
+    def _check_items(self, context, obj_list, authz_filters, complete):
+        action = self._plugin_handlers[self.SHOW]
+        items = []
+        for obj in obj_list:
+            if any(all(obj.get(key) == value
+                       for key, value in authz_filter.iteritems())
+                   for authz_filter in authz_filters):
+                items.append(obj)
+            elif (complete and all(key in obj for authz_filter in
+                                   authz_filters for key in authz_filter)):
+                continue
+            elif policy.check(context, action, obj, plugin=self._plugin):
+                items.append(obj)
+        return items
+
     def _items(self, request, do_authz=False, parent_id=None):
         """Retrieves and formats a list of elements of the requested entity."""
         # NOTE(salvatore-orlando): The following ensures that fields which
@@ -190,6 +220,14 @@ class Controller(object):
         filters = api_common.get_filters(request, self._attr_info,
                                          ['fields', 'sort_key', 'sort_dir',
                                           'limit', 'marker', 'page_reverse'])
+        if do_authz:
+            # Most policies only compare attributes of the objects with the
+            # credentials: the plugin can then filter the objects, and the
+            # policy engine only runs on the others.
+            authz_filters, complete = policy.get_filters(
+                request.context, self._plugin_handlers[self.SHOW])
+            if complete:
+                self._push_down_authz_filters(filters, authz_filters)
         kwargs = {'filters': filters,
                   'fields': original_fields}
         sorting_helper = self._get_sorting_helper(request)
@@ -210,11 +248,8 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            obj_list = self._check_items(request.context, obj_list,
+                                         authz_filters, complete)
         collection = {self._collection:
                       [self._view(obj,
                                   fields_to_strip=fields_to_add)
@@ -72,6 +72,10 @@ core_opts = [
                help=_("Maximum number of fixed ips per port")),
     cfg.IntOpt('dhcp_lease_duration', default=120,
                help=_("DHCP lease duration")),
+    cfg.IntOpt('ip_recycle_interval', default=0,
+               help=_("Seconds between returning the IP allocations with "
+                      "expired DHCP leases to the pools in the background. "
+                      "0 returns them when ports are created or updated")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
@@ -88,8 +88,9 @@ class AgentSchedulerDbMixin(agentscheduler.AgentSchedulerPluginBase,
                 NetworkDhcpAgentBinding.network_id == network_ids[0])
         elif network_ids:
             query = query.filter(
-                NetworkDhcpAgentBinding.network_id in network_ids)
+                NetworkDhcpAgentBinding.network_id.in_(network_ids))
         if active is not None:
+            query = query.join(NetworkDhcpAgentBinding.dhcp_agent)
             query = (query.filter(agents_db.Agent.admin_state_up == active))
 
         return [binding.dhcp_agent
@@ -306,12 +307,13 @@ class AgentSchedulerDbMixin(agentscheduler.AgentSchedulerPluginBase,
                 return {'agents': []}
 
     def schedule_network(self, context, created_network):
+        """Schedule the network, returning the list of chosen agents."""
         if self.network_scheduler:
-            chosen_agent = self.network_scheduler.schedule(
+            chosen_agents = self.network_scheduler.schedule(
                 self, context, created_network)
-            if not chosen_agent:
+            if not chosen_agents:
                 LOG.warn(_('Fail scheduling network %s'), created_network)
-            return chosen_agent
+            return chosen_agents
 
     def auto_schedule_networks(self, context, host):
         if self.network_scheduler:
@@ -372,6 +374,17 @@ class AgentSchedulerDbMixin(agentscheduler.AgentSchedulerPluginBase,
         for router in routers:
             self.schedule_router(context, router)
 
+    def rebalance_routers(self, context, batch_size=50, max_moves=None):
+        """Move routers from overloaded L3 agents to less loaded ones.
+
+        Only supported by the schedulers implementing rebalance_routers.
+        """
+        if not hasattr(self.router_scheduler, 'rebalance_routers'):
+            LOG.warn(_('Router scheduler does not support rebalancing'))
+            return []
+        return self.router_scheduler.rebalance_routers(
+            self, context, batch_size=batch_size, max_moves=max_moves)
+
     def update_agent(self, context, id, agent):
         original_agent = self.get_agent(context, id)
         result = super(AgentSchedulerDbMixin, self).update_agent(
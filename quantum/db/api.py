@@ -17,6 +17,7 @@
 # @author: Brad Hall, Nicira Networks, Inc.
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 
+import os
 import time
 
 from eventlet import db_pool
@@ -94,6 +95,27 @@ class MySQLPingListener(object):
                 raise
 
 
+class ForkSafetyListener(PoolListener):
+    """Ensures that connections are not shared with a forked process.
+
+    The pooled connections are inherited by the API worker processes.
+    They are dropped without being closed by the processes which did not
+    open them, so that the socket is left to its owner.
+    """
+
+    def connect(self, dbapi_con, con_record):
+        con_record.info['pid'] = os.getpid()
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        pid = os.getpid()
+        if con_record.info.get('pid') != pid:
+            con_record.connection = con_proxy.connection = None
+            raise DisconnectionError(
+                _("Connection opened by process %(owner)s used by process "
+                  "%(pid)s") % {'owner': con_record.info.get('pid'),
+                                'pid': pid})
+
+
 class SqliteForeignKeysListener(PoolListener):
     """Ensures that the foreign key constraints are enforced in SQLite.
 
@@ -105,6 +127,23 @@ class SqliteForeignKeysListener(PoolListener):
         dbapi_con.execute('pragma foreign_keys=ON')
 
 
+class SqliteTransactionListener(PoolListener):
+    """Lets SQLAlchemy delimit the SQLite transactions.
+
+    pysqlite issues BEGIN by itself, and only before the DML statements,
+    which breaks the SAVEPOINTs used for nested transactions. Its
+    transaction handling is disabled here, and sqlite_begin emits BEGIN
+    when SQLAlchemy starts a transaction instead.
+
+    This deliberately applies to every SQLite connection of the process:
+    the queries run in a transaction are now part of it, reads included,
+    as with the other database backends, instead of running in autocommit
+    mode until the first write.
+    """
+    def connect(self, dbapi_con, con_record):
+        dbapi_con.isolation_level = None
+
+
 def configure_db():
     """Configure database.
 
@@ -127,8 +166,10 @@ def configure_db():
             'pool_size': cfg.CONF.DATABASE.sqlalchemy_pool_size,
         }
 
+        # ForkSafetyListener must check the connections first
+        engine_args['listeners'] = [ForkSafetyListener()]
         if 'mysql' in connection_dict.drivername:
-            engine_args['listeners'] = [MySQLPingListener()]
+            engine_args['listeners'].append(MySQLPingListener())
             if (MySQLdb is not None and
                 cfg.CONF.DATABASE.sql_dbpool_enable):
                 pool_args = {
@@ -154,13 +195,16 @@ def configure_db():
                 LOG.warn(_("Eventlet connection pooling will not work without "
                            "python-mysqldb!"))
         if 'sqlite' in connection_dict.drivername:
-            engine_args['listeners'] = [SqliteForeignKeysListener()]
+            engine_args['listeners'].append(SqliteForeignKeysListener())
+            engine_args['listeners'].append(SqliteTransactionListener())
             if sql_connection == "sqlite://":
                 engine_args["connect_args"] = {'check_same_thread': False}
 
         _ENGINE = create_engine(sql_connection, **engine_args)
 
         sql.event.listen(_ENGINE, 'checkin', greenthread_yield)
+        if 'sqlite' in connection_dict.drivername:
+            sql.event.listen(_ENGINE, 'begin', sqlite_begin)
 
         if not register_models():
             if cfg.CONF.DATABASE.reconnect_interval:
@@ -229,6 +273,11 @@ def unregister_models(base=BASE):
     base.metadata.drop_all(_ENGINE)
 
 
+def sqlite_begin(conn):
+    """Starts SQLite transactions, see SqliteTransactionListener."""
+    conn.execute('BEGIN')
+
+
 def greenthread_yield(dbapi_con, con_record):
     """Ensure other greenthreads get a chance to execute.
 
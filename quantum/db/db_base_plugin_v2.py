@@ -27,6 +27,7 @@ from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import exceptions as q_exc
 from quantum.db import api as db
+from quantum.db import ipam
 from quantum.db import models_v2
 from quantum.db import sqlalchemyutils
 from quantum.openstack.common import log as logging
@@ -74,6 +75,17 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     # api resources. Mixins can use this dict for adding their own methods
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
+    # Loader options, such as joinedload or subqueryload, applied to the
+    # queries retrieving collections of a model class. They avoid one query
+    # per object for the relationships accessed while building the dicts.
+    # Mixins and plugins adding relationships to the dicts declare their own
+    # options in a _model_query_options dict of the same form, or register
+    # them through register_model_query_options. The options of all the
+    # classes of a plugin apply, those of other plugins do not, as their
+    # tables may not exist.
+    _model_query_options = {
+        models_v2.Network: [orm.subqueryload('subnets')],
+        models_v2.Port: [orm.joinedload('fixed_ips')]}
 
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
@@ -127,6 +139,21 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         cur_funcs.extend(funcs)
         cls._dict_extend_functions[resource] = cur_funcs
 
+    @classmethod
+    def register_model_query_options(cls, model, options):
+        if '_model_query_options' not in vars(cls):
+            cls._model_query_options = {}
+        cur_options = cls._model_query_options.get(model, [])
+        cur_options.extend(options)
+        cls._model_query_options[model] = cur_options
+
+    def _get_model_query_options(self, model):
+        options = []
+        for klass in reversed(type(self).__mro__):
+            klass_options = vars(klass).get('_model_query_options', {})
+            options.extend(klass_options.get(model, []))
+        return options
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -244,6 +271,23 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _get_collection_items(self, query, model, dict_func, fields=None):
+        """Builds the dicts of the objects returned by query.
+
+        When all the requested fields are columns of the model, only these
+        columns are loaded, and the dicts are built from them directly
+        instead of going through dict_func. Otherwise the loader options
+        registered for the model are applied to the query.
+        """
+        columns = model.__table__.columns
+        if fields and all(field in columns for field in fields):
+            fields = list(set(fields))
+            query = query.with_entities(*[getattr(model, field)
+                                          for field in fields])
+            return [dict(zip(fields, row)) for row in query]
+        query = query.options(*self._get_model_query_options(model))
+        return [dict_func(c, fields) for c in query]
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
                         page_reverse=False):
@@ -252,7 +296,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+        items = self._get_collection_items(query, model, dict_func, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -324,107 +368,58 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     @staticmethod
     def _recycle_expired_ip_allocations(context, network_id):
         """Return held ip allocations with expired leases back to the pool."""
+        if cfg.CONF.ip_recycle_interval > 0:
+            # The server recycles them periodically, in the background.
+            return
         if network_id in getattr(context, '_recycled_networks', set()):
             return
 
-        expired_qry = context.session.query(
-            models_v2.IPAllocation).with_lockmode('update')
-        expired_qry = expired_qry.filter_by(network_id=network_id,
-                                            port_id=None)
-        expired_qry = expired_qry.filter(
-            models_v2.IPAllocation.expiration <= timeutils.utcnow())
-
-        for expired in expired_qry:
-            QuantumDbPluginV2._recycle_ip(context,
-                                          network_id,
-                                          expired['subnet_id'],
-                                          expired['ip_address'])
+        QuantumDbPluginV2._recycle_expired_ips(context, network_id)
 
         if hasattr(context, '_recycled_networks'):
             context._recycled_networks.add(network_id)
         else:
             context._recycled_networks = set([network_id])
 
+    @staticmethod
+    def _recycle_expired_ips(context, network_id=None):
+        """Return the expired ip allocations to the pools, subnet by subnet.
+
+        :returns: the number of recycled addresses.
+        """
+        expired_qry = context.session.query(
+            models_v2.IPAllocation).with_lockmode('update')
+        expired_qry = expired_qry.filter_by(port_id=None)
+        expired_qry = expired_qry.filter(
+            models_v2.IPAllocation.expiration <= timeutils.utcnow())
+        if network_id:
+            expired_qry = expired_qry.filter_by(network_id=network_id)
+
+        expired = {}
+        for allocation in expired_qry:
+            expired.setdefault(allocation['subnet_id'], []).append(
+                allocation['ip_address'])
+            context.session.delete(allocation)
+        backend = ipam.get_backend()
+        for subnet_id, ip_addresses in expired.iteritems():
+            backend.recycle_ips(context, subnet_id, ip_addresses)
+        return sum(len(ip_addresses) for ip_addresses in expired.values())
+
+    def recycle_expired_ip_allocations(self, context):
+        """Return the ip allocations with expired leases of all networks
+        back to the pools.
+        """
+        with context.session.begin(subtransactions=True):
+            count = self._recycle_expired_ips(context)
+        if count:
+            LOG.debug(_("Recycled %d expired IP allocations"), count)
+
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(
-            models_v2.IPAllocationPool).with_lockmode('update')
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            error_message = _("No allocation pool found for "
-                              "ip address:%s") % ip_address
-            raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_backend().recycle_ip(context, subnet_id, ip_address)
         QuantumDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -474,66 +469,28 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        return ipam.get_backend().generate_ip(context, subnets)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange,
-            models_v2.IPAllocationPool).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for (range, pool) in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_backend().allocate_specific_ip(context, subnet_id,
+                                                ip_address)
+
+    def _store_ip_allocation(self, context, network_id, port_id, ip):
+        """Record an IP allocated for the port.
+
+        The IPAM backend may have added the allocation to the session
+        already, to reserve the address.
+        """
+        allocated = ip.get('allocation')
+        if allocated is None:
+            allocated = models_v2.IPAllocation(network_id=network_id,
+                                               ip_address=ip['ip_address'],
+                                               subnet_id=ip['subnet_id'])
+            context.session.add(allocated)
+        allocated.port_id = port_id
+        allocated.expiration = self._default_allocation_expiration()
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -665,9 +622,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             else:
                 subnets = [self._get_subnet(context, fixed['subnet_id'])]
                 # IP address allocation
-                result = self._generate_ip(context, subnets)
-                ips.append({'ip_address': result['ip_address'],
-                            'subnet_id': result['subnet_id']})
+                ips.append(self._generate_ip(context, subnets))
         return ips
 
     def _update_ips_for_port(self, context, network_id, port_id, original_ips,
@@ -734,9 +689,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             version_subnets = [v4, v6]
             for subnets in version_subnets:
                 if subnets:
-                    result = QuantumDbPluginV2._generate_ip(context, subnets)
-                    ips.append({'ip_address': result['ip_address'],
-                                'subnet_id': result['subnet_id']})
+                    ips.append(QuantumDbPluginV2._generate_ip(context,
+                                                              subnets))
         return ips
 
     def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
@@ -1174,11 +1128,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ipam.get_backend().create_pool(context, ip_pool)
 
         return self._make_subnet_dict(subnet)
 
@@ -1346,14 +1296,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                'network_id': network_id,
                                'subnet_id': subnet_id,
                                'port_id': port_id})
-                    allocated = models_v2.IPAllocation(
-                        network_id=network_id,
-                        port_id=port_id,
-                        ip_address=ip_address,
-                        subnet_id=subnet_id,
-                        expiration=self._default_allocation_expiration()
-                    )
-                    context.session.add(allocated)
+                    self._store_ip_allocation(context, network_id, port_id,
+                                              ip)
 
         return self._make_port_dict(port, process_extensions=False)
 
@@ -1374,11 +1318,11 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                                 p['fixed_ips'])
                 # Update ips if necessary
                 for ip in ips:
-                    allocated = models_v2.IPAllocation(
-                        network_id=port['network_id'], port_id=port.id,
-                        ip_address=ip['ip_address'], subnet_id=ip['subnet_id'],
-                        expiration=self._default_allocation_expiration())
-                    context.session.add(allocated)
+                    self._store_ip_allocation(context, port['network_id'],
+                                              port.id, ip)
+                # The allocations were changed without going through the
+                # relationship, reload it when building the dict.
+                context.session.expire(port, ['fixed_ips'])
         # Remove all attributes in p which are not in the port DB model
         # and then update the port
         port.update(self._filter_non_model_columns(p, models_v2.Port))
@@ -1460,7 +1404,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        items = self._get_collection_items(query, models_v2.Port,
+                                           self._make_port_dict, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo.config import cfg
 from sqlalchemy.orm import exc
 
@@ -20,6 +22,7 @@ from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import utils
 from quantum import manager
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 
 
@@ -60,6 +63,44 @@ class DhcpRpcCallbackMixin(object):
         network['ports'] = plugin.get_ports(context, filters=filters)
         return network
 
+    def get_networks_info(self, context, **kwargs):
+        """Retrieve and return extended information about several networks.
+
+        Each network carries a revision, a hash of its content. The networks
+        whose revision is the one given for them in revisions are omitted.
+        """
+        network_ids = kwargs.get('network_ids')
+        revisions = kwargs.get('revisions') or {}
+        host = kwargs.get('host')
+        LOG.debug(_('Info of %(count)d networks requested from %(host)s'),
+                  {'count': len(network_ids), 'host': host})
+        if not network_ids:
+            return []
+        plugin = manager.QuantumManager.get_plugin()
+        networks = dict(
+            (network['id'], network) for network in
+            plugin.get_networks(context, filters=dict(id=network_ids)))
+        for network in networks.itervalues():
+            network['subnets'] = []
+            network['ports'] = []
+
+        filters = dict(network_id=network_ids)
+        for subnet in plugin.get_subnets(context, filters=filters):
+            networks[subnet['network_id']]['subnets'].append(subnet)
+        for port in plugin.get_ports(context, filters=filters):
+            networks[port['network_id']]['ports'].append(port)
+
+        changed = []
+        for network in networks.itervalues():
+            network['subnets'].sort(key=lambda subnet: subnet['id'])
+            network['ports'].sort(key=lambda port: port['id'])
+            revision = hashlib.md5(
+                jsonutils.dumps(network, sort_keys=True)).hexdigest()
+            if revisions.get(network['id']) != revision:
+                network['revision'] = revision
+                changed.append(network)
+        return changed
+
     def get_dhcp_port(self, context, **kwargs):
         """Allocate a DHCP port for the host and return port information.
 
@@ -0,0 +1,454 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address allocation backends for QuantumDbPluginV2."""
+
+import random
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy import exc as sql_exc
+from sqlalchemy.orm import exc
+
+from quantum.common import exceptions as q_exc
+from quantum.db import models_v2
+from quantum.openstack.common import importutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+ipam_opts = [
+    cfg.StrOpt('ipam_driver',
+               default='quantum.db.ipam.RangeIpamBackend',
+               help=_("The IP address allocation backend used by the "
+                      "database plugins")),
+    cfg.IntOpt('ipam_allocation_retries', default=10,
+               help=_("Number of addresses RandomIpamBackend tries before "
+                      "reloading the subnet allocations")),
+]
+cfg.CONF.register_opts(ipam_opts)
+
+_backends = {}
+
+
+def get_backend():
+    """Returns the configured IPAM backend, loading it the first time."""
+    driver = cfg.CONF.ipam_driver
+    if driver not in _backends:
+        _backends[driver] = importutils.import_object(driver)
+    return _backends[driver]
+
+
+class IpamBackend(object):
+    """Interface of the IP address allocation backends.
+
+    All the methods run in the transaction of the caller. Recording the
+    address in the IPAllocation table is done by the plugin, unless
+    generate_ip returns the allocation it created.
+    """
+
+    def create_pool(self, context, ip_pool):
+        """Called when an allocation pool is added to a subnet."""
+        pass
+
+    def generate_ip(self, context, subnets):
+        """Picks a free address from one of the subnets.
+
+        :returns: a dict with the ip_address and subnet_id, and the
+                  IPAllocation already added to the session as allocation
+                  when the backend created it.
+        :raises: IpAddressGenerationFailure
+        """
+        raise NotImplementedError()
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Removes an address requested by the user from the pool."""
+        pass
+
+    def recycle_ip(self, context, subnet_id, ip_address):
+        """Returns an address to the pool of the subnet.
+
+        :raises: InvalidInput if the address is in no allocation pool.
+        """
+        pass
+
+    def recycle_ips(self, context, subnet_id, ip_addresses):
+        """Returns several addresses to the pools of the subnet.
+
+        :raises: InvalidInput if an address is in no allocation pool.
+        """
+        for ip_address in ip_addresses:
+            self.recycle_ip(context, subnet_id, ip_address)
+
+
+def _find_pool(pools, ip_address):
+    """Returns the allocation pool containing ip_address.
+
+    :raises: InvalidInput if the address is in no allocation pool.
+    """
+    ip = netaddr.IPAddress(ip_address)
+    for pool in pools:
+        if ip in netaddr.IPRange(pool['first_ip'], pool['last_ip']):
+            return pool
+    error_message = _("No allocation pool found for "
+                      "ip address:%s") % ip_address
+    raise q_exc.InvalidInput(error_message=error_message)
+
+
+def _merge_ranges(ranges):
+    """Merges overlapping and adjacent (first, last) integer ranges."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class RangeIpamBackend(IpamBackend):
+    """Allocates addresses from the IPAvailabilityRange table.
+
+    The first address of the first available range is handed out, and the
+    ranges are split, shrunk and merged as addresses are allocated and
+    recycled. The range rows are locked for the duration of the
+    transaction.
+    """
+
+    def create_pool(self, context, ip_pool):
+        ip_range = models_v2.IPAvailabilityRange(
+            ipallocationpool=ip_pool,
+            first_ip=ip_pool['first_ip'],
+            last_ip=ip_pool['last_ip'])
+        context.session.add(ip_range)
+
+    def generate_ip(self, context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            range = range_qry.filter_by(subnet_id=subnet['id']).first()
+            if not range:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            ip_address = range['first_ip']
+            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
+                        "to %(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if range['first_ip'] == range['last_ip']:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange,
+            models_v2.IPAllocationPool).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id)
+        for (range, pool) in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=pool['id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def recycle_ip(self, context, subnet_id, ip_address):
+        # Grab all allocation pools for the subnet
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
+        # Find the allocation pool for the IP to recycle
+        pool_id = _find_pool(allocation_pools, ip_address)['id']
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+    def recycle_ips(self, context, subnet_id, ip_addresses):
+        """Merges the addresses into the ranges of their pools at once.
+
+        The ranges of each pool are rebuilt in memory; only the rows whose
+        bounds changed are deleted and added.
+        """
+        if not ip_addresses:
+            return
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        allocation_pools = list(pool_qry.filter_by(subnet_id=subnet_id))
+        recycled = {}
+        for ip_address in ip_addresses:
+            pool = _find_pool(allocation_pools, ip_address)
+            ip = netaddr.IPAddress(ip_address)
+            recycled.setdefault(pool['id'], []).append((int(ip), int(ip)))
+        version = ip.version
+
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        for pool_id, ranges in recycled.iteritems():
+            existing = {}
+            for ip_range in range_qry.filter_by(allocation_pool_id=pool_id):
+                first = int(netaddr.IPAddress(ip_range['first_ip']))
+                last = int(netaddr.IPAddress(ip_range['last_ip']))
+                existing[(first, last)] = ip_range
+            merged = _merge_ranges(ranges + existing.keys())
+            for bounds in set(existing) - set(merged):
+                context.session.delete(existing[bounds])
+            for first, last in merged:
+                if (first, last) not in existing:
+                    context.session.add(models_v2.IPAvailabilityRange(
+                        allocation_pool_id=pool_id,
+                        first_ip=str(netaddr.IPAddress(first, version)),
+                        last_ip=str(netaddr.IPAddress(last, version))))
+            LOG.debug(_("Recycled %(count)d addresses into %(ranges)d ranges "
+                        "of pool %(pool_id)s"),
+                      {'count': len(ranges), 'ranges': len(merged),
+                       'pool_id': pool_id})
+
+
+class SubnetAvailability(object):
+    """In-memory view of the allocated addresses of a subnet's pools."""
+
+    # Random picks tried before walking the pools for a free address.
+    RANDOM_PROBES = 16
+
+    def __init__(self, pools, allocated):
+        self.ranges = [(int(netaddr.IPAddress(first)),
+                        int(netaddr.IPAddress(last)))
+                       for first, last in pools]
+        self.size = sum(last - first + 1 for first, last in self.ranges)
+        self.allocated = set()
+        for ip_address in allocated:
+            self.add(ip_address)
+
+    def _in_pools(self, ip):
+        return any(first <= ip <= last for first, last in self.ranges)
+
+    def _nth(self, index):
+        for first, last in self.ranges:
+            if index <= last - first:
+                return first + index
+            index -= last - first + 1
+
+    def add(self, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        if self._in_pools(ip):
+            self.allocated.add(ip)
+
+    def remove(self, ip_address):
+        self.allocated.discard(int(netaddr.IPAddress(ip_address)))
+
+    def get_random_free(self, ip_version):
+        """Returns a random free address, or None if the pools are full."""
+        if len(self.allocated) >= self.size:
+            return None
+        for i in xrange(self.RANDOM_PROBES):
+            ip = self._nth(random.randrange(self.size))
+            if ip not in self.allocated:
+                return str(netaddr.IPAddress(ip, ip_version))
+        # Mostly allocated pools, walk them from a random offset. The size
+        # of an IPv6 pool does not fit in the range of xrange.
+        start = index = random.randrange(self.size)
+        while True:
+            ip = self._nth(index)
+            if ip not in self.allocated:
+                return str(netaddr.IPAddress(ip, ip_version))
+            index = (index + 1) % self.size
+            if index == start:
+                return None
+
+
+class RandomIpamBackend(IpamBackend):
+    """Allocates random addresses without locking shared rows.
+
+    Free addresses are picked at random from an in-memory view of each
+    subnet built from the IPAllocation table, and reserved by inserting
+    their IPAllocation row right away: the primary key of the table
+    rejects an address taken concurrently, in which case another one is
+    tried. After ipam_allocation_retries conflicts, or when a subnet looks
+    full, its view is reloaded from the database since other servers
+    allocate and release addresses too.
+
+    The IPAvailabilityRange table is not maintained by this backend.
+    """
+
+    def __init__(self):
+        self._subnets = {}
+
+    def _load_subnet(self, context, subnet_id):
+        pools = context.session.query(
+            models_v2.IPAllocationPool.first_ip,
+            models_v2.IPAllocationPool.last_ip).filter_by(subnet_id=subnet_id)
+        allocated = context.session.query(
+            models_v2.IPAllocation.ip_address).filter_by(subnet_id=subnet_id)
+        availability = SubnetAvailability(
+            list(pools), [row.ip_address for row in allocated])
+        self._subnets[subnet_id] = availability
+        return availability
+
+    def _get_subnet(self, context, subnet_id):
+        return (self._subnets.get(subnet_id) or
+                self._load_subnet(context, subnet_id))
+
+    def _try_allocate(self, context, subnet, ip_address):
+        allocation = models_v2.IPAllocation(network_id=subnet['network_id'],
+                                            subnet_id=subnet['id'],
+                                            ip_address=ip_address)
+        try:
+            with context.session.begin_nested():
+                context.session.add(allocation)
+        except sql_exc.IntegrityError:
+            LOG.debug(_("IP %(ip_address)s of subnet %(subnet_id)s was "
+                        "allocated concurrently"),
+                      {'ip_address': ip_address, 'subnet_id': subnet['id']})
+            return None
+        return allocation
+
+    def _generate_subnet_ip(self, context, subnet):
+        availability = self._get_subnet(context, subnet['id'])
+        reloaded = False
+        conflicts = 0
+        while True:
+            ip_address = availability.get_random_free(subnet['ip_version'])
+            if not ip_address or conflicts >= cfg.CONF.ipam_allocation_retries:
+                if reloaded:
+                    return None
+                availability = self._load_subnet(context, subnet['id'])
+                reloaded = True
+                conflicts = 0
+                continue
+            availability.add(ip_address)
+            allocation = self._try_allocate(context, subnet, ip_address)
+            if allocation:
+                return allocation
+            conflicts += 1
+
+    def generate_ip(self, context, subnets):
+        for subnet in subnets:
+            allocation = self._generate_subnet_ip(context, subnet)
+            if not allocation:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            LOG.debug(_("Allocated IP - %s"), allocation['ip_address'])
+            return {'ip_address': allocation['ip_address'],
+                    'subnet_id': subnet['id'],
+                    'allocation': allocation}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        if subnet_id in self._subnets:
+            self._subnets[subnet_id].add(ip_address)
+
+    def recycle_ip(self, context, subnet_id, ip_address):
+        self.recycle_ips(context, subnet_id, [ip_address])
+
+    def recycle_ips(self, context, subnet_id, ip_addresses):
+        pool_qry = context.session.query(models_v2.IPAllocationPool)
+        allocation_pools = list(pool_qry.filter_by(subnet_id=subnet_id))
+        for ip_address in ip_addresses:
+            _find_pool(allocation_pools, ip_address)
+        LOG.debug(_("Recycle %s"), ', '.join(ip_addresses))
+        availability = self._subnets.get(subnet_id)
+        if availability:
+            for ip_address in ip_addresses:
+                availability.remove(ip_address)
@@ -57,6 +57,9 @@ class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     admin_state_up = sa.Column(sa.Boolean)
     gw_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'))
     gw_port = orm.relationship(models_v2.Port)
+    # Bumped on every change sent to the l3 agents
+    revision = sa.Column(sa.Integer, nullable=False, default=0,
+                         server_default='0')
 
 
 class ExternalNetwork(model_base.BASEV2):
@@ -64,6 +67,12 @@ class ExternalNetwork(model_base.BASEV2):
                            sa.ForeignKey('networks.id', ondelete="CASCADE"),
                            primary_key=True)
 
+    # Add a relationship to the Network model so that network lists can
+    # load their external flag along with them
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('external', uselist=False, cascade='delete'))
+
 
 class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     """Represents a floating IP address.
@@ -84,6 +93,10 @@ class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
 class L3_NAT_db_mixin(l3.RouterPluginBase):
     """Mixin class to add L3/NAT router methods to db_plugin_base_v2."""
 
+    # Load the external flag of the networks along with them
+    _model_query_options = {
+        models_v2.Network: [orm.joinedload('external')]}
+
     def _network_model_hook(self, context, original_model, query):
         query = query.outerjoin(ExternalNetwork,
                                 (original_model.id ==
@@ -175,6 +188,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             # Ensure we actually have something to update
             if r.keys():
                 router_db.update(r)
+        self._bump_router_revision(context, id)
         routers = self.get_sync_data(context.elevated(),
                                      [router_db['id']])
         l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
@@ -268,6 +282,30 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             context.session.delete(router)
         l3_rpc_agent_api.L3AgentNotify.router_deleted(context, id)
 
+    def _bump_router_revision(self, context, router_id):
+        """Record a change of the router state known to the l3 agents.
+
+        Returns the new revision of the router, or None if it is gone.
+        """
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Router).filter_by(id=router_id)
+            query.update({Router.revision: Router.revision + 1},
+                         synchronize_session=False)
+            query = context.session.query(Router.revision)
+            return query.filter_by(id=router_id).scalar()
+
+    def _notify_router_delta(self, context, router_id, delta):
+        """Send the interfaces and floating IPs changed on a router.
+
+        Each item of the delta is a dict with the 'updated' objects and the
+        ids of the 'removed' ones, keyed by the key of the corresponding
+        list in the router dicts returned by get_sync_data.
+        """
+        revision = self._bump_router_revision(context, router_id)
+        if revision is not None:
+            l3_rpc_agent_api.L3AgentNotify.router_delta_updated(
+                context, router_id, revision, delta)
+
     def get_router(self, context, id, fields=None):
         router = self._get_router(context, id)
         return self._make_router_dict(router, fields)
@@ -371,11 +409,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                  'device_owner': DEVICE_OWNER_ROUTER_INTF,
                  'name': ''}})
 
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(
-            context, routers, 'add_router_interface',
-            {'network_id': port['network_id'],
-             'subnet_id': subnet_id})
+        interfaces = self.get_ports(context.elevated(),
+                                    filters={'id': [port['id']]})
+        self._populate_subnet_for_ports(context.elevated(), interfaces)
+        self._notify_router_delta(
+            context, router_id,
+            {l3_constants.INTERFACE_KEY: {'updated': interfaces}})
         info = {'id': router_id,
                 'tenant_id': subnet['tenant_id'],
                 'port_id': port['id'],
@@ -418,7 +457,6 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             subnet = self._get_subnet(context, subnet_id)
             self._confirm_router_interface_not_in_use(
                 context, router_id, subnet_id)
-            _network_id = port_db['network_id']
             self.delete_port(context, port_db['id'], l3_port_check=False)
         elif 'subnet_id' in interface_info:
             subnet_id = interface_info['subnet_id']
@@ -438,7 +476,6 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 for p in ports:
                     if p['fixed_ips'][0]['subnet_id'] == subnet_id:
                         port_id = p['id']
-                        _network_id = p['network_id']
                         self.delete_port(context, p['id'], l3_port_check=False)
                         found = True
                         break
@@ -448,11 +485,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             if not found:
                 raise l3.RouterInterfaceNotFoundForSubnet(router_id=router_id,
                                                           subnet_id=subnet_id)
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(
-            context, routers, 'remove_router_interface',
-            {'network_id': _network_id,
-             'subnet_id': subnet_id})
+        self._notify_router_delta(
+            context, router_id,
+            {l3_constants.INTERFACE_KEY: {'removed': [port_id]}})
         info = {'id': router_id,
                 'tenant_id': subnet['tenant_id'],
                 'port_id': port_id,
@@ -667,12 +702,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         except Exception:
             LOG.exception(_("Floating IP association failed"))
             raise
-        router_id = floatingip_db['router_id']
-        if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'create_floatingip')
-        return self._make_floatingip_dict(floatingip_db)
+        floatingip = self._make_floatingip_dict(floatingip_db)
+        if floatingip['router_id']:
+            self._notify_router_delta(
+                context, floatingip['router_id'],
+                {l3_constants.FLOATINGIP_KEY: {'updated': [floatingip]}})
+        return floatingip
 
     def update_floatingip(self, context, id, floatingip):
         fip = floatingip['floatingip']
@@ -685,17 +720,17 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             self._update_fip_assoc(context, fip, floatingip_db,
                                    self.get_port(context.elevated(),
                                                  fip_port_id))
-        router_ids = []
-        if before_router_id:
-            router_ids.append(before_router_id)
-        router_id = floatingip_db['router_id']
-        if router_id and router_id != before_router_id:
-            router_ids.append(router_id)
-        if router_ids:
-            routers = self.get_sync_data(context.elevated(), router_ids)
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'update_floatingip')
-        return self._make_floatingip_dict(floatingip_db)
+        floatingip = self._make_floatingip_dict(floatingip_db)
+        router_id = floatingip['router_id']
+        if before_router_id and before_router_id != router_id:
+            self._notify_router_delta(
+                context, before_router_id,
+                {l3_constants.FLOATINGIP_KEY: {'removed': [id]}})
+        if router_id:
+            self._notify_router_delta(
+                context, router_id,
+                {l3_constants.FLOATINGIP_KEY: {'updated': [floatingip]}})
+        return floatingip
 
     def delete_floatingip(self, context, id):
         floatingip = self._get_floatingip(context, id)
@@ -706,9 +741,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                              floatingip['floating_port_id'],
                              l3_port_check=False)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers,
-                                                           'delete_floatingip')
+            self._notify_router_delta(
+                context, router_id,
+                {l3_constants.FLOATINGIP_KEY: {'removed': [id]}})
 
     def get_floatingip(self, context, id, fields=None):
         floatingip = self._get_floatingip(context, id)
@@ -751,7 +786,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                                        DEVICE_OWNER_FLOATINGIP]:
             # Raise port in use only if the port has IP addresses
             # Otherwise it's a stale port that can be removed
-            fixed_ips = port_db['fixed_ips'].all()
+            fixed_ips = port_db['fixed_ips']
             if fixed_ips:
                 raise l3.L3PortInUse(port_id=port_id,
                                      device_owner=port_db['device_owner'])
@@ -766,6 +801,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             try:
                 fip_qry = context.session.query(FloatingIP)
                 floating_ip = fip_qry.filter_by(fixed_port_id=port_id).one()
+                floating_ip_id = floating_ip['id']
                 router_id = floating_ip['router_id']
                 floating_ip.update({'fixed_port_id': None,
                                     'fixed_ip_address': None,
@@ -777,8 +813,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 raise Exception(_('Multiple floating IPs found for port %s')
                                 % port_id)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_router_delta(
+                context, router_id,
+                {l3_constants.FLOATINGIP_KEY: {'removed': [floating_ip_id]}})
 
     def _check_l3_view_auth(self, context, network):
         return policy.check(context,
@@ -793,10 +830,14 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         except exc.NoResultFound:
             return False
 
-    def _extend_network_dict_l3(self, context, network):
+    def _extend_network_dict_l3(self, context, network, network_db=None):
         if self._check_l3_view_auth(context, network):
-            network[l3.EXTERNAL] = self._network_is_external(
-                context, network['id'])
+            if network_db is None:
+                network[l3.EXTERNAL] = self._network_is_external(
+                    context, network['id'])
+            else:
+                # The ExternalNetwork row, if any, is loaded with network_db
+                network[l3.EXTERNAL] = network_db.external is not None
 
     def _process_l3_create(self, context, net_data, net_id):
         external = net_data.get(l3.EXTERNAL)
@@ -877,10 +918,14 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         gw_port_id_gw_port_dict = {}
         for gw_port in gw_ports:
             gw_port_id_gw_port_dict[gw_port['id']] = gw_port
+        query = context.session.query(Router.id, Router.revision)
+        query = query.filter(Router.id.in_([r['id'] for r in router_dicts]))
+        revisions = dict(query)
         for router_dict in router_dicts:
             gw_port_id = router_dict['gw_port_id']
             if gw_port_id:
                 router_dict['gw_port'] = gw_port_id_gw_port_dict[gw_port_id]
+            router_dict['revision'] = revisions[router_dict['id']]
         return router_dicts
 
     def _get_sync_floating_ips(self, context, router_ids):
@@ -34,6 +34,10 @@ class SecurityGroup(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
 
     name = sa.Column(sa.String(255))
     description = sa.Column(sa.String(255))
+    # Incremented whenever the rules or the members of the group change,
+    # see SecurityGroupServerRpcMixin
+    generation = sa.Column(sa.Integer, nullable=False, default=0,
+                           server_default='0')
 
 
 class SecurityGroupPortBinding(model_base.BASEV2):
@@ -35,6 +35,43 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
 
+class SecurityGroupCache(object):
+    """Caches values computed for each security group.
+
+    An entry is tagged with the generation the group had when its value was
+    computed, and is used as long as the group keeps this generation. The
+    generations are stored in the database, so the entries are invalidated
+    by the changes made through any server.
+    """
+
+    def __init__(self):
+        # security group id => (generation, value)
+        self._entries = {}
+
+    def get(self, generations, load):
+        """Return the values of the groups, loading the stale ones.
+
+        :param generations: a dict mapping security group ids to their
+            current generation
+        :param load: called with the ids of the groups without an up to
+            date entry, returns a dict mapping them to their value
+        :returns: a dict mapping the security group ids to their value
+        """
+        stale = [sg_id for sg_id, generation in generations.iteritems()
+                 if self._entries.get(sg_id, (None,))[0] != generation]
+        if stale:
+            values = load(stale)
+            for sg_id in stale:
+                self._entries[sg_id] = (generations[sg_id], values[sg_id])
+        return dict((sg_id, self._entries[sg_id][1])
+                    for sg_id in generations)
+
+
+# Rules and member ips of the security groups, shared by the RPC callbacks
+_RULES_CACHE = SecurityGroupCache()
+_MEMBER_IPS_CACHE = SecurityGroupCache()
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -42,6 +79,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        self._bump_security_group_generations(context, sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -51,6 +89,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        self._bump_security_group_generations(context, sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -58,9 +97,39 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        self._bump_security_group_generations(context,
+                                              [rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
+    def delete_security_group(self, context, id):
+        # The rules of other groups using this group as remote group are
+        # deleted along with it
+        sgr_model = sg_db.SecurityGroupRule
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(sgr_model.security_group_id)
+            query = query.filter(sgr_model.remote_group_id == id)
+            sgids = set(sgid for sgid, in query) - set([id])
+            super(SecurityGroupServerRpcMixin,
+                  self).delete_security_group(context, id)
+            self._bump_security_group_generations(context, sgids)
+
+    def _bump_security_group_generations(self, context, security_group_ids):
+        """Invalidate the rules and members cached for the groups.
+
+        This must be called once the changes are written, as a server
+        computing the rules of a group would otherwise cache stale rules
+        along with the new generation.
+        """
+        if not security_group_ids:
+            return
+        sg_model = sg_db.SecurityGroup
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(sg_model)
+            query = query.filter(sg_model.id.in_(security_group_ids))
+            query.update({sg_model.generation: sg_model.generation + 1},
+                         synchronize_session=False)
+
     def update_security_group_on_port(self, context, id, port,
                                       original_port, updated_port):
         """Update security groups on port.
@@ -98,6 +167,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             not utils.compare_elements(
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
+            # the groups the port left lose a member
+            self._bump_security_group_generations(
+                context, original_port.get(ext_sg.SECURITYGROUPS))
             self.notify_security_groups_member_updated(
                 context, updated_port)
             need_notify = True
@@ -114,6 +186,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
         """
+        self._bump_security_group_generations(
+            context, port.get(ext_sg.SECURITYGROUPS))
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
         else:
@@ -135,40 +209,120 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :params devices: list of devices
         :returns: port correspond to the devices with security group rules
         """
-        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group rules and remote group members.
 
+        Unlike security_group_rules_for_devices, the remote_group_id rules
+        are not expanded into one rule per member of the remote group. The
+        members are returned once for each group instead, for the agents
+        matching them with ipset.
+
+        :params devices: list of devices
+        :returns: a dict with the ports corresponding to the devices, with
+            their security group rules, under 'devices', and the member ips
+            of the remote groups by ethertype under 'sg_member_ips'
+        """
+        ports = self._get_ports_for_devices(kwargs.get('devices'))
+        self._collect_security_group_rules(context, ports)
+        remote_group_ids = self._select_remote_group_ids(ports)
+        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        sg_member_ips = {}
+        for remote_group_id, group_ips in ips.iteritems():
+            members = {q_const.IPv4: [], q_const.IPv6: []}
+            for ip in group_ips:
+                version = netaddr.IPAddress(ip).version
+                members['IPv%s' % version].append(ip)
+            sg_member_ips[remote_group_id] = members
+        for port in ports.values():
+            port['security_group_source_groups'].extend(
+                set(rule['remote_group_id']
+                    for rule in port['security_group_rules']
+                    if rule.get('remote_group_id')))
+        return {'devices': ports, 'sg_member_ips': sg_member_ips}
+
+    def get_port_dicts_from_devices(self, devices):
+        """Return a dict mapping the devices to their ports.
+
+        The ports are returned as by get_port_from_device, which is called
+        for each device unless the plugin looks them up in bulk.
+        """
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
-            if not port:
-                continue
+            if port:
+                ports[device] = port
+        return ports
+
+    def _get_ports_for_devices(self, devices):
+        ports = {}
+        for port in self.get_port_dicts_from_devices(devices).values():
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
-    def _select_rules_for_ports(self, context, ports):
-        if not ports:
-            return []
-        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
-        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+    def _select_security_group_generations(self, context,
+                                           security_group_ids):
+        if not security_group_ids:
+            return {}
+        sg_model = sg_db.SecurityGroup
+        query = context.session.query(sg_model.id, sg_model.generation)
+        query = query.filter(sg_model.id.in_(set(security_group_ids)))
+        return dict(query)
 
-        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+    def _select_rules_for_security_groups(self, context, security_group_ids):
+        """Return the rules of the groups, as sent to the agents.
 
-        query = context.session.query(sg_db.SecurityGroupPortBinding,
-                                      sg_db.SecurityGroupRule)
-        query = query.join(sg_db.SecurityGroupRule,
-                           sgr_sgid == sg_binding_sgid)
-        query = query.filter(sg_binding_port.in_(ports.keys()))
-        return query.all()
+        The rules are cached and shared by all the ports of the groups, so
+        they must not be modified.
+        """
+        generations = self._select_security_group_generations(
+            context, security_group_ids)
+        return _RULES_CACHE.get(
+            generations,
+            lambda sg_ids: self._load_rules_for_security_groups(context,
+                                                                sg_ids))
+
+    def _load_rules_for_security_groups(self, context, security_group_ids):
+        rules_by_group = dict((sg_id, []) for sg_id in security_group_ids)
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(security_group_ids))
+        for rule_in_db in query:
+            direction = rule_in_db['direction']
+            rule_dict = {
+                'security_group_id': rule_in_db['security_group_id'],
+                'direction': direction,
+                'ethertype': rule_in_db['ethertype'],
+            }
+            for key in ('protocol', 'port_range_min', 'port_range_max',
+                        'remote_ip_prefix', 'remote_group_id'):
+                if rule_in_db.get(key):
+                    if key == 'remote_ip_prefix':
+                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                        rule_dict[direction_ip_prefix] = rule_in_db[key]
+                        continue
+                    rule_dict[key] = rule_in_db[key]
+            rules_by_group[rule_in_db['security_group_id']].append(rule_dict)
+        return rules_by_group
 
     def _select_ips_for_remote_group(self, context, remote_group_ids):
-        ips_by_group = {}
-        if not remote_group_ids:
-            return ips_by_group
-        for remote_group_id in remote_group_ids:
-            ips_by_group[remote_group_id] = []
+        """Return the member ips of the groups, which must not be modified."""
+        ips_by_group = dict((remote_group_id, [])
+                            for remote_group_id in remote_group_ids)
+        generations = self._select_security_group_generations(
+            context, remote_group_ids)
+        ips_by_group.update(_MEMBER_IPS_CACHE.get(
+            generations,
+            lambda sg_ids: self._load_ips_for_security_groups(context,
+                                                              sg_ids)))
+        return ips_by_group
 
+    def _load_ips_for_security_groups(self, context, security_group_ids):
+        ips_by_group = dict((sg_id, []) for sg_id in security_group_ids)
         ip_port = models_v2.IPAllocation.port_id
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
         sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
@@ -177,7 +331,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
                                       models_v2.IPAllocation.ip_address)
         query = query.join(models_v2.IPAllocation,
                            ip_port == sg_binding_port)
-        query = query.filter(sg_binding_sgid.in_(remote_group_ids))
+        query = query.filter(sg_binding_sgid.in_(security_group_ids))
         for security_group_id, ip_address in query:
             ips_by_group[security_group_id].append(ip_address)
         return ips_by_group
@@ -279,24 +433,15 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
-        rules_in_db = self._select_rules_for_ports(context, ports)
-        for (binding, rule_in_db) in rules_in_db:
-            port_id = binding['port_id']
-            port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
-        self._apply_provider_rule(context, ports)
+        self._collect_security_group_rules(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _collect_security_group_rules(self, context, ports):
+        sg_ids = set()
+        for port in ports.values():
+            sg_ids.update(port[ext_sg.SECURITYGROUPS])
+        rules = self._select_rules_for_security_groups(context, sg_ids)
+        for port in ports.values():
+            for sg_id in port[ext_sg.SECURITYGROUPS]:
+                port['security_group_rules'].extend(rules.get(sg_id, []))
+        self._apply_provider_rule(context, ports)
@@ -105,6 +105,23 @@ class HyperVPluginDB(object):
             port = None
         return port
 
+    def get_ports(self, port_ids):
+        if not port_ids:
+            return {}
+        session = db_api.get_session()
+        ports = (session.query(models_v2.Port).
+                 filter(models_v2.Port.id.in_(port_ids)))
+        return dict((port.id, port) for port in ports)
+
+    def get_network_bindings(self, session, network_ids):
+        if not network_ids:
+            return {}
+        session = session or db_api.get_session()
+        binding_q = session.query(hyperv_model.NetworkBinding)
+        binding_q = binding_q.filter(
+            hyperv_model.NetworkBinding.network_id.in_(network_ids))
+        return dict((binding.network_id, binding) for binding in binding_q)
+
     def get_network_binding(self, session, network_id):
         session = session or db_api.get_session()
         try:
@@ -124,6 +141,15 @@ class HyperVPluginDB(object):
         except exc.NoResultFound:
             raise q_exc.PortNotFound(port_id=port_id)
 
+    def set_ports_status(self, port_ids, status):
+        if not port_ids:
+            return
+        session = db_api.get_session()
+        with session.begin():
+            port_q = session.query(models_v2.Port)
+            port_q = port_q.filter(models_v2.Port.id.in_(port_ids))
+            port_q.update({'status': status}, synchronize_session=False)
+
     def release_vlan(self, session, physical_network, vlan_id):
         with session.begin(subtransactions=True):
             try:
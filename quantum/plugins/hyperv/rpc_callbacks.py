@@ -31,8 +31,11 @@ class HyperVRpcCallbacks(
         dhcp_rpc_base.DhcpRpcCallbackMixin,
         l3_rpc_base.L3RpcCallbackMixin):
 
-    # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.0 Initial version
+    #   1.1 Support get_devices_details_list and update_devices_down
+    #   1.2 Support get_networks_info
+    RPC_API_VERSION = '1.2'
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -46,6 +49,16 @@ class HyperVRpcCallbacks(
         '''
         return q_rpc.PluginRpcDispatcher([self])
 
+    @staticmethod
+    def _make_device_details(device, port, binding):
+        return {'device': device,
+                'network_id': port['network_id'],
+                'port_id': port['id'],
+                'admin_state_up': port['admin_state_up'],
+                'network_type': binding.network_type,
+                'segmentation_id': binding.segmentation_id,
+                'physical_network': binding.physical_network}
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
@@ -55,13 +68,7 @@ class HyperVRpcCallbacks(
         port = self._db.get_port(device)
         if port:
             binding = self._db.get_network_binding(None, port['network_id'])
-            entry = {'device': device,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up'],
-                     'network_type': binding.network_type,
-                     'segmentation_id': binding.segmentation_id,
-                     'physical_network': binding.physical_network}
+            entry = self._make_device_details(device, port, binding)
             # Set the port status to UP
             self._db.set_port_status(port['id'], q_const.PORT_STATUS_ACTIVE)
         else:
@@ -69,6 +76,47 @@ class HyperVRpcCallbacks(
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices at once."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Details for devices %(devices)s requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = self._db.get_ports(devices)
+        bindings = self._db.get_network_bindings(
+            None, set(port['network_id'] for port in ports.itervalues()))
+        entries = []
+        for device in devices:
+            port = ports.get(device)
+            if port:
+                binding = bindings[port['network_id']]
+                entries.append(self._make_device_details(device, port,
+                                                         binding))
+            else:
+                entries.append({'device': device})
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set the port status to UP
+        self._db.set_ports_status(ports.keys(), q_const.PORT_STATUS_ACTIVE)
+        return entries
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Several devices no longer exist on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = self._db.get_ports(devices)
+        entries = []
+        for device in devices:
+            entries.append({'device': device,
+                            'exists': device in ports})
+            if device not in ports:
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set port status to DOWN
+        self._db.set_ports_status(ports.keys(), q_const.PORT_STATUS_DOWN)
+        return entries
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         # TODO(garyk) - live migration and port status
@@ -55,6 +55,7 @@ BRIDGE_NAME_PLACEHOLDER = "bridge_name"
 BRIDGE_INTERFACES_FS = BRIDGE_FS + BRIDGE_NAME_PLACEHOLDER + "/brif/"
 DEVICE_NAME_PLACEHOLDER = "device_name"
 BRIDGE_PORT_FS_FOR_DEVICE = BRIDGE_FS + DEVICE_NAME_PLACEHOLDER + "/brport"
+BRIDGE_FOR_DEVICE_FS = BRIDGE_PORT_FS_FOR_DEVICE + "/bridge"
 
 
 class LinuxBridgeManager:
@@ -64,8 +65,8 @@ class LinuxBridgeManager:
         self.ip = ip_lib.IPWrapper(self.root_helper)
 
         self.udev = pyudev.Context()
-        monitor = pyudev.Monitor.from_netlink(self.udev)
-        monitor.filter_by('net')
+        self.udev_monitor = pyudev.Monitor.from_netlink(self.udev)
+        self.udev_monitor.filter_by('net')
 
     def device_exists(self, device):
         """Check if ethernet device exists."""
@@ -119,13 +120,14 @@ class LinuxBridgeManager:
             return os.listdir(bridge_interface_path)
 
     def get_bridge_for_tap_device(self, tap_device_name):
-        bridges = self.get_all_quantum_bridges()
-        for bridge in bridges:
-            interfaces = self.get_interfaces_on_bridge(bridge)
-            if tap_device_name in interfaces:
-                return bridge
-
-        return None
+        # A single readlink, always up to date, instead of listing the
+        # interfaces of every bridge
+        bridge_path = BRIDGE_FOR_DEVICE_FS.replace(
+            DEVICE_NAME_PLACEHOLDER, tap_device_name)
+        try:
+            return os.path.basename(os.readlink(bridge_path))
+        except OSError:
+            return None
 
     def is_device_on_bridge(self, device_name):
         if not device_name:
@@ -397,6 +399,29 @@ class LinuxBridgeManager:
                 devices.add(name)
         return devices
 
+    def udev_get_tap_events(self, timeout, batch_interval):
+        """Wait up to timeout seconds for tap device events.
+
+        The events received within batch_interval seconds of the first one
+        are merged, the last event of a device winning. Returns the sets of
+        added and removed tap devices.
+        """
+        actions = {}
+        device = self.udev_monitor.poll(max(timeout, 0))
+        deadline = time.time() + batch_interval
+        while device is not None:
+            name = self.udev_get_name(device)
+            if (self.is_tap_device(name) and
+                    device.action in ('add', 'remove')):
+                actions[name] = device.action
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            device = self.udev_monitor.poll(remaining)
+        added = set(name for name, action in actions.iteritems()
+                    if action == 'add')
+        return added, set(actions) - added
+
     def is_tap_device(self, name):
         return name.startswith(TAP_INTERFACE_PREFIX)
 
@@ -433,7 +458,7 @@ class LinuxBridgeRpcCallbacks(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             return
 
         if 'security_groups' in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_firewall([tap_device_name])
 
         if port['admin_state_up']:
             vlan_id = kwargs.get('vlan_id')
@@ -553,20 +578,19 @@ class LinuxBridgeQuantumAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
         return (resync_a | resync_b)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             LOG.debug(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -581,27 +605,27 @@ class LinuxBridgeQuantumAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                                              details['port_id'])
             else:
                 LOG.info(_("Device %s not defined on plugin"), device)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.remove_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
-        return resync
+        return False
 
     def daemon_loop(self):
         sync = True
@@ -643,6 +667,57 @@ class LinuxBridgeQuantumAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                           {'polling_interval': self.polling_interval,
                            'elapsed': elapsed})
 
+    def udev_daemon_loop(self):
+        """Handle the tap devices as udev reports them.
+
+        The devices are all listed every udev_resync_interval seconds, and
+        whenever the agent gets out of sync with the plugin.
+        """
+        resync_interval = cfg.CONF.AGENT.udev_resync_interval
+        batch_interval = cfg.CONF.AGENT.udev_batch_interval
+        sync = True
+        devices = set()
+        next_scan = 0
+
+        LOG.info(_("LinuxBridge Agent RPC Daemon Started!"))
+
+        # Listen before the first scan so that no event is missed
+        self.br_mgr.udev_monitor.start()
+        while True:
+            device_info = {}
+            try:
+                if sync or time.time() >= next_scan:
+                    if sync:
+                        LOG.info(_("Agent out of sync with plugin!"))
+                        devices.clear()
+                        sync = False
+                    next_scan = time.time() + resync_interval
+                    device_info = self.br_mgr.update_devices(devices)
+                else:
+                    added, removed = self.br_mgr.udev_get_tap_events(
+                        next_scan - time.time(), batch_interval)
+                    added -= devices
+                    removed &= devices
+                    if added or removed:
+                        device_info = {'current': (devices | added) - removed,
+                                       'added': added,
+                                       'removed': removed}
+            except Exception:
+                LOG.exception(_("Update devices failed"))
+                sync = True
+                # Do not retry in a busy loop
+                time.sleep(self.polling_interval)
+            try:
+                if device_info:
+                    LOG.debug(_("Agent loop has new devices!"))
+                    sync = self.process_network_devices(device_info)
+                    devices = device_info['current']
+            except Exception:
+                LOG.exception(_("Error in agent loop. Devices info: %s"),
+                              device_info)
+                sync = True
+                time.sleep(self.polling_interval)
+
 
 def main():
     eventlet.monkey_patch()
@@ -664,7 +739,10 @@ def main():
                                         polling_interval,
                                         root_helper)
     LOG.info(_("Agent initialized successfully, now running... "))
-    plugin.daemon_loop()
+    if cfg.CONF.AGENT.udev_monitor:
+        plugin.udev_daemon_loop()
+    else:
+        plugin.daemon_loop()
     sys.exit(0)
 
 
@@ -46,6 +46,15 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('udev_monitor', default=False,
+                help=_("Detect the tap devices from udev events instead of "
+                       "polling for them.")),
+    cfg.FloatOpt('udev_batch_interval', default=0.2,
+                 help=_("The number of seconds during which the udev "
+                        "events are merged into one batch.")),
+    cfg.IntOpt('udev_resync_interval', default=60,
+               help=_("The number of seconds between the full scans of the "
+                      "local devices when udev_monitor is set.")),
 ]
 
 
@@ -14,6 +14,8 @@
 # limitations under the License.
 
 
+import sqlalchemy as sa
+from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
 from quantum.common import exceptions as q_exc
@@ -201,9 +203,51 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Returns a dict mapping network ids to their bindings."""
+    if not network_ids:
+        return {}
+    bindings = (session.query(l2network_models_v2.NetworkBinding).
+                filter(l2network_models_v2.NetworkBinding.network_id.in_(
+                    network_ids)))
+    return dict((binding.network_id, binding) for binding in bindings)
+
+
+def get_ports_from_id_prefixes(prefixes):
+    """Returns a dict mapping port id prefixes to the ports they identify.
+
+    All the ports are retrieved with a single query.
+    """
+    if not prefixes:
+        return {}
+    session = db.get_session()
+    query = session.query(models_v2.Port).filter(
+        sa.or_(*[models_v2.Port.id.startswith(prefix)
+                 for prefix in prefixes]))
+    lengths = set(len(prefix) for prefix in prefixes)
+    ports = {}
+    for port in query:
+        for length in lengths:
+            if port.id[:length] in prefixes:
+                ports[port.id[:length]] = port
+    return ports
+
+
 def get_port_from_device(device):
     """Get port from database."""
     LOG.debug(_("get_port_from_device() called"))
+    return get_port_dicts_from_devices([device]).get(device)
+
+
+def get_port_dicts_from_devices(devices):
+    """Get the ports of several devices from database with a single query.
+
+    Returns a dict mapping the devices, which are port id prefixes, to the
+    ports found.
+    """
+    LOG.debug(_("get_port_dicts_from_devices() called"))
+    if not devices:
+        return {}
     session = db.get_session()
     sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
 
@@ -211,22 +255,42 @@ def get_port_from_device(device):
                           sg_db.SecurityGroupPortBinding.security_group_id)
     query = query.outerjoin(sg_db.SecurityGroupPortBinding,
                             models_v2.Port.id == sg_binding_port)
-    query = query.filter(models_v2.Port.id.startswith(device))
-    port_and_sgs = query.all()
-    if not port_and_sgs:
-        return
-    port = port_and_sgs[0][0]
+    query = query.options(orm.joinedload(models_v2.Port.fixed_ips))
+    query = query.filter(sa.or_(*[models_v2.Port.id.startswith(device)
+                                  for device in devices]))
+    lengths = set(len(device) for device in devices)
     plugin = manager.QuantumManager.get_plugin()
-    port_dict = plugin._make_port_dict(port)
-    port_dict['security_groups'] = []
-    for port_in_db, sg_id in port_and_sgs:
+    ports = {}
+    for port, sg_id in query:
+        port_dict = ports.get(port.id)
+        if not port_dict:
+            port_dict = plugin._make_port_dict(port)
+            port_dict['security_groups'] = []
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            ports[port.id] = port_dict
         if sg_id:
             port_dict['security_groups'].append(sg_id)
-    port_dict['security_group_rules'] = []
-    port_dict['security_group_source_groups'] = []
-    port_dict['fixed_ips'] = [ip['ip_address']
-                              for ip in port['fixed_ips']]
-    return port_dict
+    devices = set(devices)
+    ports_by_device = {}
+    for port_id, port_dict in ports.iteritems():
+        for length in lengths:
+            if port_id[:length] in devices:
+                ports_by_device[port_id[:length]] = port_dict
+    return ports_by_device
+
+
+def set_ports_status(port_ids, status):
+    """Set the status of several ports with a single statement."""
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin():
+        (session.query(models_v2.Port).
+         filter(models_v2.Port.id.in_(port_ids)).
+         update({'status': status}, synchronize_session=False))
 
 
 def set_port_status(port_id, status):
@@ -14,8 +14,10 @@
 # limitations under the License.
 
 import sqlalchemy as sa
+from sqlalchemy import orm
 
 from quantum.db import model_base
+from quantum.db import models_v2
 
 
 class NetworkState(model_base.BASEV2):
@@ -48,6 +50,13 @@ class NetworkBinding(model_base.BASEV2):
     physical_network = sa.Column(sa.String(64))
     vlan_id = sa.Column(sa.Integer, nullable=False)
 
+    # Add a relationship to the Network model so that network lists can
+    # load their binding along with them
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('linuxbridge_binding', uselist=False,
+                            cascade='delete'))
+
     def __init__(self, network_id, physical_network, vlan_id):
         self.network_id = network_id
         self.physical_network = physical_network
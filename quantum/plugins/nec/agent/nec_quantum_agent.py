@@ -86,7 +86,7 @@ class NECAgentRpcCallback(object):
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_firewall([port['id']])
 
 
 class SecurityGroupServerRpcApi(proxy.RpcProxy,
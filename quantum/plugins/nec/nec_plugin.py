@@ -605,7 +605,10 @@ class NECPluginV2AgentNotifierApi(proxy.RpcProxy,
 
 class DhcpRpcCallback(dhcp_rpc_base.DhcpRpcCallbackMixin):
     # DhcpPluginApi BASE_RPC_API_VERSION
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.0 Initial version
+    #   1.1 Support get_networks_info
+    RPC_API_VERSION = '1.1'
 
 
 class L3RpcCallback(l3_rpc_base.L3RpcCallbackMixin):
@@ -616,7 +619,7 @@ class L3RpcCallback(l3_rpc_base.L3RpcCallbackMixin):
 class SecurityGroupServerRpcCallback(
     sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = sg_rpc.SG_RPC_VERSION
+    RPC_API_VERSION = sg_rpc.SG_INFO_RPC_VERSION
 
     @staticmethod
     def get_port_from_device(device):
@@ -628,6 +631,13 @@ class SecurityGroupServerRpcCallback(
                   {'device': device, 'ret': port})
         return port
 
+    @staticmethod
+    def get_port_dicts_from_devices(devices):
+        ports = ndb.get_port_dicts_from_devices(devices)
+        for device, port in ports.iteritems():
+            port['device'] = device
+        return ports
+
 
 class NECPluginV2RPCCallbacks(object):
 
@@ -55,6 +55,7 @@ from quantum.plugins.nicira.common import config  # noqa
 from quantum.plugins.nicira.common import exceptions as nvp_exc
 from quantum.plugins.nicira.common import metadata_access as nvp_meta
 from quantum.plugins.nicira.common import securitygroups as nvp_sec
+from quantum.plugins.nicira.common import sync
 from quantum.plugins.nicira.extensions import nvp_networkgw as networkgw
 from quantum.plugins.nicira.extensions import nvp_qos as ext_qos
 from quantum.plugins.nicira import nicira_db
@@ -105,8 +106,10 @@ def create_nvp_cluster(cluster_opts, concurrent_connections,
 
 class NVPRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.0 Initial version
+    #   1.1 Support get_networks_info
+    RPC_API_VERSION = '1.1'
 
     def create_rpc_dispatcher(self):
         '''Get the rpc dispatcher for this manager.
@@ -185,6 +188,13 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         db.configure_db()
         # Extend the fault map
         self._extend_fault_map()
+        # Copy the status of the NVP resources into the DB in the background
+        self.nvp_sync = None
+        if cfg.CONF.NVP_SYNC.state_sync_interval:
+            self.nvp_sync = sync.NvpSynchronizer(
+                self.cluster, cfg.CONF.NVP_SYNC.state_sync_interval,
+                cfg.CONF.NVP_SYNC.chunk_size)
+            self.nvp_sync.start()
         # Set up RPC interface for DHCP agent
         self.setup_rpc()
         self.network_scheduler = importutils.import_object(
@@ -193,6 +203,14 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         # been yet updated from the config file
         self._is_default_net_gw_in_sync = False
 
+    def _read_status_from_nvp(self):
+        """Whether the status of the resources must be read from NVP.
+
+        Otherwise the status stored in the DB by the synchronizer is used.
+        """
+        return (self.nvp_sync is None or
+                cfg.CONF.NVP_SYNC.always_read_status)
+
     def _ensure_default_network_gateway(self):
         if self._is_default_net_gw_in_sync:
             return
@@ -889,7 +907,8 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             # goto to the plugin DB and fetch the network
             network = self._get_network(context, id)
             # if the network is external, do not go to NVP
-            if not self._network_is_external(context, id):
+            if (self._read_status_from_nvp() and
+                    not self._network_is_external(context, id)):
                 # verify the fabric status of the corresponding
                 # logical switch(es) in nvp
                 try:
@@ -943,6 +962,8 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                 self._extend_network_qos_queue(context, net)
 
             tenant_ids = filters and filters.get('tenant_id') or None
+        if not self._read_status_from_nvp():
+            return [self._fields(net, fields) for net in quantum_lswitches]
         filter_fmt = "&tag=%s&tag_scope=os_tid"
         if context.is_admin and not tenant_ids:
             tenant_filter = ""
@@ -1043,6 +1064,8 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                 context, filters)
             for quantum_lport in quantum_lports:
                 self._extend_port_port_security_dict(context, quantum_lport)
+        if not self._read_status_from_nvp():
+            return [self._fields(port, fields) for port in quantum_lports]
         if (filters.get('network_id') and len(filters.get('network_id')) and
             self._network_is_external(context, filters['network_id'][0])):
             # Do not perform check on NVP platform
@@ -1349,8 +1372,9 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_port_port_security_dict(context, quantum_db_port)
             self._extend_port_qos_queue(context, quantum_db_port)
 
-            if self._network_is_external(context,
-                                         quantum_db_port['network_id']):
+            if (not self._read_status_from_nvp() or
+                self._network_is_external(context,
+                                          quantum_db_port['network_id'])):
                 return quantum_db_port
             nvp_id = self._nvp_get_port_id(context, self.cluster,
                                            quantum_db_port)
@@ -1486,6 +1510,8 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
     def get_router(self, context, id, fields=None):
         router = self._get_router(context, id)
+        if not self._read_status_from_nvp():
+            return self._make_router_dict(router, fields)
         try:
             try:
                 lrouter = nvplib.get_lrouter(self.cluster, id)
@@ -1520,6 +1546,9 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._model_query(context, l3_db.Router),
             l3_db.Router, filters)
         routers = router_query.all()
+        if not self._read_status_from_nvp():
+            return [self._make_router_dict(router, fields)
+                    for router in routers]
         # Query routers on NVP for updating operational status
         if context.is_admin and not filters.get("tenant_id"):
             tenant_id = None
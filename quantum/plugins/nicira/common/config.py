@@ -90,10 +90,25 @@ cluster_opts = [
                       "network connection")),
 ]
 
+sync_opts = [
+    cfg.IntOpt('state_sync_interval', default=120,
+               help=_("Interval in seconds between runs of the status "
+                      "synchronization task. The requests to NVP are spread "
+                      "over this interval. 0 disables the task, and the "
+                      "status is then read from NVP on every request.")),
+    cfg.IntOpt('chunk_size', default=500,
+               help=_("Number of resources fetched from NVP in each "
+                      "request of the status synchronization task.")),
+    cfg.BoolOpt('always_read_status', default=False,
+                help=_("Read the status of the resources from NVP on every "
+                       "request even when the synchronization task runs.")),
+]
+
 # Register the configuration options
 cfg.CONF.register_opts(connection_opts)
 cfg.CONF.register_opts(cluster_opts)
 cfg.CONF.register_opts(nvp_opts, "NVP")
+cfg.CONF.register_opts(sync_opts, "NVP_SYNC")
 cfg.CONF.register_opts(scheduler.AGENTS_SCHEDULER_OPTS)
 # NOTE(armando-migliaccio): keep the following code until we support
 # NVP configuration files in older format (Grizzly or older).
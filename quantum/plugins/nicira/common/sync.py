@@ -0,0 +1,157 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Nicira, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import greenthread
+
+from quantum.common import constants
+from quantum import context
+from quantum.db import l3_db
+from quantum.db import models_v2
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import loopingcall
+from quantum.plugins.nicira import nvplib
+
+LOG = logging.getLogger(__name__)
+
+
+def _get_tag(resource, scope):
+    for tag in resource.get('tags', []):
+        if tag['scope'] == scope:
+            return tag['tag']
+
+
+class NvpSynchronizer(object):
+    """Copies the operational status of NVP resources into the Quantum DB.
+
+    The logical switches, routers and ports are all fetched every
+    state_sync_interval seconds, in pages of chunk_size resources. The
+    requests are spread over the interval, according to the number of
+    pages of the previous run, so that the controllers are not loaded in
+    bursts.
+    """
+
+    LSWITCH_URI = nvplib._build_uri_path(
+        nvplib.LSWITCH_RESOURCE,
+        fields='uuid,tags,fabric_status',
+        relations='LogicalSwitchStatus')
+    LROUTER_URI = nvplib._build_uri_path(
+        nvplib.LROUTER_RESOURCE,
+        fields='uuid,fabric_status',
+        relations='LogicalRouterStatus')
+    LSWITCHPORT_URI = nvplib._build_uri_path(
+        nvplib.LSWITCHPORT_RESOURCE,
+        parent_resource_id='*',
+        fields='uuid,tags,fabric_status_up',
+        relations='LogicalPortStatus')
+
+    def __init__(self, cluster, state_sync_interval, chunk_size):
+        self.cluster = cluster
+        self.state_sync_interval = state_sync_interval
+        self.chunk_size = chunk_size
+        # Number of pages fetched by the previous run
+        self._pages = 3
+        # Networks found down during the current run
+        self._down_networks = set()
+        self._loop = None
+
+    def start(self):
+        self._loop = loopingcall.FixedIntervalLoopingCall(
+            self.synchronize_state)
+        self._loop.start(interval=self.state_sync_interval)
+
+    def stop(self):
+        if self._loop:
+            self._loop.stop()
+
+    def synchronize_state(self):
+        try:
+            self._synchronize_state(context.get_admin_context())
+        except Exception:
+            # Do not stop the looping call
+            LOG.exception(_("Unable to synchronize the status of the NVP "
+                            "resources"))
+
+    def _synchronize_state(self, ctx):
+        delay = float(self.state_sync_interval) / max(self._pages, 1)
+        self._down_networks = set()
+        pages = 0
+        for uri, sync_func in ((self.LSWITCH_URI, self._sync_lswitches),
+                               (self.LROUTER_URI, self._sync_lrouters),
+                               (self.LSWITCHPORT_URI, self._sync_lports)):
+            page_cursor = None
+            while True:
+                if pages:
+                    greenthread.sleep(delay)
+                results, page_cursor, _count = nvplib.get_single_query_page(
+                    uri, self.cluster, page_cursor, self.chunk_size)
+                pages += 1
+                sync_func(ctx, results)
+                if not page_cursor:
+                    break
+        LOG.debug(_("Synchronized the status of the NVP resources in "
+                    "%d requests"), pages)
+        self._pages = pages
+
+    def _update_status(self, ctx, model, statuses):
+        ids_by_status = {}
+        for res_id, status in statuses.iteritems():
+            ids_by_status.setdefault(status, []).append(res_id)
+        with ctx.session.begin(subtransactions=True):
+            for status, ids in ids_by_status.iteritems():
+                query = ctx.session.query(model).filter(model.id.in_(ids))
+                query.filter(model.status != status).update(
+                    {'status': status}, synchronize_session=False)
+
+    def _sync_lswitches(self, ctx, lswitches):
+        statuses = {}
+        for lswitch in lswitches:
+            # The additional logical switches of a network are tagged
+            # with its id, the first one has the same id as the network
+            network_id = (_get_tag(lswitch, 'quantum_net_id') or
+                          lswitch['uuid'])
+            status = lswitch['_relations']['LogicalSwitchStatus']
+            # A network is down if any of its logical switches is down,
+            # even if they were fetched in different pages
+            if network_id in self._down_networks:
+                continue
+            if status['fabric_status']:
+                statuses[network_id] = constants.NET_STATUS_ACTIVE
+            else:
+                statuses[network_id] = constants.NET_STATUS_DOWN
+                self._down_networks.add(network_id)
+        self._update_status(ctx, models_v2.Network, statuses)
+
+    def _sync_lrouters(self, ctx, lrouters):
+        statuses = {}
+        for lrouter in lrouters:
+            status = lrouter['_relations']['LogicalRouterStatus']
+            statuses[lrouter['uuid']] = (
+                status['fabric_status'] and constants.NET_STATUS_ACTIVE or
+                constants.NET_STATUS_DOWN)
+        self._update_status(ctx, l3_db.Router, statuses)
+
+    def _sync_lports(self, ctx, lports):
+        statuses = {}
+        for lport in lports:
+            port_id = _get_tag(lport, 'q_port_id')
+            if not port_id:
+                continue
+            status = lport['_relations']['LogicalPortStatus']
+            statuses[port_id] = (
+                status['fabric_status_up'] and constants.PORT_STATUS_ACTIVE or
+                constants.PORT_STATUS_DOWN)
+        self._update_status(ctx, models_v2.Port, statuses)
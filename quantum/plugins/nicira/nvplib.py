@@ -197,6 +197,23 @@ def get_all_query_pages(path, c):
     return result_list
 
 
+def get_single_query_page(path, c, page_cursor=None, page_length=1000):
+    """Fetch one page of the results of a query.
+
+    Returns the results, the cursor of the next page (None on the last
+    page) and the total number of results if NVP reported it.
+    """
+    query_marker = "&" if (path.find("?") != -1) else "?"
+    query_params = ["_page_length=%s" % page_length]
+    if page_cursor:
+        query_params.append("_page_cursor=%s" % page_cursor)
+    body = json.loads(do_single_request(
+        HTTP_GET, "%s%s%s" % (path, query_marker, '&'.join(query_params)),
+        cluster=c))
+    return (body['results'], body.get('page_cursor'),
+            body.get('result_count'))
+
+
 def do_single_request(*args, **kwargs):
     """Issue a request to a specified cluster if specified via kwargs
        (cluster=<cluster>).
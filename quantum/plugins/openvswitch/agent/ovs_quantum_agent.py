@@ -28,6 +28,7 @@ from oslo.config import cfg
 
 from quantum.agent.linux import ip_lib
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.agent.linux import utils
 from quantum.agent import rpc as agent_rpc
 from quantum.agent import securitygroups_rpc as sg_rpc
@@ -152,7 +153,7 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
-                 polling_interval, enable_tunneling):
+                 polling_interval, enable_tunneling, minimize_polling=False):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -162,6 +163,8 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         :param root_helper: utility to use when running shell cmds.
         :param polling_interval: interval (secs) to poll DB.
         :param enable_tunneling: if True enable GRE networks.
+        :param minimize_polling: if True learn about port changes from an
+            ovsdb monitor instead of polling the integration bridge.
         '''
         self.root_helper = root_helper
         self.available_local_vlans = set(
@@ -172,6 +175,12 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        # VIFs of the integration bridge seen by the last update_ports call,
+        # keyed by iface-id
+        self.vif_port_cache = {}
+        self.iface_monitor = None
+        if minimize_polling:
+            self.iface_monitor = ovsdb_monitor.InterfaceMonitor(root_helper)
 
         self.enable_tunneling = enable_tunneling
         self.local_ip = local_ip
@@ -195,7 +204,10 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
     def _report_state(self):
         try:
             # How many devices are likely used by a VM
-            ports = self.int_br.get_vif_port_set()
+            if self.iface_monitor and self.iface_monitor.is_active():
+                ports = self.get_monitored_vif_port_map()
+            else:
+                ports = self.int_br.get_vif_port_set()
             num_devices = len(ports)
             self.agent_state.get('configurations')['devices'] = num_devices
             self.state_rpc.report_state(self.context,
@@ -254,7 +266,7 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_firewall([port['id']])
         network_type = kwargs.get('network_type')
         segmentation_id = kwargs.get('segmentation_id')
         physical_network = kwargs.get('physical_network')
@@ -587,8 +599,18 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             int_veth.link.set_up()
             phys_veth.link.set_up()
 
-    def update_ports(self, registered_ports):
-        ports = self.int_br.get_vif_port_set()
+    def get_monitored_vif_port_map(self):
+        """Returns the VIFs of the integration bridge seen by the monitor."""
+        return self.int_br.get_vif_port_map(
+            self.iface_monitor.get_interfaces())
+
+    def update_ports(self, registered_ports, vif_ports=None):
+        if vif_ports is None:
+            vif_ports = self.int_br.get_vif_port_map()
+        # Cache the VIFs for this iteration so that treat_devices_added does
+        # not have to look each added device up again.
+        self.vif_port_cache = vif_ports
+        ports = set(vif_ports)
         if ports == registered_ports:
             return
         added = ports - registered_ports
@@ -597,6 +619,12 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 'added': added,
                 'removed': removed}
 
+    def get_vif_port(self, vif_id):
+        port = self.vif_port_cache.get(vif_id)
+        if not port:
+            port = self.int_br.get_vif_port_by_id(vif_id)
+        return port
+
     def treat_vif_port(self, vif_port, port_id, network_id, network_type,
                        physical_network, segmentation_id, admin_state_up):
         if vif_port:
@@ -609,21 +637,20 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
+            port = self.get_vif_port(device)
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -637,29 +664,28 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 self.port_unbound(device)
-        return resync
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -686,10 +712,30 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             resync = True
         return resync
 
+    def poll_ports(self, registered_ports, changed):
+        """Returns the port deltas, using the ovsdb monitor if enabled.
+
+        :param registered_ports: the set of ports known to be processed.
+        :param changed: True if the monitor reported interface changes or a
+            resync is needed since the last call.
+        """
+        if not self.iface_monitor:
+            return self.update_ports(registered_ports)
+        if not self.iface_monitor.is_active():
+            LOG.warn(_("Interface monitor is not active, performing a full "
+                       "resync"))
+            self.iface_monitor.start()
+            registered_ports.clear()
+            return self.update_ports(registered_ports)
+        if changed:
+            return self.update_ports(registered_ports,
+                                     self.get_monitored_vif_port_map())
+
     def rpc_loop(self):
         sync = True
         ports = set()
         tunnel_sync = True
+        changed = True
 
         while True:
             try:
@@ -698,13 +744,14 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
                     sync = False
+                    changed = True
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                port_info = self.poll_ports(ports, changed)
 
                 # notify plugin about port deltas
                 if port_info:
@@ -718,6 +765,13 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 sync = True
                 tunnel_sync = True
 
+            if self.iface_monitor:
+                # wake up as soon as interfaces change, but no later than
+                # the polling interval so that resyncs are retried
+                changed = self.iface_monitor.wait_for_updates(
+                    self.polling_interval)
+                continue
+
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
@@ -729,7 +783,13 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                            'elapsed': elapsed})
 
     def daemon_loop(self):
-        self.rpc_loop()
+        if self.iface_monitor:
+            self.iface_monitor.start()
+        try:
+            self.rpc_loop()
+        finally:
+            if self.iface_monitor:
+                self.iface_monitor.stop()
 
 
 def create_agent_config_map(config):
@@ -751,6 +811,7 @@ def create_agent_config_map(config):
         root_helper=config.AGENT.root_helper,
         polling_interval=config.AGENT.polling_interval,
         enable_tunneling=config.OVS.enable_tunneling,
+        minimize_polling=config.AGENT.minimize_polling,
     )
 
     if kwargs['enable_tunneling'] and not kwargs['local_ip']:
@@ -58,6 +58,10 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('minimize_polling', default=False,
+                help=_("Minimize polling by monitoring ovsdb for interface "
+                       "changes instead of listing the integration bridge "
+                       "ports on every polling interval.")),
 ]
 
 
@@ -16,6 +16,7 @@
 # @author: Aaron Rosen, Nicira Networks, Inc.
 # @author: Bob Kukura, Red Hat, Inc.
 
+from sqlalchemy import orm
 from sqlalchemy.orm import exc
 from sqlalchemy.sql import func
 
@@ -47,6 +48,17 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Returns a dict mapping network ids to their bindings."""
+    if not network_ids:
+        return {}
+    session = session or db.get_session()
+    bindings = (session.query(ovs_models_v2.NetworkBinding).
+                filter(ovs_models_v2.NetworkBinding.network_id.in_(
+                    network_ids)))
+    return dict((binding.network_id, binding) for binding in bindings)
+
+
 def add_network_binding(session, network_id, network_type,
                         physical_network, segmentation_id):
     with session.begin(subtransactions=True):
@@ -316,9 +328,30 @@ def get_port(port_id):
     return port
 
 
+def get_ports(port_ids):
+    """Returns a dict mapping port ids to the ports found in the database."""
+    if not port_ids:
+        return {}
+    session = db.get_session()
+    ports = (session.query(models_v2.Port).
+             filter(models_v2.Port.id.in_(port_ids)))
+    return dict((port.id, port) for port in ports)
+
+
 def get_port_from_device(port_id):
     """Get port from database."""
     LOG.debug(_("get_port_with_securitygroups() called:port_id=%s"), port_id)
+    return get_port_dicts_from_devices([port_id]).get(port_id)
+
+
+def get_port_dicts_from_devices(port_ids):
+    """Get the ports of several devices from database with a single query.
+
+    Returns a dict mapping the port ids to the ports found.
+    """
+    LOG.debug(_("get_port_dicts_from_devices() called:port_ids=%s"), port_ids)
+    if not port_ids:
+        return {}
     session = db.get_session()
     sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
 
@@ -326,20 +359,23 @@ def get_port_from_device(port_id):
                           sg_db.SecurityGroupPortBinding.security_group_id)
     query = query.outerjoin(sg_db.SecurityGroupPortBinding,
                             models_v2.Port.id == sg_binding_port)
-    query = query.filter(models_v2.Port.id == port_id)
-    port_and_sgs = query.all()
-    if not port_and_sgs:
-        return None
-    port = port_and_sgs[0][0]
+    query = query.options(orm.joinedload(models_v2.Port.fixed_ips))
+    query = query.filter(models_v2.Port.id.in_(port_ids))
     plugin = manager.QuantumManager.get_plugin()
-    port_dict = plugin._make_port_dict(port)
-    port_dict[ext_sg.SECURITYGROUPS] = [
-        sg_id for port_, sg_id in port_and_sgs if sg_id]
-    port_dict['security_group_rules'] = []
-    port_dict['security_group_source_groups'] = []
-    port_dict['fixed_ips'] = [ip['ip_address']
-                              for ip in port['fixed_ips']]
-    return port_dict
+    ports = {}
+    for port, sg_id in query:
+        port_dict = ports.get(port.id)
+        if not port_dict:
+            port_dict = plugin._make_port_dict(port)
+            port_dict[ext_sg.SECURITYGROUPS] = []
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            ports[port.id] = port_dict
+        if sg_id:
+            port_dict[ext_sg.SECURITYGROUPS].append(sg_id)
+    return ports
 
 
 def set_port_status(port_id, status):
@@ -353,6 +389,17 @@ def set_port_status(port_id, status):
         raise q_exc.PortNotFound(port_id=port_id)
 
 
+def set_ports_status(port_ids, status):
+    """Set the status of several ports with a single statement."""
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin():
+        (session.query(models_v2.Port).
+         filter(models_v2.Port.id.in_(port_ids)).
+         update({'status': status}, synchronize_session=False))
+
+
 def get_tunnel_endpoints():
     session = db.get_session()
 
@@ -18,7 +18,9 @@
 
 
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import orm
 
+from quantum.db import models_v2
 from quantum.db.models_v2 import model_base
 
 
@@ -69,6 +71,12 @@ class NetworkBinding(model_base.BASEV2):
     physical_network = Column(String(64))
     segmentation_id = Column(Integer)  # tunnel_id or vlan_id
 
+    # Add a relationship to the Network model so that network lists can
+    # load their binding along with them
+    network = orm.relationship(
+        models_v2.Network,
+        backref=orm.backref('ovs_binding', uselist=False, cascade='delete'))
+
     def __init__(self, network_id, network_type, physical_network,
                  segmentation_id):
         self.network_id = network_id
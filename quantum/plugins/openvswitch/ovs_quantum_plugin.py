@@ -23,6 +23,7 @@
 import sys
 
 from oslo.config import cfg
+from sqlalchemy import orm
 
 from quantum.agent import securitygroups_rpc as sg_rpc
 from quantum.api.rpc.agentnotifiers import dhcp_rpc_agent_api
@@ -38,6 +39,7 @@ from quantum.db import db_base_plugin_v2
 from quantum.db import dhcp_rpc_base
 from quantum.db import extraroute_db
 from quantum.db import l3_rpc_base
+from quantum.db import models_v2
 from quantum.db import quota_db  # noqa
 from quantum.db import securitygroups_rpc_base as sg_db_rpc
 from quantum.extensions import portbindings
@@ -62,8 +64,11 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
     # history
     #   1.0 Initial version
     #   1.1 Support Security Group RPC
+    #   1.2 Support security_group_info_for_devices
+    #   1.3 Support get_devices_details_list and update_devices_down
+    #   1.4 Support get_networks_info
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -84,6 +89,23 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    @classmethod
+    def get_port_dicts_from_devices(cls, devices):
+        ports = ovs_db_v2.get_port_dicts_from_devices(devices)
+        for device, port in ports.iteritems():
+            port['device'] = device
+        return ports
+
+    @staticmethod
+    def _make_device_details(device, port, binding):
+        return {'device': device,
+                'network_id': port['network_id'],
+                'port_id': port['id'],
+                'admin_state_up': port['admin_state_up'],
+                'network_type': binding.network_type,
+                'segmentation_id': binding.segmentation_id,
+                'physical_network': binding.physical_network}
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
@@ -93,13 +115,7 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         port = ovs_db_v2.get_port(device)
         if port:
             binding = ovs_db_v2.get_network_binding(None, port['network_id'])
-            entry = {'device': device,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up'],
-                     'network_type': binding.network_type,
-                     'segmentation_id': binding.segmentation_id,
-                     'physical_network': binding.physical_network}
+            entry = self._make_device_details(device, port, binding)
             new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
                           else q_const.PORT_STATUS_DOWN)
             if port['status'] != new_status:
@@ -109,6 +125,54 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices at once."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Details for devices %(devices)s requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = ovs_db_v2.get_ports(devices)
+        bindings = ovs_db_v2.get_network_bindings(
+            None, set(port['network_id'] for port in ports.itervalues()))
+        entries = []
+        status_updates = {q_const.PORT_STATUS_ACTIVE: [],
+                          q_const.PORT_STATUS_DOWN: []}
+        for device in devices:
+            port = ports.get(device)
+            if not port:
+                entries.append({'device': device})
+                LOG.debug(_("%s can not be found in database"), device)
+                continue
+            binding = bindings[port['network_id']]
+            entries.append(self._make_device_details(device, port, binding))
+            new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
+                          else q_const.PORT_STATUS_DOWN)
+            if port['status'] != new_status:
+                status_updates[new_status].append(port['id'])
+        for status, port_ids in status_updates.iteritems():
+            ovs_db_v2.set_ports_status(port_ids, status)
+        return entries
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Several devices no longer exist on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = ovs_db_v2.get_ports(devices)
+        entries = []
+        for device in devices:
+            entries.append({'device': device,
+                            'exists': device in ports})
+            if device not in ports:
+                LOG.debug(_("%s can not be found in database"), device)
+        ovs_db_v2.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port['status'] != q_const.PORT_STATUS_DOWN],
+            q_const.PORT_STATUS_DOWN)
+        return entries
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         # TODO(garyk) - live migration and port status
@@ -239,6 +303,10 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    # Load the provider binding of the networks along with them
+    _model_query_options = {
+        models_v2.Network: [orm.joinedload('ovs_binding')]}
+
     _supported_extension_aliases = ["provider", "router",
                                     "binding", "quotas", "security-group",
                                     "agent", "extraroute", "agent_scheduler"]
@@ -344,10 +412,11 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     def _check_view_auth(self, context, resource, action):
         return policy.check(context, action, resource)
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, binding=None):
         if self._check_view_auth(context, network, self.network_view):
-            binding = ovs_db_v2.get_network_binding(context.session,
-                                                    network['id'])
+            if binding is None:
+                binding = ovs_db_v2.get_network_binding(context.session,
+                                                        network['id'])
             network[provider.NETWORK_TYPE] = binding.network_type
             if binding.network_type == constants.TYPE_GRE:
                 network[provider.PHYSICAL_NETWORK] = None
@@ -538,15 +607,26 @@ class OVSQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                      limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
-            nets = super(OVSQuantumPluginV2,
-                         self).get_networks(context, filters, None, sorts,
-                                            limit, marker, page_reverse)
-            for net in nets:
-                self._extend_network_dict_provider(context, net)
-                self._extend_network_dict_l3(context, net)
+            marker_obj = self._get_marker_obj(context, 'network', limit,
+                                              marker)
+            nets = self._get_collection(
+                context, models_v2.Network,
+                lambda net_db, fields: self._make_extended_network_dict(
+                    context, net_db),
+                filters=filters, sorts=sorts, limit=limit,
+                marker_obj=marker_obj, page_reverse=page_reverse)
 
         return [self._fields(net, fields) for net in nets]
 
+    def _make_extended_network_dict(self, context, network_db):
+        # The binding and the external flag are eagerly loaded along with
+        # the network, see _model_query_options
+        net = self._make_network_dict(network_db)
+        self._extend_network_dict_provider(context, net,
+                                           network_db.ovs_binding)
+        self._extend_network_dict_l3(context, net, network_db)
+        return net
+
     def _extend_port_dict_binding(self, context, port):
         if self._check_view_auth(context, port, self.binding_view):
             port[portbindings.VIF_TYPE] = portbindings.VIF_TYPE_OVS
@@ -230,7 +230,7 @@ class OVSQuantumOFPRyuAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_firewall([port['id']])
 
     def _update_ports(self, registered_ports):
         ports = self.int_br.get_vif_port_set()
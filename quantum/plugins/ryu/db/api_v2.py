@@ -16,6 +16,7 @@
 
 from sqlalchemy import exc as sa_exc
 from sqlalchemy import func
+from sqlalchemy import orm
 from sqlalchemy.orm import exc as orm_exc
 
 from quantum.common import exceptions as q_exc
@@ -38,6 +39,17 @@ def network_all_tenant_list():
 
 def get_port_from_device(port_id):
     LOG.debug(_("get_port_from_device() called:port_id=%s"), port_id)
+    return get_port_dicts_from_devices([port_id]).get(port_id)
+
+
+def get_port_dicts_from_devices(port_ids):
+    """Get the ports of several devices from database with a single query.
+
+    Returns a dict mapping the port ids to the ports found.
+    """
+    LOG.debug(_("get_port_dicts_from_devices() called:port_ids=%s"), port_ids)
+    if not port_ids:
+        return {}
     session = db.get_session()
     sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
 
@@ -45,19 +57,23 @@ def get_port_from_device(port_id):
                           sg_db.SecurityGroupPortBinding.security_group_id)
     query = query.outerjoin(sg_db.SecurityGroupPortBinding,
                             models_v2.Port.id == sg_binding_port)
-    query = query.filter(models_v2.Port.id == port_id)
-    port_and_sgs = query.all()
-    if not port_and_sgs:
-        return None
-    port = port_and_sgs[0][0]
+    query = query.options(orm.joinedload(models_v2.Port.fixed_ips))
+    query = query.filter(models_v2.Port.id.in_(port_ids))
     plugin = manager.QuantumManager.get_plugin()
-    port_dict = plugin._make_port_dict(port)
-    port_dict[ext_sg.SECURITYGROUPS] = [
-        sg_id for port_, sg_id in port_and_sgs if sg_id]
-    port_dict['security_group_rules'] = []
-    port_dict['security_group_source_groups'] = []
-    port_dict['fixed_ips'] = [ip['ip_address'] for ip in port['fixed_ips']]
-    return port_dict
+    ports = {}
+    for port, sg_id in query:
+        port_dict = ports.get(port.id)
+        if not port_dict:
+            port_dict = plugin._make_port_dict(port)
+            port_dict[ext_sg.SECURITYGROUPS] = []
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            ports[port.id] = port_dict
+        if sg_id:
+            port_dict[ext_sg.SECURITYGROUPS].append(sg_id)
+    return ports
 
 
 class TunnelKey(object):
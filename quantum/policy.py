@@ -31,6 +31,10 @@ from quantum.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Compiled match checks, keyed by action and explicitly set attributes.
+# They are valid for the rules they were compiled from only.
+_CHECK_CACHE = {}
+_CHECK_CACHE_RULES = None
 ADMIN_CTX_POLICY = 'context_is_admin'
 cfg.CONF.import_opt('policy_file', 'quantum.common.config')
 
@@ -40,6 +44,7 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _CHECK_CACHE.clear()
     policy.reset()
 
 
@@ -97,6 +102,23 @@ def _build_target(action, original_target, plugin, context):
     return target
 
 
+def _get_enforced_attributes(action, target):
+    """Return the sorted names of the attributes enforcing a policy.
+
+    These are the attributes explicitly set in the target of a write
+    action which have an 'enforce_policy' flag in the attribute map.
+    """
+    resource, is_write = get_resource_and_action(action)
+    res_attrs = attributes.RESOURCE_ATTRIBUTE_MAP.get(resource)
+    if not is_write or not res_attrs:
+        return ()
+    return tuple(sorted(
+        attribute_name for attribute_name in target
+        if (attribute_name in res_attrs and
+            'enforce_policy' in res_attrs[attribute_name] and
+            _is_attribute_explicitly_set(attribute_name, res_attrs, target))))
+
+
 def _build_match_rule(action, target):
     """Create the rule to match for a given action.
 
@@ -109,24 +131,117 @@ def _build_match_rule(action, target):
     """
 
     match_rule = policy.RuleCheck('rule', action)
-    resource, is_write = get_resource_and_action(action)
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute and is_write:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
+    for attribute_name in _get_enforced_attributes(action, target):
+        attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                     (action, attribute_name))
+        match_rule = policy.AndCheck([match_rule, attr_rule])
 
     return match_rule
 
 
+def _always(target, creds):
+    return True
+
+
+def _never(target, creds):
+    return False
+
+
+def _fail_on_key_error(check):
+    """Deny when check raises KeyError, as RuleCheck does.
+
+    A generic check raises KeyError when the target misses an attribute
+    referenced by its match, which then denies the whole referenced rule.
+    """
+    if check in (_always, _never) or hasattr(check, 'fails_on_key_error'):
+        return check
+
+    def check_rule(target, creds):
+        try:
+            return check(target, creds)
+        except KeyError:
+            return False
+    check_rule.fails_on_key_error = True
+    return check_rule
+
+
+def _compile_rule(rule, rules, compiled):
+    """Translate a check tree into a function of (target, creds).
+
+    Rule references are resolved once, from rules, and the and/or/not
+    operators are flattened into plain loops. compiled maps the names of
+    the rules already translated to their functions.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return _always
+    elif isinstance(rule, policy.FalseCheck):
+        return _never
+    elif isinstance(rule, policy.RuleCheck):
+        if rule.match not in compiled:
+            try:
+                referenced = rules[rule.match]
+            except (KeyError, TypeError):
+                # We don't have any matching rule; fail closed
+                referenced = policy.FalseCheck()
+            compiled[rule.match] = _fail_on_key_error(
+                _compile_rule(referenced, rules, compiled))
+        return compiled[rule.match]
+    elif isinstance(rule, policy.NotCheck):
+        sub_check = _compile_rule(rule.rule, rules, compiled)
+        return lambda target, creds: not sub_check(target, creds)
+    elif isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        is_and = isinstance(rule, policy.AndCheck)
+        # An 'and' is decided by its first false operand, an 'or' by its
+        # first true operand
+        decisive, neutral = is_and and (_never, _always) or (_always, _never)
+        sub_checks = []
+        for sub_rule in rule.rules:
+            sub_check = _compile_rule(sub_rule, rules, compiled)
+            if sub_check is decisive:
+                return decisive
+            if sub_check is not neutral:
+                sub_checks.append(sub_check)
+        if not sub_checks:
+            return neutral
+        if len(sub_checks) == 1:
+            return sub_checks[0]
+
+        def check_and(target, creds):
+            for sub_check in sub_checks:
+                if not sub_check(target, creds):
+                    return False
+            return True
+
+        def check_or(target, creds):
+            for sub_check in sub_checks:
+                if sub_check(target, creds):
+                    return True
+            return False
+        return is_and and check_and or check_or
+    # Role, generic, field and http checks are evaluated as they are
+    return rule
+
+
+def _get_match_check(action, target):
+    """Return the compiled rule to match for action on target.
+
+    The rules built by _build_match_rule are compiled once for each set of
+    enforced attributes, until the policy rules are reloaded.
+    """
+    global _CHECK_CACHE_RULES
+    if _CHECK_CACHE_RULES is not policy._rules:
+        _CHECK_CACHE.clear()
+        _CHECK_CACHE_RULES = policy._rules
+    key = (action, _get_enforced_attributes(action, target))
+    try:
+        return _CHECK_CACHE[key]
+    except KeyError:
+        match_rule = _build_match_rule(action, target)
+        match_check = _compile_rule(match_rule, policy._rules, {})
+        _CHECK_CACHE[key] = match_check
+        return match_check
+
+
 @policy.register('field')
 class FieldCheck(policy.Check):
     def __init__(self, kind, match):
@@ -160,6 +275,93 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+def _merge_filters(filters1, filters2):
+    """Combine the conditions of two filter lists with 'and'."""
+    merged = []
+    for f1 in filters1:
+        for f2 in filters2:
+            if all(f2[key] == value for key, value in f1.iteritems()
+                   if key in f2):
+                merged_filter = f1.copy()
+                merged_filter.update(f2)
+                merged.append(merged_filter)
+    return merged
+
+
+def _compile_check(rule, credentials):
+    """Translate a check into (filters, complete), see get_filters."""
+    if isinstance(rule, policy.TrueCheck):
+        return [{}], True
+    elif isinstance(rule, policy.FalseCheck):
+        return [], True
+    elif isinstance(rule, policy.RuleCheck):
+        try:
+            return _compile_check(policy._rules[rule.match], credentials)
+        except KeyError:
+            return [], True
+    elif isinstance(rule, policy.RoleCheck):
+        return (rule({}, credentials) and [{}] or []), True
+    elif isinstance(rule, FieldCheck):
+        return [{rule.field: rule.value}], True
+    elif isinstance(rule, policy.GenericCheck):
+        if '%(' not in rule.match:
+            return (rule({}, credentials) and [{}] or []), True
+        if (rule.match.startswith('%(') and rule.match.endswith(')s') and
+                rule.match.count('%(') == 1):
+            if rule.kind not in credentials:
+                return [], True
+            return [{rule.match[2:-2]: unicode(credentials[rule.kind])}], True
+    elif isinstance(rule, policy.OrCheck):
+        filters, complete = [], True
+        for sub_rule in rule.rules:
+            sub_filters, sub_complete = _compile_check(sub_rule, credentials)
+            if {} in sub_filters:
+                return [{}], True
+            filters.extend(sub_filters)
+            complete = complete and sub_complete
+        return filters, complete
+    elif isinstance(rule, policy.AndCheck):
+        filters, complete = [{}], True
+        for sub_rule in rule.rules:
+            sub_filters, sub_complete = _compile_check(sub_rule, credentials)
+            if not sub_filters and sub_complete:
+                return [], True
+            filters = _merge_filters(filters, sub_filters)
+            complete = complete and sub_complete
+        return filters, complete
+    elif isinstance(rule, policy.NotCheck):
+        filters, complete = _compile_check(rule.rule, credentials)
+        if complete and filters in ([], [{}]):
+            return (not filters and [{}] or []), True
+    # The check can only be evaluated against whole objects
+    return [], False
+
+
+def get_filters(context, action):
+    """Translate the policy of a read action into attribute filters.
+
+    This allows to check the policy of many objects without running the
+    policy engine on each of them, or to filter them in the database.
+
+    :param context: quantum context
+    :param action: string representing the action to be checked
+    :return: a (filters, complete) tuple. filters is a list of dicts
+        mapping attribute names to values: an object matching all the
+        items of one of these dicts is allowed. If complete is True,
+        other objects are denied; otherwise they need to be checked one by
+        one. For instance, an admin gets ([{}], True). The filters may
+        refer to attributes of the parent resource, such as
+        network_tenant_id, which are only known to check().
+    """
+    init()
+    resource, is_write = get_resource_and_action(action)
+    if is_write:
+        # The rule depends on the attributes being set
+        return [], False
+    match_rule = _build_match_rule(action, {})
+    return _compile_check(match_rule, context.to_dict())
+
+
 def check(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -179,9 +381,8 @@ def check(context, action, target, plugin=None):
     if target is None:
         target = {}
     real_target = _build_target(action, target, plugin, context)
-    match_rule = _build_match_rule(action, real_target)
-    credentials = context.to_dict()
-    return policy.check(match_rule, real_target, credentials)
+    match_check = _get_match_check(action, real_target)
+    return match_check(real_target, context.to_dict())
 
 
 def enforce(context, action, target, plugin=None):
@@ -204,10 +405,11 @@ def enforce(context, action, target, plugin=None):
     if target is None:
         target = {}
     real_target = _build_target(action, target, plugin, context)
-    match_rule = _build_match_rule(action, real_target)
-    credentials = context.to_dict()
-    return policy.check(match_rule, real_target, credentials,
-                        exceptions.PolicyNotAuthorized, action=action)
+    match_check = _get_match_check(action, real_target)
+    result = match_check(real_target, context.to_dict())
+    if not result:
+        raise exceptions.PolicyNotAuthorized(action=action)
+    return result
 
 
 def check_is_admin(context):
@@ -0,0 +1,137 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persistent root wrapper serving commands over a Unix socket.
+
+The daemon loads the filters once and then runs the commands it receives
+on a Unix socket, one JSON encoded request per connection:
+
+    request:  {"commands": [{"cmd": [...], "process_input": "...",
+                             "check_exit_code": true}, ...]}
+    response: {"results": [{"returncode": 0, "stdout": "...",
+                            "stderr": "..."}, ...]}
+
+Commands of a request run in order. The batch stops at the first command
+exiting with a non-zero code when its check_exit_code is true, so the
+results list may be shorter than the commands list.
+"""
+
+import json
+import os
+import shutil
+import SocketServer
+import subprocess
+import sys
+import tempfile
+import threading
+
+from quantum.common import utils
+from quantum.rootwrap import wrapper
+
+
+RC_UNAUTHORIZED = 99
+SOCKET_NAME = 'rootwrap.sock'
+
+
+def _to_text(data):
+    return (data or '').decode('utf-8', 'replace')
+
+
+def run_command(filters, userargs, process_input=None):
+    """Runs userargs if it matches a filter.
+
+    :returns: a (returncode, stdout, stderr) tuple.
+    """
+    filtermatch = wrapper.match_filter(filters, userargs)
+    if not filtermatch:
+        return (RC_UNAUTHORIZED, '',
+                'Unauthorized command: %s' % ' '.join(userargs))
+    # Same process setup as quantum-rootwrap, which restores SIGPIPE
+    obj = subprocess.Popen(filtermatch.get_command(userargs),
+                           stdin=subprocess.PIPE,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           preexec_fn=utils._subprocess_setup,
+                           close_fds=True,
+                           env=filtermatch.get_environment(userargs))
+    stdout, stderr = obj.communicate(process_input)
+    return obj.returncode, stdout, stderr
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            commands = request['commands']
+        except (ValueError, KeyError, TypeError):
+            self.wfile.write(json.dumps({'error': 'Malformed request'}))
+            return
+        results = []
+        for command in commands:
+            userargs = [str(arg) for arg in command.get('cmd') or []]
+            if not userargs:
+                break
+            returncode, stdout, stderr = run_command(
+                self.server.filters, userargs, command.get('process_input'))
+            results.append({'returncode': returncode,
+                            'stdout': _to_text(stdout),
+                            'stderr': _to_text(stderr)})
+            if returncode and command.get('check_exit_code', True):
+                break
+        self.wfile.write(json.dumps({'results': results}))
+
+
+class RootwrapServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    """Runs the commands received on socket_path through the filters."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, filters):
+        SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                               _RequestHandler)
+        self.filters = filters
+
+
+def daemon_start(filters):
+    """Serves requests until stdin is closed.
+
+    The socket path is written on stdout. Only the user who invoked the
+    daemon through sudo is allowed to connect to it.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='quantum-rootwrap-')
+    try:
+        socket_path = os.path.join(temp_dir, SOCKET_NAME)
+        server = RootwrapServer(socket_path, filters)
+        uid = int(os.environ.get('SUDO_UID', os.getuid()))
+        gid = int(os.environ.get('SUDO_GID', os.getgid()))
+        os.chown(temp_dir, uid, gid)
+        os.chown(socket_path, uid, gid)
+        os.chmod(socket_path, 0600)
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        sys.stdout.write(socket_path + '\n')
+        sys.stdout.flush()
+        # The agent holds the other end of stdin, exit along with it.
+        while sys.stdin.read(4096):
+            pass
+        server.shutdown()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
@@ -27,6 +27,9 @@ AGENTS_SCHEDULER_OPTS = [
                default='quantum.scheduler.l3_agent_scheduler.ChanceScheduler',
                help=_('Driver to use for scheduling '
                       'router to a default L3 agent')),
+    cfg.IntOpt('dhcp_agents_per_network', default=1,
+               help=_('Number of DHCP agents scheduled to host a network. '
+                      'Only used by the WeightScheduler.')),
     cfg.BoolOpt('network_auto_schedule', default=True,
                 help=_('Allow auto scheduling networks to DHCP agent.')),
     cfg.BoolOpt('router_auto_schedule', default=True,
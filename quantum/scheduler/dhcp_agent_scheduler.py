@@ -15,8 +15,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import hashlib
 import random
 
+from oslo.config import cfg
+from sqlalchemy import exc as sql_exc
+from sqlalchemy import func
 from sqlalchemy.orm import exc
 from sqlalchemy.sql import exists
 
@@ -39,6 +44,8 @@ class ChanceScheduler(object):
     def schedule(self, plugin, context, network):
         """Schedule the network to an active DHCP agent if there
         is no active DHCP agent hosting it.
+
+        Returns the list of agents the network was scheduled to.
         """
         #TODO(gongysh) don't schedule the networks with only
         # subnets whose enable_dhcp is false
@@ -48,21 +55,21 @@ class ChanceScheduler(object):
             if dhcp_agents:
                 LOG.debug(_('Network %s is hosted already'),
                           network['id'])
-                return
+                return []
             enabled_dhcp_agents = plugin.get_agents_db(
                 context, filters={
                     'agent_type': [constants.AGENT_TYPE_DHCP],
                     'admin_state_up': [True]})
             if not enabled_dhcp_agents:
                 LOG.warn(_('No enabled DHCP agents'))
-                return
+                return []
             active_dhcp_agents = [enabled_dhcp_agent for enabled_dhcp_agent in
                                   enabled_dhcp_agents if not
                                   agents_db.AgentDbMixin.is_agent_down(
                                   enabled_dhcp_agent['heartbeat_timestamp'])]
             if not active_dhcp_agents:
                 LOG.warn(_('No active DHCP agents'))
-                return
+                return []
             chosen_agent = random.choice(active_dhcp_agents)
             binding = agentschedulers_db.NetworkDhcpAgentBinding()
             binding.dhcp_agent = chosen_agent
@@ -72,7 +79,7 @@ class ChanceScheduler(object):
                         'DHCP agent %(agent_id)s'),
                       {'network_id': network['id'],
                        'agent_id': chosen_agent['id']})
-        return chosen_agent
+        return [chosen_agent]
 
     def auto_schedule_networks(self, plugin, context, host):
         """Schedule non-hosted networks to the DHCP agent on
@@ -108,3 +115,175 @@ class ChanceScheduler(object):
                 binding.network_id = net_id[0]
                 context.session.add(binding)
         return True
+
+
+class WeightScheduler(object):
+    """Allocate dhcp_agents_per_network DHCP agents for each network.
+
+    The least loaded active agents are chosen, the load of an agent being
+    the number of networks bound to it plus a fraction of the ports it
+    reported in its configurations. Ties are broken by a hash of the
+    network and agent ids instead of randomly, so that servers scheduling
+    the same network at the same time choose the same agents.
+    """
+
+    # hosting a network costs about as much as serving 50 ports
+    PORT_WEIGHT = 0.02
+
+    def _get_active_dhcp_agents(self, plugin, context):
+        enabled_dhcp_agents = plugin.get_agents_db(
+            context, filters={
+                'agent_type': [constants.AGENT_TYPE_DHCP],
+                'admin_state_up': [True]})
+        return [dhcp_agent for dhcp_agent in enabled_dhcp_agents
+                if not agents_db.AgentDbMixin.is_agent_down(
+                    dhcp_agent.heartbeat_timestamp)]
+
+    def _get_agent_loads(self, plugin, context, dhcp_agents):
+        Binding = agentschedulers_db.NetworkDhcpAgentBinding
+        agent_ids = [dhcp_agent.id for dhcp_agent in dhcp_agents]
+        query = context.session.query(Binding.dhcp_agent_id,
+                                      func.count(Binding.network_id))
+        query = query.filter(Binding.dhcp_agent_id.in_(agent_ids))
+        counts = dict(query.group_by(Binding.dhcp_agent_id))
+        loads = {}
+        for dhcp_agent in dhcp_agents:
+            agent_conf = plugin.get_configuration_dict(dhcp_agent)
+            loads[dhcp_agent.id] = (
+                counts.get(dhcp_agent.id, 0) +
+                self.PORT_WEIGHT * agent_conf.get('ports', 0))
+        return loads
+
+    @staticmethod
+    def _tie_breaker(network_id, agent_id):
+        return hashlib.md5(network_id + agent_id).hexdigest()
+
+    def _choose_agents(self, network_id, candidates, loads, count):
+        candidates = sorted(
+            candidates,
+            key=lambda dhcp_agent: (
+                round(loads[dhcp_agent.id], 3),
+                self._tie_breaker(network_id, dhcp_agent.id)))
+        chosen_agents = candidates[:count]
+        for dhcp_agent in chosen_agents:
+            loads[dhcp_agent.id] += 1
+        return chosen_agents
+
+    def _bind(self, context, bindings):
+        """Insert the (network_id, dhcp_agent) bindings in one statement.
+
+        Returns False, without inserting any of them, if one of the
+        bindings was inserted concurrently by another server.
+        """
+        if not bindings:
+            return True
+        table = agentschedulers_db.NetworkDhcpAgentBinding.__table__
+        try:
+            with context.session.begin_nested():
+                context.session.execute(
+                    table.insert(),
+                    [{'network_id': network_id,
+                      'dhcp_agent_id': dhcp_agent.id}
+                     for network_id, dhcp_agent in bindings])
+        except sql_exc.IntegrityError:
+            LOG.debug(_('DHCP agent bindings %s were scheduled '
+                        'concurrently'),
+                      [(network_id, dhcp_agent.id)
+                       for network_id, dhcp_agent in bindings])
+            return False
+        return True
+
+    def schedule(self, plugin, context, network):
+        """Schedule the network to the DHCP agents it lacks.
+
+        Returns the list of agents the network was scheduled to.
+        """
+        agents_per_network = cfg.CONF.dhcp_agents_per_network
+        with context.session.begin(subtransactions=True):
+            hosting_agents = plugin.get_dhcp_agents_hosting_networks(
+                context, [network['id']], active=True)
+            count = agents_per_network - len(hosting_agents)
+            if count <= 0:
+                LOG.debug(_('Network %s is hosted already'),
+                          network['id'])
+                return []
+            hosting_ids = set(dhcp_agent.id for dhcp_agent in hosting_agents)
+            active_dhcp_agents = [
+                dhcp_agent for dhcp_agent in
+                self._get_active_dhcp_agents(plugin, context)
+                if dhcp_agent.id not in hosting_ids]
+            if not active_dhcp_agents:
+                LOG.warn(_('No active DHCP agents'))
+                return []
+            loads = self._get_agent_loads(plugin, context,
+                                          active_dhcp_agents)
+            chosen_agents = self._choose_agents(
+                network['id'], active_dhcp_agents, loads, count)
+            if not self._bind(context, [(network['id'], dhcp_agent)
+                                        for dhcp_agent in chosen_agents]):
+                # Another server scheduled the network at the same time
+                return []
+            LOG.debug(_('Network %(network_id)s is scheduled to be hosted by '
+                        'DHCP agents %(agent_ids)s'),
+                      {'network_id': network['id'],
+                       'agent_ids': [dhcp_agent.id
+                                     for dhcp_agent in chosen_agents]})
+        return chosen_agents
+
+    def auto_schedule_networks(self, plugin, context, host):
+        """Schedule the networks lacking DHCP agents.
+
+        All the active agents are considered, not only the one on host,
+        and the agents on other hosts are notified of the networks they
+        were given.
+        """
+        agents_per_network = cfg.CONF.dhcp_agents_per_network
+        Binding = agentschedulers_db.NetworkDhcpAgentBinding
+        bindings = []
+        with context.session.begin(subtransactions=True):
+            active_dhcp_agents = self._get_active_dhcp_agents(plugin,
+                                                              context)
+            if host not in [dhcp_agent.host
+                            for dhcp_agent in active_dhcp_agents]:
+                # the agent is asking, so it is alive even if its last
+                # heartbeat is late
+                active_dhcp_agents += plugin.get_agents_db(
+                    context, filters={
+                        'agent_type': [constants.AGENT_TYPE_DHCP],
+                        'admin_state_up': [True],
+                        'host': [host]})
+            if not active_dhcp_agents:
+                LOG.warn(_('No enabled DHCP agent on host %s'), host)
+                return False
+            agents_by_id = dict((dhcp_agent.id, dhcp_agent)
+                                for dhcp_agent in active_dhcp_agents)
+            hosting = collections.defaultdict(set)
+            query = context.session.query(Binding.network_id,
+                                          Binding.dhcp_agent_id)
+            for network_id, agent_id in query.filter(
+                    Binding.dhcp_agent_id.in_(agents_by_id.keys())):
+                hosting[network_id].add(agent_id)
+            net_ids = [net_id[0] for net_id in
+                       context.session.query(models_v2.Network.id)
+                       if len(hosting[net_id[0]]) < agents_per_network]
+            if not net_ids:
+                LOG.debug(_('No non-hosted networks'))
+                return False
+            loads = self._get_agent_loads(plugin, context,
+                                          active_dhcp_agents)
+            for net_id in sorted(net_ids):
+                candidates = [dhcp_agent for dhcp_agent in active_dhcp_agents
+                              if dhcp_agent.id not in hosting[net_id]]
+                chosen_agents = self._choose_agents(
+                    net_id, candidates,
+                    loads, agents_per_network - len(hosting[net_id]))
+                bindings += [(net_id, dhcp_agent)
+                             for dhcp_agent in chosen_agents]
+            if not self._bind(context, bindings):
+                return False
+        if plugin.dhcp_agent_notifier:
+            for net_id, dhcp_agent in bindings:
+                if dhcp_agent.host != host:
+                    plugin.dhcp_agent_notifier.network_added_to_agent(
+                        context, net_id, dhcp_agent.host)
+        return host in [dhcp_agent.host for net_id, dhcp_agent in bindings]
@@ -15,8 +15,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import random
 
+from sqlalchemy import func
 from sqlalchemy.orm import exc
 from sqlalchemy.sql import exists
 
@@ -138,7 +140,7 @@ class ChanceScheduler(object):
                          sync_router['id'])
                 return
 
-            chosen_agent = random.choice(candidates)
+            chosen_agent = self._choose_l3_agent(plugin, context, candidates)
             binding = agentschedulers_db.RouterL3AgentBinding()
             binding.l3_agent = chosen_agent
             binding.router_id = sync_router['id']
@@ -148,3 +150,226 @@ class ChanceScheduler(object):
                       {'router_id': sync_router['id'],
                        'agent_id': chosen_agent['id']})
             return chosen_agent
+
+    def _choose_l3_agent(self, plugin, context, candidates):
+        return random.choice(candidates)
+
+
+class LeastRoutersScheduler(ChanceScheduler):
+    """Allocate routers to the least loaded L3 agents.
+
+    The load of an agent is the number of routers bound to it, plus a
+    fraction of the floating IPs it reported in its configurations.
+    Unhosted routers are spread over all the compatible active agents
+    rather than bound to the first agent which asks for them, and
+    rebalance_routers() moves bindings away from overloaded agents.
+    """
+
+    # hosting a router costs about as much as hosting 10 floating IPs
+    FLOATINGIP_WEIGHT = 0.1
+
+    def _get_agent_loads(self, plugin, context, l3_agents):
+        agent_ids = [l3_agent.id for l3_agent in l3_agents]
+        if not agent_ids:
+            return {}
+        Binding = agentschedulers_db.RouterL3AgentBinding
+        query = context.session.query(Binding.l3_agent_id,
+                                      func.count(Binding.router_id))
+        query = query.filter(Binding.l3_agent_id.in_(agent_ids))
+        counts = dict(query.group_by(Binding.l3_agent_id))
+        loads = {}
+        for l3_agent in l3_agents:
+            agent_conf = plugin.get_configuration_dict(l3_agent)
+            loads[l3_agent.id] = (
+                counts.get(l3_agent.id, 0) +
+                self.FLOATINGIP_WEIGHT * agent_conf.get('floating_ips', 0))
+        return loads
+
+    def _get_candidates(self, plugin, routers, l3_agents):
+        """Return a dict mapping router ids to their candidate agents.
+
+        The candidates only depend on the external network of the router,
+        except for the agents running without namespaces, which host a
+        single router, so get_l3_agent_candidates is called once per
+        external network instead of once per router.
+        """
+        shared_agents = []
+        dedicated_agents = collections.defaultdict(list)
+        for l3_agent in l3_agents:
+            agent_conf = plugin.get_configuration_dict(l3_agent)
+            if agent_conf.get('use_namespaces', True):
+                shared_agents.append(l3_agent)
+            else:
+                dedicated_agents[agent_conf.get('router_id')].append(
+                    l3_agent)
+        by_network = {}
+        candidates = {}
+        for router in routers:
+            gw_info = router['external_gateway_info'] or {}
+            ex_net_id = gw_info.get('network_id')
+            if ex_net_id not in by_network:
+                by_network[ex_net_id] = plugin.get_l3_agent_candidates(
+                    {'id': None, 'external_gateway_info': gw_info},
+                    shared_agents)
+            candidates[router['id']] = list(by_network[ex_net_id])
+            if router['id'] in dedicated_agents:
+                candidates[router['id']] += plugin.get_l3_agent_candidates(
+                    router, dedicated_agents[router['id']])
+        return candidates
+
+    def _choose_l3_agent(self, plugin, context, candidates):
+        loads = self._get_agent_loads(plugin, context, candidates)
+        return min(candidates, key=lambda l3_agent: loads[l3_agent.id])
+
+    def auto_schedule_routers(self, plugin, context, host, router_id):
+        """Spread the non-hosted routers over the active L3 agents.
+
+        When router_id is given, the router is explicitly being added to
+        the agent on host, so the ChanceScheduler behaviour is kept.
+        The routers bound to agents on other hosts are notified to them.
+        """
+        if router_id:
+            return super(LeastRoutersScheduler, self).auto_schedule_routers(
+                plugin, context, host, router_id)
+        added = collections.defaultdict(list)
+        with context.session.begin(subtransactions=True):
+            l3_agents = plugin.get_l3_agents(context, active=True)
+            if host not in [l3_agent.host for l3_agent in l3_agents]:
+                # the agent is asking, so it is alive even if its last
+                # heartbeat is late
+                l3_agents += [l3_agent for l3_agent in plugin.get_l3_agents(
+                              context, filters={'host': [host]})
+                              if l3_agent.admin_state_up]
+            if not l3_agents:
+                LOG.debug(_('No enabled L3 agent on host %s'), host)
+                return False
+            stmt = ~exists().where(
+                l3_db.Router.id ==
+                agentschedulers_db.RouterL3AgentBinding.router_id)
+            router_ids = [item[0] for item in
+                          context.session.query(l3_db.Router.id).filter(stmt)]
+            if not router_ids:
+                LOG.debug(_('No non-hosted routers'))
+                return False
+            routers = plugin.get_routers(context, filters={'id': router_ids})
+            candidates = self._get_candidates(plugin, routers, l3_agents)
+            loads = self._get_agent_loads(plugin, context, l3_agents)
+            for router in routers:
+                router_candidates = candidates[router['id']]
+                if not router_candidates:
+                    continue
+                chosen_agent = min(
+                    router_candidates,
+                    key=lambda l3_agent: loads[l3_agent.id])
+                loads[chosen_agent.id] += 1
+                binding = agentschedulers_db.RouterL3AgentBinding()
+                binding.l3_agent = chosen_agent
+                binding.router_id = router['id']
+                context.session.add(binding)
+                added[chosen_agent.host].append(router['id'])
+        if plugin.l3_agent_notifier:
+            for agent_host, agent_router_ids in added.iteritems():
+                if agent_host != host:
+                    plugin.l3_agent_notifier.router_added_to_agent(
+                        context,
+                        plugin.get_sync_data(context, agent_router_ids),
+                        agent_host)
+        if host not in added:
+            LOG.debug(_('No routers scheduled to L3 agent on host %s'), host)
+            return False
+        return True
+
+    def _plan_moves(self, plugin, context, l3_agents, max_moves):
+        Binding = agentschedulers_db.RouterL3AgentBinding
+        agent_ids = [l3_agent.id for l3_agent in l3_agents]
+        query = context.session.query(Binding.router_id, Binding.l3_agent_id)
+        bound = dict(query.filter(Binding.l3_agent_id.in_(agent_ids)))
+        if not bound:
+            return []
+        FloatingIP = l3_db.FloatingIP
+        query = context.session.query(FloatingIP.router_id,
+                                      func.count(FloatingIP.id))
+        query = query.filter(FloatingIP.router_id.in_(bound.keys()))
+        fip_counts = dict(query.group_by(FloatingIP.router_id))
+        routers = plugin.get_routers(context, filters={'id': bound.keys()})
+        candidates = self._get_candidates(plugin, routers, l3_agents)
+        loads = self._get_agent_loads(plugin, context, l3_agents)
+        agent_routers = collections.defaultdict(list)
+        for router_id, agent_id in bound.iteritems():
+            cost = 1 + self.FLOATINGIP_WEIGHT * fip_counts.get(router_id, 0)
+            agent_routers[agent_id].append((cost, router_id))
+        for routers_ in agent_routers.values():
+            routers_.sort(reverse=True)
+
+        moves = []
+        while max_moves is None or len(moves) < max_moves:
+            # find a router of the most loaded agent which can be moved to
+            # a less loaded candidate without making it the most loaded
+            for agent_id in sorted(agent_routers, key=loads.get,
+                                   reverse=True):
+                move = None
+                for cost, router_id in agent_routers[agent_id]:
+                    others = [l3_agent.id
+                              for l3_agent in candidates.get(router_id, [])
+                              if l3_agent.id != agent_id]
+                    if not others:
+                        continue
+                    target_id = min(others, key=loads.get)
+                    if loads[agent_id] - loads[target_id] > cost:
+                        move = (cost, router_id, target_id)
+                        break
+                if move:
+                    break
+            else:
+                break
+            cost, router_id, target_id = move
+            agent_routers[agent_id].remove((cost, router_id))
+            agent_routers[target_id].append((cost, router_id))
+            agent_routers[target_id].sort(reverse=True)
+            loads[agent_id] -= cost
+            loads[target_id] += cost
+            moves.append((router_id, agent_id, target_id))
+        return moves
+
+    def rebalance_routers(self, plugin, context, batch_size=50,
+                          max_moves=None):
+        """Move routers from overloaded L3 agents to less loaded ones.
+
+        The moves are planned at once and applied in transactions of
+        batch_size routers, each followed by the notification of the
+        agents involved. Returns the list of (router_id, old_agent_id,
+        new_agent_id) moves which were applied.
+        """
+        l3_agents = plugin.get_l3_agents(context, active=True)
+        if len(l3_agents) < 2:
+            return []
+        moves = self._plan_moves(plugin, context, l3_agents, max_moves)
+        hosts = dict((l3_agent.id, l3_agent.host) for l3_agent in l3_agents)
+        Binding = agentschedulers_db.RouterL3AgentBinding
+        applied = []
+        for i in range(0, len(moves), batch_size):
+            batch = []
+            with context.session.begin(subtransactions=True):
+                for router_id, old_agent_id, new_agent_id in (
+                        moves[i:i + batch_size]):
+                    # skip the routers which were moved in the meantime
+                    query = context.session.query(Binding).filter(
+                        Binding.router_id == router_id,
+                        Binding.l3_agent_id == old_agent_id)
+                    if query.update({'l3_agent_id': new_agent_id},
+                                    synchronize_session=False):
+                        batch.append((router_id, old_agent_id,
+                                      new_agent_id))
+            if plugin.l3_agent_notifier and batch:
+                added = collections.defaultdict(list)
+                for router_id, old_agent_id, new_agent_id in batch:
+                    plugin.l3_agent_notifier.router_removed_from_agent(
+                        context, router_id, hosts[old_agent_id])
+                    added[hosts[new_agent_id]].append(router_id)
+                for agent_host, router_ids in added.iteritems():
+                    plugin.l3_agent_notifier.router_added_to_agent(
+                        context, plugin.get_sync_data(context, router_ids),
+                        agent_host)
+            LOG.debug(_('Moved %d routers between L3 agents'), len(batch))
+            applied += batch
+        return applied
@@ -24,6 +24,7 @@ from oslo.config import cfg
 
 from quantum.common import config
 from quantum import context
+from quantum import manager
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import loopingcall
@@ -42,6 +43,10 @@ service_opts = [
                help=_('range of seconds to randomly delay when starting the'
                       ' periodic task scheduler to reduce stampeding.'
                       ' (Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate worker processes for the API '
+                      'service. 0 serves the API from the main process.')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -72,6 +77,30 @@ class WsgiService(object):
 class QuantumApiService(WsgiService):
     """Class for quantum-api service."""
 
+    def __init__(self, app_name):
+        super(QuantumApiService, self).__init__(app_name)
+        self.timers = []
+
+    def start(self):
+        super(QuantumApiService, self).start()
+        if cfg.CONF.ip_recycle_interval > 0:
+            recycle = loopingcall.FixedIntervalLoopingCall(
+                self.recycle_expired_ips)
+            recycle.start(interval=cfg.CONF.ip_recycle_interval,
+                          initial_delay=cfg.CONF.ip_recycle_interval)
+            self.timers.append(recycle)
+
+    def recycle_expired_ips(self):
+        """Return the expired IP allocations to the pools."""
+        plugin = manager.QuantumManager.get_plugin()
+        if not hasattr(plugin, 'recycle_expired_ip_allocations'):
+            return
+        try:
+            plugin.recycle_expired_ip_allocations(
+                context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Failed to recycle expired IP allocations"))
+
     @classmethod
     def create(cls):
         app_name = "quantum"
@@ -107,7 +136,8 @@ def _run_wsgi(app_name):
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Quantum")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Quantum service started, listening on %(host)s:%(port)s"),
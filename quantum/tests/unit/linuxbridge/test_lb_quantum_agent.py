@@ -134,6 +134,73 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                 agent.daemon_loop()
             self.assertEqual(3, log.call_count)
 
+    def test_udev_daemon_loop(self):
+        lbmgr_instance = self.lbmgr_mock.return_value
+        lbmgr_instance.update_devices.return_value = {
+            'current': set(['tap1', 'tap2']),
+            'added': set(['tap1', 'tap2']),
+            'removed': set()}
+        lbmgr_instance.udev_get_tap_events.side_effect = [
+            (set(['tap3', 'tap1']), set(['tap2', 'tap4'])),
+            (set(), set(['tap4'])),
+            RuntimeError]
+        agent = linuxbridge_quantum_agent.LinuxBridgeQuantumAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(linuxbridge_quantum_agent.LOG, 'exception'),
+            mock.patch.object(agent, 'process_network_devices',
+                              return_value=False)
+        ) as (log, process_network_devices):
+            log.side_effect = RuntimeError
+            with testtools.ExpectedException(RuntimeError):
+                agent.udev_daemon_loop()
+        lbmgr_instance.udev_monitor.start.assert_called_once_with()
+        lbmgr_instance.update_devices.assert_called_once_with(set())
+        process_network_devices.assert_has_calls([
+            mock.call(lbmgr_instance.update_devices.return_value),
+            mock.call({'current': set(['tap1', 'tap3']),
+                       'added': set(['tap3']),
+                       'removed': set(['tap2'])})])
+        self.assertEqual(2, process_network_devices.call_count)
+
+    def test_udev_daemon_loop_full_scan_on_resync(self):
+        cfg.CONF.set_override('udev_resync_interval', 0, 'AGENT')
+        lbmgr_instance = self.lbmgr_mock.return_value
+        lbmgr_instance.update_devices.side_effect = [None, RuntimeError]
+        agent = linuxbridge_quantum_agent.LinuxBridgeQuantumAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with mock.patch.object(linuxbridge_quantum_agent.LOG,
+                               'exception') as log:
+            log.side_effect = RuntimeError
+            with testtools.ExpectedException(RuntimeError):
+                agent.udev_daemon_loop()
+        self.assertEqual(2, lbmgr_instance.update_devices.call_count)
+        self.assertFalse(lbmgr_instance.udev_get_tap_events.called)
+
+    def test_udev_daemon_loop_sleeps_after_error(self):
+        lbmgr_instance = self.lbmgr_mock.return_value
+        lbmgr_instance.update_devices.side_effect = [
+            RuntimeError,
+            {'current': set(['tap1']), 'added': set(['tap1']),
+             'removed': set()}]
+        agent = linuxbridge_quantum_agent.LinuxBridgeQuantumAgentRPC({},
+                                                                     2,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(linuxbridge_quantum_agent.LOG, 'exception'),
+            mock.patch.object(linuxbridge_quantum_agent.time, 'sleep',
+                              side_effect=[None, RuntimeError]),
+            mock.patch.object(agent, 'process_network_devices',
+                              side_effect=RuntimeError)
+        ) as (log, sleep, process_network_devices):
+            with testtools.ExpectedException(RuntimeError):
+                agent.udev_daemon_loop()
+        self.assertEqual(2, log.call_count)
+        self.assertEqual([mock.call(2), mock.call(2)], sleep.call_args_list)
+        self.assertEqual(2, lbmgr_instance.update_devices.call_count)
+
 
 class TestLinuxBridgeManager(base.BaseTestCase):
     def setUp(self):
@@ -200,16 +267,23 @@ class TestLinuxBridgeManager(base.BaseTestCase):
                              ["qbr1"])
 
     def test_get_bridge_for_tap_device(self):
-        with contextlib.nested(
-            mock.patch.object(self.lbm, "get_all_quantum_bridges"),
-            mock.patch.object(self.lbm, "get_interfaces_on_bridge")
-        ) as (get_all_qbr_fn, get_if_fn):
-            get_all_qbr_fn.return_value = ["br-int", "br-ex"]
-            get_if_fn.return_value = ["tap1", "tap2", "tap3"]
-            self.assertEqual(self.lbm.get_bridge_for_tap_device("tap1"),
-                             "br-int")
-            self.assertEqual(self.lbm.get_bridge_for_tap_device("tap4"),
-                             None)
+        with mock.patch.object(os, "readlink") as readlink_fn:
+            readlink_fn.return_value = "../../../brq1"
+            self.assertEqual("brq1",
+                             self.lbm.get_bridge_for_tap_device("tap1"))
+            readlink_fn.assert_called_once_with(
+                "/sys/devices/virtual/net/tap1/brport/bridge")
+            readlink_fn.side_effect = OSError
+            self.assertIsNone(self.lbm.get_bridge_for_tap_device("tap2"))
+
+    def test_get_bridge_for_tap_device_moved(self):
+        with mock.patch.object(os, "readlink") as readlink_fn:
+            readlink_fn.side_effect = ["../../../brq1", "../../../brq2"]
+            self.assertEqual("brq1",
+                             self.lbm.get_bridge_for_tap_device("tap1"))
+            # moved to another bridge by someone else
+            self.assertEqual("brq2",
+                             self.lbm.get_bridge_for_tap_device("tap1"))
 
     def test_is_device_on_bridge(self):
         self.assertTrue(not self.lbm.is_device_on_bridge(""))
@@ -456,6 +530,42 @@ class TestLinuxBridgeManager(base.BaseTestCase):
                               "removed": set(["dev3"])
                               })
 
+    def _udev_event(self, action, name):
+        device = mock.Mock()
+        device.action = action
+        device.sys_name = name
+        return device
+
+    def test_udev_get_tap_events(self):
+        events = [self._udev_event('add', 'tap1'),
+                  self._udev_event('add', 'eth1'),
+                  self._udev_event('add', 'tap2'),
+                  self._udev_event('remove', 'tap3'),
+                  self._udev_event('move', 'tap4'),
+                  self._udev_event('remove', 'tap2'),
+                  None]
+        with mock.patch.object(self.lbm, 'udev_monitor') as monitor:
+            monitor.poll.side_effect = events
+            self.assertEqual((set(['tap1']), set(['tap2', 'tap3'])),
+                             self.lbm.udev_get_tap_events(5, 10))
+            monitor.poll.assert_called_with(mock.ANY)
+            self.assertEqual(mock.call(5), monitor.poll.call_args_list[0])
+            self.assertEqual(len(events), monitor.poll.call_count)
+
+    def test_udev_get_tap_events_timeout(self):
+        with mock.patch.object(self.lbm, 'udev_monitor') as monitor:
+            monitor.poll.return_value = None
+            self.assertEqual((set(), set()),
+                             self.lbm.udev_get_tap_events(-1, 10))
+            monitor.poll.assert_called_once_with(0)
+
+    def test_udev_get_tap_events_batch_interval(self):
+        with mock.patch.object(self.lbm, 'udev_monitor') as monitor:
+            monitor.poll.return_value = self._udev_event('add', 'tap1')
+            self.assertEqual((set(['tap1']), set()),
+                             self.lbm.udev_get_tap_events(5, 0))
+            monitor.poll.assert_called_once_with(5)
+
 
 class TestLinuxBridgeRpcCallbacks(base.BaseTestCase):
     def setUp(self):
@@ -516,7 +626,7 @@ class TestLinuxBridgeRpcCallbacks(base.BaseTestCase):
             getbr_fn.return_value = "br0"
             self.lb_rpc.port_update("unused_context", port=port,
                                     vlan_id="1", physical_network="physnet1")
-            self.assertTrue(reffw_fn.called)
+            reffw_fn.assert_called_once_with(["tap123"])
             remif_fn.assert_called_with("br0", "tap123")
             rpc_obj.update_device_down.assert_called_with(
                 self.lb_rpc.context,
@@ -19,6 +19,7 @@ import mock
 
 from quantum.api.v2 import attributes
 from quantum.extensions import securitygroup as ext_sg
+from quantum import manager
 from quantum.plugins.linuxbridge.db import l2network_db_v2 as lb_db
 from quantum.tests.unit import test_extension_security_group as test_sg
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -97,6 +98,34 @@ class TestLinuxBridgeSecurityGroupsDB(LinuxBridgeSecurityGroupsTestCase):
         port_dict = lb_db.get_port_from_device('bad_device_id')
         self.assertEqual(None, port_dict)
 
+    def test_security_group_get_ports_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    res1 = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[security_group_id])
+                    port1 = self.deserialize(self.fmt, res1)['port']
+                    res2 = self._create_port(self.fmt, n['network']['id'])
+                    port2 = self.deserialize(self.fmt, res2)['port']
+                    device1 = 'tap' + port1['id'][:11]
+                    device2 = 'tap' + port2['id'][:11]
+                    plugin = manager.QuantumManager.get_plugin()
+                    ports = plugin.callbacks.get_port_dicts_from_devices(
+                        [device1, device2, 'tapbad_device'])
+                    self.assertEqual(set([device1, device2]),
+                                     set(ports.keys()))
+                    self.assertEqual(port1['id'], ports[device1]['id'])
+                    self.assertEqual(device1, ports[device1]['device'])
+                    self.assertEqual([security_group_id],
+                                     ports[device1][ext_sg.SECURITYGROUPS])
+                    self.assertEqual([port1['fixed_ips'][0]['ip_address']],
+                                     ports[device1]['fixed_ips'])
+                    self.assertEqual(port2['id'], ports[device2]['id'])
+                    self._delete('ports', port1['id'])
+                    self._delete('ports', port2['id'])
+
 
 class TestLinuxBridgeSecurityGroupsDBXML(TestLinuxBridgeSecurityGroupsDB):
     fmt = 'xml'
@@ -13,7 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+
+from quantum.common import constants
+from quantum import context
+from quantum.db import l3_db
+from quantum.extensions import l3
 from quantum.extensions import portbindings
+from quantum.extensions import providernet as provider
+from quantum import manager
+from quantum.plugins.linuxbridge.common import constants as lb_constants
+from quantum.plugins.linuxbridge import lb_quantum_plugin
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -46,6 +56,34 @@ class TestLinuxBridgeNetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestLinuxBridgeCollectionQueriesV2(test_plugin.TestCollectionQueriesV2,
+                                         LinuxBridgePluginV2TestCase):
+
+    def test_get_networks_query_count_with_extensions(self):
+        plugin = manager.QuantumManager.get_plugin()
+        ctx = context.get_admin_context()
+
+        def get_networks():
+            del self.statements[:]
+            nets = plugin.get_networks(ctx)
+            return nets, len(self.statements)
+
+        with self.network() as net:
+            with ctx.session.begin(subtransactions=True):
+                ctx.session.add(l3_db.ExternalNetwork(
+                    network_id=net['network']['id']))
+            count = get_networks()[1]
+            with contextlib.nested(self.network(), self.network()):
+                nets, new_count = get_networks()
+                self.assertEqual(count, new_count)
+            self.assertEqual(3, len(nets))
+            for n in nets:
+                self.assertEqual(n['id'] == net['network']['id'],
+                                 n[l3.EXTERNAL])
+                self.assertEqual(lb_constants.TYPE_LOCAL,
+                                 n[provider.NETWORK_TYPE])
+
+
 class TestLinuxBridgePortsV2(test_plugin.TestPortsV2,
                              LinuxBridgePluginV2TestCase):
 
@@ -69,3 +107,47 @@ class TestLinuxBridgePortBinding(LinuxBridgePluginV2TestCase,
 class TestLinuxBridgePortBindingNoSG(TestLinuxBridgePortBinding):
     HAS_PORT_FILTER = False
     FIREWALL_DRIVER = test_sg_rpc.FIREWALL_NOOP_DRIVER
+
+
+class TestLinuxBridgeRpcCallbacks(LinuxBridgePluginV2TestCase):
+
+    def setUp(self):
+        super(TestLinuxBridgeRpcCallbacks, self).setUp()
+        self.callbacks = lb_quantum_plugin.LinuxBridgeRpcCallbacks()
+        self.ctx = context.get_admin_context()
+
+    def _device(self, port_id):
+        return 'tap' + port_id[:11]
+
+    def test_get_devices_details_list(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (port1, port2):
+                port1_id = port1['port']['id']
+                port2_id = port2['port']['id']
+                devices = [self._device(port1_id), 'tapmissing',
+                           self._device(port2_id)]
+                entries = self.callbacks.get_devices_details_list(
+                    self.ctx, devices=devices, agent_id='fake_agent')
+                self.assertEqual(devices,
+                                 [entry['device'] for entry in entries])
+                self.assertEqual(port1_id, entries[0]['port_id'])
+                self.assertEqual(port2_id, entries[2]['port_id'])
+                self.assertNotIn('port_id', entries[1])
+                port = self._show('ports', port2_id)['port']
+                self.assertEqual(constants.PORT_STATUS_ACTIVE, port['status'])
+
+    def test_update_devices_down(self):
+        with self.port() as port:
+            port_id = port['port']['id']
+            device = self._device(port_id)
+            self.callbacks.get_devices_details_list(
+                self.ctx, devices=[device], agent_id='fake_agent')
+            entries = self.callbacks.update_devices_down(
+                self.ctx, devices=[device, 'tapmissing'],
+                agent_id='fake_agent')
+            self.assertEqual([{'device': device, 'exists': True},
+                              {'device': 'tapmissing', 'exists': False}],
+                             entries)
+            port = self._show('ports', port_id)['port']
+            self.assertEqual(constants.PORT_STATUS_DOWN, port['status'])
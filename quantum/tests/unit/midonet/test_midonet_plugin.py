@@ -697,6 +697,12 @@ class TestMidonetPortsV2(test_plugin.TestPortsV2,
     def test_recycling(self):
         pass
 
+    def test_recycle_expired_ips_merges_ranges(self):
+        pass
+
+    def test_recycle_expired_ips_in_background(self):
+        pass
+
     def test_invalid_admin_state(self):
         self._setup_port_mocks()
         super(TestMidonetPortsV2, self).test_invalid_admin_state()
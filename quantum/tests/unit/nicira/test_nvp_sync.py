@@ -0,0 +1,182 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Nicira, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from quantum.common import constants
+from quantum import context
+from quantum.db import l3_db
+from quantum.db import models_v2
+from quantum import manager
+from quantum.plugins.nicira.common import sync
+from quantum.plugins.nicira import nvplib
+from quantum.tests.unit.nicira import test_nicira_plugin
+
+
+def _lswitch(uuid, fabric_status, network_id=None):
+    tags = network_id and [{'scope': 'quantum_net_id',
+                            'tag': network_id}] or []
+    return {'uuid': uuid, 'tags': tags,
+            '_relations': {'LogicalSwitchStatus':
+                           {'fabric_status': fabric_status}}}
+
+
+def _lrouter(uuid, fabric_status):
+    return {'uuid': uuid,
+            '_relations': {'LogicalRouterStatus':
+                           {'fabric_status': fabric_status}}}
+
+
+def _lport(port_id, fabric_status_up):
+    return {'uuid': 'lport-%s' % port_id,
+            'tags': [{'scope': 'q_port_id', 'tag': port_id}],
+            '_relations': {'LogicalPortStatus':
+                           {'fabric_status_up': fabric_status_up}}}
+
+
+class NvpSynchronizerTestCase(test_nicira_plugin.NiciraPluginV2TestCase):
+
+    def setUp(self):
+        super(NvpSynchronizerTestCase, self).setUp()
+        self.plugin = manager.QuantumManager.get_plugin()
+        self.ctx = context.get_admin_context()
+        self.synchronizer = sync.NvpSynchronizer(self.plugin.cluster, 120, 2)
+        self.sleep_p = mock.patch.object(sync.greenthread, 'sleep')
+        self.sleep = self.sleep_p.start()
+        self.addCleanup(self.sleep_p.stop)
+        self.page_p = mock.patch.object(nvplib, 'get_single_query_page')
+        self.get_page = self.page_p.start()
+        self.addCleanup(self.page_p.stop)
+
+    def _set_pages(self, lswitch_pages, lrouter_pages, lport_pages):
+        pages = []
+        for resource_pages in (lswitch_pages, lrouter_pages, lport_pages):
+            for i, page in enumerate(resource_pages):
+                page_cursor = i < len(resource_pages) - 1 and 'next' or None
+                pages.append((page, page_cursor, None))
+        self.get_page.side_effect = pages
+
+    def _add_router(self):
+        with self.ctx.session.begin(subtransactions=True):
+            router = l3_db.Router(id='router1', name='router1',
+                                  tenant_id=self._tenant_id,
+                                  status=constants.NET_STATUS_ACTIVE,
+                                  admin_state_up=True)
+            self.ctx.session.add(router)
+        return router
+
+    def _get_status(self, model, res_id):
+        return self.ctx.session.query(model).filter_by(id=res_id).one().status
+
+    def test_synchronize_state(self):
+        self._add_router()
+        with self.port() as port:
+            port_id = port['port']['id']
+            net_id = port['port']['network_id']
+            self._set_pages([[_lswitch(net_id, False)]],
+                            [[_lrouter('router1', False)]],
+                            [[_lport(port_id, True)]])
+            self.synchronizer.synchronize_state()
+            self.assertEqual(constants.NET_STATUS_DOWN,
+                             self._get_status(models_v2.Network, net_id))
+            self.assertEqual(constants.NET_STATUS_DOWN,
+                             self._get_status(l3_db.Router, 'router1'))
+            self.assertEqual(constants.PORT_STATUS_ACTIVE,
+                             self._get_status(models_v2.Port, port_id))
+
+            self._set_pages([[_lswitch(net_id, True)]],
+                            [[_lrouter('router1', True)]],
+                            [[_lport(port_id, False)]])
+            self.synchronizer.synchronize_state()
+            self.assertEqual(constants.NET_STATUS_ACTIVE,
+                             self._get_status(models_v2.Network, net_id))
+            self.assertEqual(constants.NET_STATUS_ACTIVE,
+                             self._get_status(l3_db.Router, 'router1'))
+            self.assertEqual(constants.PORT_STATUS_DOWN,
+                             self._get_status(models_v2.Port, port_id))
+
+    def test_synchronize_state_pages(self):
+        with self.network() as net:
+            net_id = net['network']['id']
+            self._set_pages([[_lswitch(net_id, False)],
+                             [_lswitch('ext-ls', True, net_id)]],
+                            [[]],
+                            [[], []])
+            self.synchronizer.synchronize_state()
+            # one of the logical switches of the network is down
+            self.assertEqual(constants.NET_STATUS_DOWN,
+                             self._get_status(models_v2.Network, net_id))
+            self.get_page.assert_has_calls([
+                mock.call(sync.NvpSynchronizer.LSWITCH_URI,
+                          self.plugin.cluster, None, 2),
+                mock.call(sync.NvpSynchronizer.LSWITCH_URI,
+                          self.plugin.cluster, 'next', 2),
+                mock.call(sync.NvpSynchronizer.LROUTER_URI,
+                          self.plugin.cluster, None, 2),
+                mock.call(sync.NvpSynchronizer.LSWITCHPORT_URI,
+                          self.plugin.cluster, None, 2),
+                mock.call(sync.NvpSynchronizer.LSWITCHPORT_URI,
+                          self.plugin.cluster, 'next', 2)])
+
+    def test_synchronize_state_spreads_requests(self):
+        self._set_pages([[], []], [[]], [[]])
+        self.synchronizer.synchronize_state()
+        # the first run assumes one page per resource
+        self.assertEqual([mock.call(40.0)] * 3, self.sleep.call_args_list)
+        self.sleep.reset_mock()
+        self._set_pages([[], []], [[]], [[]])
+        self.synchronizer.synchronize_state()
+        self.assertEqual([mock.call(30.0)] * 3, self.sleep.call_args_list)
+
+    def test_synchronize_state_error(self):
+        self.get_page.side_effect = Exception
+        with mock.patch.object(sync.LOG, 'exception') as log:
+            self.synchronizer.synchronize_state()
+            self.assertEqual(1, log.call_count)
+
+    def test_read_status_from_db(self):
+        self.plugin.nvp_sync = self.synchronizer
+        self.addCleanup(setattr, self.plugin, 'nvp_sync', None)
+        with self.network() as net:
+            net_id = net['network']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.ctx.session.query(models_v2.Network).filter_by(
+                    id=net_id).update({'status': constants.NET_STATUS_DOWN})
+            with mock.patch.object(nvplib, 'get_lswitches') as get_ls:
+                req = self.new_show_request('networks', net_id)
+                res = self.deserialize('json', req.get_response(self.api))
+                self.assertEqual(constants.NET_STATUS_DOWN,
+                                 res['network']['status'])
+                res = self._list('networks')
+                self.assertEqual(constants.NET_STATUS_DOWN,
+                                 res['networks'][0]['status'])
+                self.assertFalse(get_ls.called)
+
+    def test_always_read_status(self):
+        self.plugin.nvp_sync = self.synchronizer
+        self.addCleanup(setattr, self.plugin, 'nvp_sync', None)
+        cfg.CONF.set_override('always_read_status', True, 'NVP_SYNC')
+        with self.network() as net:
+            net_id = net['network']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.ctx.session.query(models_v2.Network).filter_by(
+                    id=net_id).update({'status': constants.NET_STATUS_DOWN})
+            req = self.new_show_request('networks', net_id)
+            res = self.deserialize('json', req.get_response(self.api))
+            self.assertEqual(constants.NET_STATUS_ACTIVE,
+                             res['network']['status'])
@@ -204,3 +204,31 @@ class TestNvpLibLogicalPorts(NvplibTestCase):
                                                lswitch['uuid'],
                                                quantum_port_id)
         self.assertIsNone(lport)
+
+
+class TestNvplibQueryPages(NvplibTestCase):
+
+    def test_get_single_query_page(self):
+        with mock.patch.object(nvplib, 'do_single_request') as req:
+            req.return_value = json.dumps({'results': [{'uuid': 'a'}],
+                                           'page_cursor': 'next',
+                                           'result_count': 3})
+            self.assertEqual(([{'uuid': 'a'}], 'next', 3),
+                             nvplib.get_single_query_page(
+                                 '/ws.v1/lswitch?fields=uuid',
+                                 self.fake_cluster, 'cursor', 1))
+            req.assert_called_once_with(
+                nvplib.HTTP_GET,
+                '/ws.v1/lswitch?fields=uuid&_page_length=1'
+                '&_page_cursor=cursor',
+                cluster=self.fake_cluster)
+
+    def test_get_single_query_page_last_page(self):
+        nvplib.create_lrouter(self.fake_cluster, 'pippo', 'fake_router',
+                              '192.168.0.1')
+        results, page_cursor, count = nvplib.get_single_query_page(
+            nvplib._build_uri_path(nvplib.LROUTER_RESOURCE),
+            self.fake_cluster)
+        self.assertEqual(1, len(results))
+        self.assertIsNone(page_cursor)
+        self.assertEqual(1, count)
@@ -14,6 +14,7 @@
 #
 
 import fixtures
+import mock
 import os
 import testtools
 
@@ -84,6 +85,11 @@ class ConfigurationTest(testtools.TestCase):
         self.useFixture(fixtures.MonkeyPatch(
                         'quantum.manager.QuantumManager._instance',
                         None))
+        # Avoid runs of the status synchronization task
+        self.useFixture(fixtures.MonkeyPatch(
+                        'quantum.plugins.nicira.common.sync.'
+                        'NvpSynchronizer.start',
+                        mock.Mock()))
 
     def _assert_required_options(self, cluster):
         self.assertEqual(cluster.nvp_controllers, ['fake_1:443', 'fake_2:443'])
@@ -133,6 +139,9 @@ class ConfigurationTest(testtools.TestCase):
         self.assertIsNone(cfg.CONF.default_l3_gw_service_uuid)
         self.assertIsNone(cfg.CONF.default_l2_gw_service_uuid)
         self.assertEqual('breth0', cfg.CONF.default_interface_name)
+        self.assertEqual(120, cfg.CONF.NVP_SYNC.state_sync_interval)
+        self.assertEqual(500, cfg.CONF.NVP_SYNC.chunk_size)
+        self.assertFalse(cfg.CONF.NVP_SYNC.always_read_status)
 
 
 class OldConfigurationTest(testtools.TestCase):
@@ -143,6 +152,11 @@ class OldConfigurationTest(testtools.TestCase):
         self.useFixture(fixtures.MonkeyPatch(
                         'quantum.manager.QuantumManager._instance',
                         None))
+        # Avoid runs of the status synchronization task
+        self.useFixture(fixtures.MonkeyPatch(
+                        'quantum.plugins.nicira.common.sync.'
+                        'NvpSynchronizer.start',
+                        mock.Mock()))
 
     def _assert_required_options(self, cluster):
         self.assertEqual(cluster.nvp_controllers, ['fake_1:443', 'fake_2:443'])
@@ -17,6 +17,7 @@ import contextlib
 import copy
 
 import mock
+from oslo.config import cfg
 from webob import exc
 
 from quantum.api import extensions
@@ -30,6 +31,7 @@ from quantum.extensions import agentscheduler
 from quantum import manager
 from quantum.openstack.common import timeutils
 from quantum.openstack.common import uuidutils
+from quantum.plugins.openvswitch.common import config  # noqa
 from quantum.tests.unit import test_agent_ext_plugin
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_extensions
@@ -879,6 +881,27 @@ class OvsL3AgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                     payload=routers),
                 topic='l3_agent.hosta')
 
+    def test_router_delta_updated_l3_agent_notification(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with mock.patch.object(plugin.l3_agent_notifier, 'cast') as mock_l3:
+            with self.router() as router1:
+                self._register_agent_states()
+                hosta_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                              L3_HOSTA)
+                self._add_router_to_l3_agent(hosta_id,
+                                             router1['router']['id'])
+                delta = {constants.FLOATINGIP_KEY: {'removed': ['fake']}}
+                plugin.l3_agent_notifier.router_delta_updated(
+                    self.adminContext, router1['router']['id'], 2, delta)
+            mock_l3.assert_called_with(
+                mock.ANY,
+                plugin.l3_agent_notifier.make_msg(
+                    'router_delta_updated',
+                    payload={'router_id': router1['router']['id'],
+                             'revision': 2,
+                             'delta': delta}),
+                topic='l3_agent.hosta', version='1.1')
+
     def test_router_remove_from_l3_agent_notification(self):
         plugin = manager.QuantumManager.get_plugin()
         with mock.patch.object(plugin.l3_agent_notifier, 'cast') as mock_l3:
@@ -910,5 +933,255 @@ class OvsL3AgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                 topic='l3_agent.hosta')
 
 
+class OvsLeastRoutersSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
+                                       test_agent_ext_plugin.AgentDBTestMixIn,
+                                       AgentSchedulerTestMixIn,
+                                       test_plugin.QuantumDbPluginV2TestCase):
+    fmt = 'json'
+    plugin_str = ('quantum.plugins.openvswitch.'
+                  'ovs_quantum_plugin.OVSQuantumPluginV2')
+
+    def setUp(self):
+        cfg.CONF.set_override('router_scheduler_driver',
+                              'quantum.scheduler.l3_agent_scheduler.'
+                              'LeastRoutersScheduler')
+        super(OvsLeastRoutersSchedulerTestCase, self).setUp(self.plugin_str)
+        ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
+        self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
+        self.adminContext = context.get_admin_context()
+        self.plugin = manager.QuantumManager.get_plugin()
+        notifier_p = mock.patch.object(self.plugin, 'l3_agent_notifier')
+        self.l3_notifier = notifier_p.start()
+        self.addCleanup(notifier_p.stop)
+
+    def _register_l3_agent(self, host, **configurations):
+        l3_agent = {
+            'binary': 'quantum-l3-agent',
+            'host': host,
+            'topic': 'L3_AGENT',
+            'configurations': {'use_namespaces': True,
+                               'router_id': None,
+                               'handle_internal_only_routers':
+                               True,
+                               'gateway_external_network_id':
+                               None,
+                               'interface_driver': 'interface_driver',
+                               },
+            'agent_type': constants.AGENT_TYPE_L3}
+        l3_agent['configurations'].update(configurations)
+        self._register_one_agent_state(l3_agent)
+        return self._get_agent_id(constants.AGENT_TYPE_L3, host)
+
+    def _num_routers_hosted(self, agent_id):
+        return len(self._list_routers_hosted_by_l3_agent(
+            agent_id)['routers'])
+
+    def test_schedule_to_least_loaded_agent(self):
+        with contextlib.nested(self.router(),
+                               self.router()) as (router1, router2):
+            hosta_id = self._register_l3_agent(L3_HOSTA)
+            hostb_id = self._register_l3_agent(L3_HOSTB)
+            self.plugin.add_router_to_l3_agent(
+                self.adminContext, hosta_id, router1['router']['id'])
+            chosen_agent = self.plugin.schedule_router(
+                self.adminContext,
+                self.plugin.get_router(self.adminContext,
+                                       router2['router']['id']))
+        self.assertEqual(hostb_id, chosen_agent.id)
+
+    def test_auto_schedule_spreads_routers(self):
+        with contextlib.nested(*[self.router() for i in range(4)]):
+            hosta_id = self._register_l3_agent(L3_HOSTA)
+            hostb_id = self._register_l3_agent(L3_HOSTB)
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            with mock.patch.object(
+                self.plugin, 'get_l3_agent_candidates',
+                wraps=self.plugin.get_l3_agent_candidates) as candidates:
+                routers = l3_rpc.sync_routers(self.adminContext,
+                                              host=L3_HOSTA)
+            num_hosta_routers = self._num_routers_hosted(hosta_id)
+            num_hostb_routers = self._num_routers_hosted(hostb_id)
+        self.assertEqual(2, len(routers))
+        self.assertEqual(2, num_hosta_routers)
+        self.assertEqual(2, num_hostb_routers)
+        # the routers share the same candidates
+        self.assertEqual(1, candidates.call_count)
+        self.assertEqual(1, self.l3_notifier.router_added_to_agent.call_count)
+        self.assertEqual(
+            L3_HOSTB, self.l3_notifier.router_added_to_agent.call_args[0][2])
+
+    def test_auto_schedule_considers_floating_ips(self):
+        with contextlib.nested(self.router(), self.router()):
+            hosta_id = self._register_l3_agent(L3_HOSTA, floating_ips=30)
+            hostb_id = self._register_l3_agent(L3_HOSTB)
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            routers = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA)
+            num_hosta_routers = self._num_routers_hosted(hosta_id)
+            num_hostb_routers = self._num_routers_hosted(hostb_id)
+        self.assertEqual([], routers)
+        self.assertEqual(0, num_hosta_routers)
+        self.assertEqual(2, num_hostb_routers)
+
+    def test_rebalance_routers(self):
+        with contextlib.nested(*[self.router() for i in range(4)]):
+            hosta_id = self._register_l3_agent(L3_HOSTA)
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA)
+            hostb_id = self._register_l3_agent(L3_HOSTB)
+            moves = self.plugin.rebalance_routers(self.adminContext,
+                                                  batch_size=1)
+            num_hosta_routers = self._num_routers_hosted(hosta_id)
+            num_hostb_routers = self._num_routers_hosted(hostb_id)
+            # the agents are balanced now
+            self.assertEqual([], self.plugin.rebalance_routers(
+                self.adminContext))
+        self.assertEqual(2, len(moves))
+        for router_id, old_agent_id, new_agent_id in moves:
+            self.assertEqual(hosta_id, old_agent_id)
+            self.assertEqual(hostb_id, new_agent_id)
+        self.assertEqual(2, num_hosta_routers)
+        self.assertEqual(2, num_hostb_routers)
+        self.l3_notifier.router_removed_from_agent.assert_has_calls(
+            [mock.call(self.adminContext, router_id, L3_HOSTA)
+             for router_id, old_agent_id, new_agent_id in moves])
+        # one notification per batch
+        self.assertEqual(2, self.l3_notifier.router_added_to_agent.call_count)
+
+    def test_rebalance_routers_max_moves(self):
+        with contextlib.nested(*[self.router() for i in range(4)]):
+            self._register_l3_agent(L3_HOSTA)
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA)
+            self._register_l3_agent(L3_HOSTB)
+            moves = self.plugin.rebalance_routers(self.adminContext,
+                                                  max_moves=1)
+        self.assertEqual(1, len(moves))
+        self.assertEqual(1, self.l3_notifier.router_added_to_agent.call_count)
+
+
+class OvsWeightSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
+                                 test_agent_ext_plugin.AgentDBTestMixIn,
+                                 AgentSchedulerTestMixIn,
+                                 test_plugin.QuantumDbPluginV2TestCase):
+    fmt = 'json'
+    plugin_str = ('quantum.plugins.openvswitch.'
+                  'ovs_quantum_plugin.OVSQuantumPluginV2')
+
+    def setUp(self):
+        cfg.CONF.set_override('network_scheduler_driver',
+                              'quantum.scheduler.dhcp_agent_scheduler.'
+                              'WeightScheduler')
+        cfg.CONF.set_override('dhcp_agents_per_network', 2)
+        super(OvsWeightSchedulerTestCase, self).setUp(self.plugin_str)
+        ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
+        self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
+        self.adminContext = context.get_admin_context()
+        self.plugin = manager.QuantumManager.get_plugin()
+        notifier_p = mock.patch.object(self.plugin, 'dhcp_agent_notifier')
+        self.dhcp_notifier = notifier_p.start()
+        self.addCleanup(notifier_p.stop)
+
+    def _register_dhcp_agent(self, host, **configurations):
+        dhcp_agent = {
+            'binary': 'quantum-dhcp-agent',
+            'host': host,
+            'topic': 'DHCP_AGENT',
+            'configurations': {'dhcp_driver': 'dhcp_driver',
+                               'use_namespaces': True,
+                               },
+            'agent_type': constants.AGENT_TYPE_DHCP}
+        dhcp_agent['configurations'].update(configurations)
+        self._register_one_agent_state(dhcp_agent)
+        return self._get_agent_id(constants.AGENT_TYPE_DHCP, host)
+
+    def _hosting_hosts(self, network_id):
+        dhcp_agents = self._list_dhcp_agents_hosting_network(network_id)
+        return sorted(agent['host'] for agent in dhcp_agents['agents'])
+
+    def test_schedule_network_to_least_loaded_agents(self):
+        with self.network() as net:
+            self._register_dhcp_agent('host1')
+            self._register_dhcp_agent('host2', ports=500)
+            self._register_dhcp_agent('host3')
+            chosen_agents = self.plugin.schedule_network(
+                self.adminContext, net['network'])
+            hosts = self._hosting_hosts(net['network']['id'])
+            # the network is hosted by enough agents now
+            self.assertEqual([], self.plugin.schedule_network(
+                self.adminContext, net['network']))
+        self.assertEqual(['host1', 'host3'],
+                         sorted(agent.host for agent in chosen_agents))
+        self.assertEqual(['host1', 'host3'], hosts)
+
+    def test_schedule_network_adds_missing_agent(self):
+        with self.network() as net:
+            host1_id = self._register_dhcp_agent('host1')
+            self._register_dhcp_agent('host2')
+            self.plugin.add_network_to_dhcp_agent(
+                self.adminContext, host1_id, net['network']['id'])
+            chosen_agents = self.plugin.schedule_network(
+                self.adminContext, net['network'])
+            hosts = self._hosting_hosts(net['network']['id'])
+        self.assertEqual(['host2'], [agent.host for agent in chosen_agents])
+        self.assertEqual(['host1', 'host2'], hosts)
+
+    def test_schedule_network_scheduled_concurrently(self):
+        with self.network() as net:
+            host1_id = self._register_dhcp_agent('host1')
+            self.plugin.add_network_to_dhcp_agent(
+                self.adminContext, host1_id, net['network']['id'])
+            # another server bound the network after it was looked up
+            with mock.patch.object(self.plugin,
+                                   'get_dhcp_agents_hosting_networks',
+                                   return_value=[]):
+                chosen_agents = self.plugin.schedule_network(
+                    self.adminContext, net['network'])
+            hosts = self._hosting_hosts(net['network']['id'])
+        self.assertEqual([], chosen_agents)
+        self.assertEqual(['host1'], hosts)
+
+    def test_choose_agents_is_deterministic(self):
+        with contextlib.nested(self.network(), self.network()) as nets:
+            for host in ('host1', 'host2', 'host3', 'host4'):
+                self._register_dhcp_agent(host)
+            scheduler = self.plugin.network_scheduler
+            dhcp_agents = scheduler._get_active_dhcp_agents(
+                self.plugin, self.adminContext)
+            for net in nets:
+                network_id = net['network']['id']
+                chosen = [scheduler._choose_agents(
+                    network_id, candidates, dict.fromkeys(
+                        [agent.id for agent in dhcp_agents], 0), 2)
+                    for candidates in (dhcp_agents, dhcp_agents[::-1])]
+                self.assertEqual(chosen[0], chosen[1])
+
+    def test_auto_schedule_spreads_networks(self):
+        cfg.CONF.set_override('dhcp_agents_per_network', 1)
+        with contextlib.nested(*[self.network() for i in range(4)]):
+            self._register_dhcp_agent(DHCP_HOSTA)
+            hostc_id = self._register_dhcp_agent(DHCP_HOSTC)
+            dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+            net_ids = dhcp_rpc.get_active_networks(self.adminContext,
+                                                   host=DHCP_HOSTA)
+            hostc_nets = self.plugin.list_networks_on_dhcp_agent(
+                self.adminContext, hostc_id)['networks']
+        self.assertEqual(2, len(net_ids))
+        self.assertEqual(2, len(hostc_nets))
+        self.dhcp_notifier.network_added_to_agent.assert_has_calls(
+            [mock.call(self.adminContext, net['id'], DHCP_HOSTC)
+             for net in hostc_nets], any_order=True)
+
+    def test_auto_schedule_hosts_network_twice(self):
+        with self.network() as net:
+            self._register_dhcp_agent(DHCP_HOSTA)
+            self._register_dhcp_agent(DHCP_HOSTC)
+            dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+            net_ids = dhcp_rpc.get_active_networks(self.adminContext,
+                                                   host=DHCP_HOSTA)
+            hosts = self._hosting_hosts(net['network']['id'])
+        self.assertEqual([net['network']['id']], net_ids)
+        self.assertEqual([DHCP_HOSTA, DHCP_HOSTC], hosts)
+
+
 class OvsAgentSchedulerTestCaseXML(OvsAgentSchedulerTestCase):
     fmt = 'xml'
@@ -13,7 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+
+from quantum.common import constants
+from quantum import context
+from quantum.db import l3_db
+from quantum.extensions import l3
 from quantum.extensions import portbindings
+from quantum.extensions import providernet as provider
+from quantum import manager
+from quantum.plugins.openvswitch.common import constants as ovs_constants
+from quantum.plugins.openvswitch import ovs_quantum_plugin
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -53,6 +63,34 @@ class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestOpenvswitchCollectionQueriesV2(test_plugin.TestCollectionQueriesV2,
+                                         OpenvswitchPluginV2TestCase):
+
+    def test_get_networks_query_count_with_extensions(self):
+        plugin = manager.QuantumManager.get_plugin()
+        ctx = context.get_admin_context()
+
+        def get_networks():
+            del self.statements[:]
+            nets = plugin.get_networks(ctx)
+            return nets, len(self.statements)
+
+        with self.network() as net:
+            with ctx.session.begin(subtransactions=True):
+                ctx.session.add(l3_db.ExternalNetwork(
+                    network_id=net['network']['id']))
+            count = get_networks()[1]
+            with contextlib.nested(self.network(), self.network()):
+                nets, new_count = get_networks()
+                self.assertEqual(count, new_count)
+            self.assertEqual(3, len(nets))
+            for n in nets:
+                self.assertEqual(n['id'] == net['network']['id'],
+                                 n[l3.EXTERNAL])
+                self.assertEqual(ovs_constants.TYPE_LOCAL,
+                                 n[provider.NETWORK_TYPE])
+
+
 class TestOpenvswitchPortBinding(OpenvswitchPluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
     VIF_TYPE = portbindings.VIF_TYPE_OVS
@@ -67,3 +105,44 @@ class TestOpenvswitchPortBinding(OpenvswitchPluginV2TestCase,
 class TestOpenvswitchPortBindingNoSG(TestOpenvswitchPortBinding):
     HAS_PORT_FILTER = False
     FIREWALL_DRIVER = test_sg_rpc.FIREWALL_NOOP_DRIVER
+
+
+class TestOpenvswitchRpcCallbacks(OpenvswitchPluginV2TestCase):
+
+    def setUp(self):
+        super(TestOpenvswitchRpcCallbacks, self).setUp()
+        self.callbacks = ovs_quantum_plugin.OVSRpcCallbacks(None)
+        self.ctx = context.get_admin_context()
+
+    def test_get_devices_details_list(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (port1, port2):
+                port1_id = port1['port']['id']
+                port2_id = port2['port']['id']
+                entries = self.callbacks.get_devices_details_list(
+                    self.ctx, devices=[port1_id, 'missing', port2_id],
+                    agent_id='fake_agent')
+                self.assertEqual([port1_id, 'missing', port2_id],
+                                 [entry['device'] for entry in entries])
+                self.assertEqual(port1_id, entries[0]['port_id'])
+                self.assertEqual('local', entries[0]['network_type'])
+                self.assertNotIn('port_id', entries[1])
+                for port_id in (port1_id, port2_id):
+                    port = self._show('ports', port_id)['port']
+                    self.assertEqual(constants.PORT_STATUS_ACTIVE,
+                                     port['status'])
+
+    def test_update_devices_down(self):
+        with self.port() as port:
+            port_id = port['port']['id']
+            self.callbacks.get_devices_details_list(
+                self.ctx, devices=[port_id], agent_id='fake_agent')
+            entries = self.callbacks.update_devices_down(
+                self.ctx, devices=[port_id, 'missing'],
+                agent_id='fake_agent')
+            self.assertEqual([{'device': port_id, 'exists': True},
+                              {'device': 'missing', 'exists': False}],
+                             entries)
+            port = self._show('ports', port_id)['port']
+            self.assertEqual(constants.PORT_STATUS_DOWN, port['status'])
@@ -18,6 +18,7 @@
 import mox
 
 from quantum.agent.linux import ovs_lib, utils
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import uuidutils
 from quantum.tests import base
 
@@ -225,28 +226,38 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
         self.mox.VerifyAll()
 
+    def _interfaces_json(self, *interfaces):
+        data = [[name, ofport, ['map', sorted(external_ids.items())]]
+                for name, ofport, external_ids in interfaces]
+        return jsonutils.dumps({'headings': ['name', 'ofport',
+                                             'external_ids'],
+                                'data': data})
+
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
         utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
-                      root_helper=self.root_helper).AndReturn("%s\n" % pname)
+                      root_helper=self.root_helper).AndReturn(
+                          "%s\npatch-tun\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {'xs-vif-uuid': vif_id, 'attached-mac': mac}
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
-
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+            external_ids = {'iface-id': vif_id, 'attached-mac': mac}
+
+        # Interfaces of every bridge are listed with a single call
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._interfaces_json(
+                              (pname, ofport, external_ids),
+                              ("patch-tun", 1, {}),
+                              ("tap-other-br", 2,
+                               {'iface-id': 'other', 'attached-mac': mac})))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                            "param-key=nicira-iface-id", "uuid=" + vif_id],
@@ -276,20 +287,51 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.br.clear_db_attribute("Port", pname, "tag")
         self.mox.VerifyAll()
 
-    def test_port_id_regex(self):
-        result = ('external_ids        : {attached-mac="fa:16:3e:23:5b:f2",'
-                  ' iface-id="5c1321a7-c73f-4a77-95e6-9f86402e5c8f",'
-                  ' iface-status=active}\nname                :'
-                  ' "dhc5c1321a7-c7"\nofport              : 2\n')
-        match = self.br.re_id.search(result)
-        vif_mac = match.group('vif_mac')
-        vif_id = match.group('vif_id')
-        port_name = match.group('port_name')
-        ofport = int(match.group('ofport'))
-        self.assertEqual(vif_mac, 'fa:16:3e:23:5b:f2')
-        self.assertEqual(vif_id, '5c1321a7-c73f-4a77-95e6-9f86402e5c8f')
-        self.assertEqual(port_name, 'dhc5c1321a7-c7')
-        self.assertEqual(ofport, 2)
+    def test_get_vif_port_set_without_ofport(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("tap1\n")
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._interfaces_json(
+                              ("tap1", ["set", []],
+                               {'iface-id': 'port1',
+                                'attached-mac': 'fa:16:3e:23:5b:f2'})))
+        self.mox.ReplayAll()
+        self.assertEqual(set(['port1']), self.br.get_vif_port_set())
+        self.mox.VerifyAll()
+
+    def test_get_vif_port_by_id(self):
+        vif_id = '5c1321a7-c73f-4a77-95e6-9f86402e5c8f'
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids",
+                       "find", "Interface",
+                       'external_ids:iface-id="%s"' % vif_id],
+                      root_helper=self.root_helper).AndReturn(
+                          self._interfaces_json(
+                              ("dhc5c1321a7-c7", 2,
+                               {'attached-mac': 'fa:16:3e:23:5b:f2',
+                                'iface-id': vif_id,
+                                'iface-status': 'active'})))
+        self.mox.ReplayAll()
+        port = self.br.get_vif_port_by_id(vif_id)
+        self.assertEqual(port.vif_mac, 'fa:16:3e:23:5b:f2')
+        self.assertEqual(port.vif_id, vif_id)
+        self.assertEqual(port.port_name, 'dhc5c1321a7-c7')
+        self.assertEqual(port.ofport, 2)
+        self.mox.VerifyAll()
+
+    def test_get_vif_port_by_id_not_found(self):
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids",
+                       "find", "Interface",
+                       'external_ids:iface-id="missing"'],
+                      root_helper=self.root_helper).AndReturn(
+                          self._interfaces_json())
+        self.mox.ReplayAll()
+        self.assertIsNone(self.br.get_vif_port_by_id('missing'))
+        self.mox.VerifyAll()
 
     def test_iface_to_br(self):
         iface = 'tap0'
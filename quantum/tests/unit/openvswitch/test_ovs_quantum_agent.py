@@ -92,9 +92,11 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         self.assertTrue(add_flow_func.called)
 
     def mock_update_ports(self, vif_port_set=None, registered_ports=None):
-        with mock.patch.object(self.agent.int_br, 'get_vif_port_set',
-                               return_value=vif_port_set):
-            return self.agent.update_ports(registered_ports)
+        vif_port_map = dict((port_id, mock.Mock())
+                            for port_id in vif_port_set or [])
+        with mock.patch.object(self.agent.int_br, 'get_vif_port_map',
+                               return_value=vif_port_map):
+            return self.agent.update_ports(registered_ports or set())
 
     def test_update_ports_returns_none_for_unchanged_ports(self):
         self.assertIsNone(self.mock_update_ports())
@@ -106,8 +108,65 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def test_get_vif_port_uses_update_ports_cache(self):
+        self.mock_update_ports(set(['port1']))
+        with mock.patch.object(self.agent.int_br,
+                               'get_vif_port_by_id') as get_vif_port_by_id:
+            self.assertEqual(self.agent.vif_port_cache['port1'],
+                             self.agent.get_vif_port('port1'))
+            self.assertFalse(get_vif_port_by_id.called)
+            self.agent.get_vif_port('port2')
+            get_vif_port_by_id.assert_called_once_with('port2')
+
+    def test_get_monitored_vif_port_map_filters_other_bridges(self):
+        self.agent.iface_monitor = mock.Mock()
+        self.agent.iface_monitor.get_interfaces.return_value = [
+            {'name': 'tap1', 'ofport': 1,
+             'external_ids': {'iface-id': 'port1',
+                              'attached-mac': 'fa:16:3e:0:0:1'}},
+            {'name': 'qg-2', 'ofport': 1,
+             'external_ids': {'iface-id': 'port2',
+                              'attached-mac': 'fa:16:3e:0:0:2'}},
+            {'name': 'patch-tun', 'ofport': 2, 'external_ids': {}}]
+        self.agent.int_br = ovs_lib.OVSBridge('br-int', 'sudo')
+        with mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                               return_value=['tap1', 'patch-tun']):
+            vif_ports = self.agent.get_monitored_vif_port_map()
+        self.assertEqual(['port1'], vif_ports.keys())
+        self.assertEqual('tap1', vif_ports['port1'].port_name)
+
+    def test_poll_ports_skips_polling_without_monitor_changes(self):
+        self.agent.iface_monitor = mock.Mock()
+        self.agent.iface_monitor.is_active.return_value = True
+        with mock.patch.object(self.agent, 'update_ports') as update_ports:
+            self.assertIsNone(self.agent.poll_ports(set(), False))
+        self.assertFalse(update_ports.called)
+
+    def test_poll_ports_uses_monitor_on_changes(self):
+        self.agent.iface_monitor = mock.Mock()
+        self.agent.iface_monitor.is_active.return_value = True
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'get_monitored_vif_port_map',
+                              return_value={'port1': mock.Mock()}),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_map')
+        ) as (get_monitored, get_vif_port_map):
+            port_info = self.agent.poll_ports(set(), True)
+        self.assertEqual(set(['port1']), port_info['added'])
+        self.assertFalse(get_vif_port_map.called)
+
+    def test_poll_ports_resyncs_when_monitor_is_dead(self):
+        self.agent.iface_monitor = mock.Mock()
+        self.agent.iface_monitor.is_active.return_value = False
+        registered_ports = set(['port1'])
+        with mock.patch.object(self.agent.int_br, 'get_vif_port_map',
+                               return_value={'port1': mock.Mock()}):
+            port_info = self.agent.poll_ports(registered_ports, False)
+        self.agent.iface_monitor.start.assert_called_once_with()
+        self.assertEqual(set(['port1']), port_info['added'])
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -120,8 +179,9 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
             mock.patch.object(self.agent, func_name)
@@ -149,14 +209,14 @@ class TestOvsQuantumAgent(base.BaseTestCase):
                                                        'treat_vif_port'))
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='dev1', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=[details]):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
         self.assertEqual(port_unbound.called, not port_exists)
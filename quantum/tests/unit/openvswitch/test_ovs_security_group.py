@@ -18,6 +18,7 @@
 import mock
 
 from quantum.api.v2 import attributes
+from quantum import context
 from quantum.extensions import securitygroup as ext_sg
 from quantum import manager
 from quantum.tests.unit import test_extension_security_group as test_sg
@@ -89,6 +90,82 @@ class TestOpenvswitchSecurityGroups(OpenvswitchSecurityGroupsTestCase,
         port_dict = plugin.callbacks.get_port_from_device('bad_device_id')
         self.assertEqual(None, port_dict)
 
+    def test_security_group_get_port_dicts_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    res1 = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[security_group_id])
+                    port1 = self.deserialize(self.fmt, res1)['port']
+                    res2 = self._create_port(self.fmt, n['network']['id'])
+                    port2 = self.deserialize(self.fmt, res2)['port']
+                    plugin = manager.QuantumManager.get_plugin()
+                    ports = plugin.callbacks.get_port_dicts_from_devices(
+                        [port1['id'], port2['id'], 'bad_device_id'])
+                    self.assertEqual(set([port1['id'], port2['id']]),
+                                     set(ports.keys()))
+                    self.assertEqual(port1['id'],
+                                     ports[port1['id']]['device'])
+                    self.assertEqual([security_group_id],
+                                     ports[port1['id']][ext_sg.SECURITYGROUPS])
+                    self.assertEqual([port1['fixed_ips'][0]['ip_address']],
+                                     ports[port1['id']]['fixed_ips'])
+                    self._delete('ports', port1['id'])
+                    self._delete('ports', port2['id'])
+
+    def test_security_group_rules_for_devices_cached(self):
+        plugin = manager.QuantumManager.get_plugin()
+        callbacks = plugin.callbacks
+        load_rules = mock.patch.object(
+            callbacks, '_load_rules_for_security_groups',
+            wraps=callbacks._load_rules_for_security_groups).start()
+        load_ips = mock.patch.object(
+            callbacks, '_load_ips_for_security_groups',
+            wraps=callbacks._load_ips_for_security_groups).start()
+        ctx = context.get_admin_context()
+
+        def get_rules(port_id):
+            ports = callbacks.security_group_rules_for_devices(
+                ctx, devices=[port_id])
+            return ports[port_id]['security_group_rules']
+
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    sg_id = sg['security_group']['id']
+                    res = self._create_port(self.fmt, n['network']['id'],
+                                            security_groups=[sg_id])
+                    port1 = self.deserialize(self.fmt, res)['port']
+                    self.assertEqual(2, len(get_rules(port1['id'])))
+                    get_rules(port1['id'])
+                    load_rules.assert_called_once_with(ctx, [sg_id])
+
+                    # a new rule invalidates the rules of the group
+                    rule = self._build_security_group_rule(
+                        sg_id, 'ingress', 'tcp', '22', '22',
+                        remote_group_id=sg_id)
+                    self._make_security_group_rule(self.fmt, rule)
+                    # the port does not match its own address
+                    self.assertEqual(2, len(get_rules(port1['id'])))
+                    self.assertEqual(2, load_rules.call_count)
+                    load_ips.assert_called_once_with(ctx, [sg_id])
+
+                    # a new member invalidates the members of the group
+                    res = self._create_port(self.fmt, n['network']['id'],
+                                            security_groups=[sg_id])
+                    port2 = self.deserialize(self.fmt, res)['port']
+                    rules = get_rules(port1['id'])
+                    self.assertIn(
+                        '%s/32' % port2['fixed_ips'][0]['ip_address'],
+                        [r.get('source_ip_prefix') for r in rules])
+                    self.assertEqual(2, load_ips.call_count)
+                    get_rules(port1['id'])
+                    self.assertEqual(2, load_ips.call_count)
+                    self._delete('ports', port1['id'])
+                    self._delete('ports', port2['id'])
+
 
 class TestOpenvswitchSecurityGroupsXML(TestOpenvswitchSecurityGroups):
     fmt = 'xml'
@@ -136,7 +136,7 @@ class TestOVSQuantumOFPRyuAgent(RyuAgentTestCase):
 
         get_vif.assert_called_once_with(1)
         self.sg_agent.assert_calls([
-            mock.call().refresh_firewall()
+            mock.call().refresh_firewall([1])
         ])
 
     def test_port_update_not_vifport(self, **kwargs):
@@ -15,10 +15,18 @@
 #    under the License.
 # @author: Dan Wendlandt, Nicira, Inc.
 
+import os
+import signal
+import threading
+
 import fixtures
 import mock
+from oslo.config import cfg
 
+from quantum.agent.common import config
 from quantum.agent.linux import utils
+from quantum.rootwrap import daemon
+from quantum.rootwrap import filters
 from quantum.tests import base
 
 
@@ -63,6 +71,105 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
         self.assertEqual(result, "%s\n" % self.test_file)
 
 
+class AgentUtilsRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsRootwrapDaemonTest, self).setUp()
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.test_file = os.path.join(temp_dir, "test_execute.tmp")
+        open(self.test_file, 'w').close()
+
+        server = daemon.RootwrapServer(
+            os.path.join(temp_dir, daemon.SOCKET_NAME),
+            [filters.CommandFilter("/bin/ls", "root"),
+             filters.CommandFilter("/bin/cat", "root")])
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.shutdown)
+
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon', 'fake-daemon', 'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        self.client = utils._get_rootwrap_daemon_client()
+        self.addCleanup(utils._rootwrap_daemon_clients.clear)
+        # Pretend the daemon was spawned and reported its socket.
+        self.client._process = mock.Mock()
+        self.client._process.poll.return_value = None
+        self.client._socket_path = server.server_address
+
+    def test_execute(self):
+        result = utils.execute(["ls", self.test_file], root_helper="sudo")
+        self.assertEqual(result, "%s\n" % self.test_file)
+
+    def test_execute_process_input(self):
+        result = utils.execute(["cat"], root_helper="sudo",
+                               process_input="foo\n")
+        self.assertEqual(result, "foo\n")
+
+    def test_execute_check_exit_code(self):
+        stdout, stderr = utils.execute(["ls", self.test_file[:-1]],
+                                       root_helper="sudo",
+                                       check_exit_code=False,
+                                       return_stderr=True)
+        self.assertEqual(stdout, "")
+        self.assertTrue(stderr)
+        self.assertRaises(RuntimeError, utils.execute,
+                          ["ls", self.test_file[:-1]], root_helper="sudo")
+
+    def test_execute_unauthorized(self):
+        self.assertRaises(RuntimeError, utils.execute,
+                          ["rm", self.test_file], root_helper="sudo")
+        self.assertTrue(os.path.exists(self.test_file))
+
+    def test_execute_addl_env(self):
+        self.assertRaises(ValueError, utils.execute,
+                          ["ls", self.test_file], root_helper="sudo",
+                          addl_env={'foo': 'bar'})
+
+    def test_execute_restores_sigpipe(self):
+        status = utils.execute(["cat", "/proc/self/status"],
+                               root_helper="sudo")
+        sig_ign = [int(line.split()[1], 16) for line in status.splitlines()
+                   if line.startswith("SigIgn:")][0]
+        self.assertFalse(sig_ign & 1 << (signal.SIGPIPE - 1))
+
+    def test_execute_without_root_helper_forks(self):
+        with mock.patch.object(self.client, 'execute') as client_execute:
+            utils.execute(["ls", self.test_file])
+        self.assertFalse(client_execute.called)
+
+    def test_execute_batch(self):
+        result = utils.execute_batch([["ls", self.test_file], ["cat"]],
+                                     root_helper="sudo")
+        self.assertEqual(["%s\n" % self.test_file, ""], result)
+
+    def test_execute_batch_stops_on_error(self):
+        with mock.patch.object(daemon, 'run_command',
+                               wraps=daemon.run_command) as run_command:
+            self.assertRaises(RuntimeError, utils.execute_batch,
+                              [["ls", self.test_file[:-1]],
+                               ["ls", self.test_file]],
+                              root_helper="sudo")
+        self.assertEqual(1, run_command.call_count)
+
+    def test_execute_batch_no_check_exit_code(self):
+        result = utils.execute_batch([["ls", self.test_file[:-1]],
+                                      ["ls", self.test_file]],
+                                     root_helper="sudo",
+                                     check_exit_code=False)
+        self.assertEqual(["", "%s\n" % self.test_file], result)
+
+    def test_daemon_respawned(self):
+        self.client._process.poll.return_value = 1
+        process = mock.Mock()
+        process.stdout.readline.return_value = self.client._socket_path
+        with mock.patch.object(utils.utils, 'subprocess_popen',
+                               return_value=process) as popen:
+            utils.execute(["ls", self.test_file], root_helper="sudo")
+        popen.assert_called_once_with(['fake-daemon'], stdin=mock.ANY,
+                                      stdout=mock.ANY)
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
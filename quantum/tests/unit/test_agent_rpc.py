@@ -45,6 +45,37 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_update_devices_down(self):
+        self._test_rpc_call('update_devices_down')
+
+    def _test_bulk_fallback(self, method, fallback_method):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+
+        def fake_call(context, topic, msg, timeout=None):
+            if msg['method'] == method:
+                raise AttributeError("No such RPC function '%s'" % method)
+            return msg['args']['device']
+
+        with mock.patch('quantum.openstack.common.rpc.call',
+                        side_effect=fake_call) as rpc_call:
+            actual_val = getattr(agent, method)(ctxt, ['dev1', 'dev2'],
+                                                'fake_agent_id')
+        self.assertEqual(['dev1', 'dev2'], actual_val)
+        self.assertEqual(3, rpc_call.call_count)
+        self.assertEqual(fallback_method,
+                         rpc_call.call_args[0][2]['method'])
+
+    def test_get_devices_details_list_fallback(self):
+        self._test_bulk_fallback('get_devices_details_list',
+                                 'get_device_details')
+
+    def test_update_devices_down_fallback(self):
+        self._test_bulk_fallback('update_devices_down', 'update_device_down')
+
 
 class AgentPluginReportState(base.BaseTestCase):
     def test_plugin_report_state(self):
@@ -35,6 +35,7 @@ from quantum import context
 from quantum.manager import QuantumManager
 from quantum.openstack.common.notifier import api as notifer_api
 from quantum.openstack.common import uuidutils
+from quantum import policy
 from quantum.tests import base
 from quantum.tests.unit import testlib_api
 
@@ -563,6 +564,42 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         tenant_id = _uuid()
         self._test_list(tenant_id + "bad", tenant_id)
 
+    def test_list_pushes_down_owner_filter(self):
+        tenant_id = _uuid()
+        env = {'quantum.context': context.Context('', tenant_id)}
+        port = {'id': _uuid(), 'tenant_id': tenant_id, 'name': 'port1'}
+        instance = self.plugin.return_value
+        instance.get_ports.return_value = [port]
+
+        with mock.patch.object(policy, 'check') as check:
+            res = self.api.get(_get_path('ports', fmt=self.fmt),
+                               {'tenant_id': [tenant_id, 'other']},
+                               extra_environ=env)
+            self.assertFalse(check.called)
+        res = self.deserialize(res)
+        self.assertEqual([port['id']], [p['id'] for p in res['ports']])
+        instance.get_ports.assert_called_once_with(
+            mock.ANY, filters={'tenant_id': [tenant_id]}, fields=mock.ANY,
+            sorts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
+            page_reverse=mock.ANY)
+
+    def test_list_admin_skips_policy_checks(self):
+        env = {'quantum.context': context.Context('', _uuid(),
+                                                  roles=['admin'])}
+        networks = [{'id': _uuid(), 'tenant_id': _uuid(), 'shared': False}
+                    for i in range(3)]
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = networks
+
+        with mock.patch.object(policy, 'check') as check:
+            res = self.api.get(_get_path('networks', fmt=self.fmt),
+                               extra_environ=env)
+            self.assertFalse(check.called)
+        self.assertEqual(3, len(self.deserialize(res)['networks']))
+        instance.get_networks.assert_called_once_with(
+            mock.ANY, filters={}, fields=mock.ANY, sorts=mock.ANY,
+            limit=mock.ANY, marker=mock.ANY, page_reverse=mock.ANY)
+
     def test_list_pagination(self):
         id1 = str(_uuid())
         id2 = str(_uuid())
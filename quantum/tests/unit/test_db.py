@@ -18,6 +18,7 @@
 import fixtures
 import mock
 from oslo.config import cfg
+from sqlalchemy.exc import DisconnectionError
 
 import quantum.db.api as db
 from quantum.tests import base
@@ -45,3 +46,27 @@ class DBTestCase(base.BaseTestCase):
                 self.assertEqual(mock_log.call_count, 1)
                 args = mock_log.call_args
                 self.assertNotEqual(args.find('sql_connection'), -1)
+
+
+class ForkSafetyListenerTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(ForkSafetyListenerTestCase, self).setUp()
+        self.listener = db.ForkSafetyListener()
+        self.con_record = mock.Mock()
+        self.con_record.info = {}
+        self.con_proxy = mock.Mock()
+        with mock.patch.object(db.os, 'getpid', return_value=100):
+            self.listener.connect(mock.Mock(), self.con_record)
+
+    def test_checkout_same_process(self):
+        with mock.patch.object(db.os, 'getpid', return_value=100):
+            self.listener.checkout(mock.Mock(), self.con_record,
+                                   self.con_proxy)
+        self.assertIsNotNone(self.con_record.connection)
+
+    def test_checkout_forked_process(self):
+        with mock.patch.object(db.os, 'getpid', return_value=101):
+            self.assertRaises(DisconnectionError, self.listener.checkout,
+                              mock.Mock(), self.con_record, self.con_proxy)
+        self.assertIsNone(self.con_record.connection)
+        self.assertIsNone(self.con_proxy.connection)
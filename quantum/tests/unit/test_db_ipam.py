@@ -0,0 +1,159 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+import netaddr
+from oslo.config import cfg
+
+from quantum import context
+from quantum.db import ipam
+from quantum.db import models_v2
+from quantum.manager import QuantumManager
+from quantum.tests import base
+from quantum.tests.unit import test_db_plugin
+
+
+class TestMergeRanges(base.BaseTestCase):
+
+    def test_merge_ranges(self):
+        self.assertEqual([(1, 5), (7, 7), (9, 12)],
+                         ipam._merge_ranges([(9, 9), (3, 3), (1, 2), (4, 5),
+                                             (7, 7), (10, 12), (11, 11)]))
+
+    def test_merge_no_ranges(self):
+        self.assertEqual([], ipam._merge_ranges([]))
+
+
+class TestSubnetAvailability(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSubnetAvailability, self).setUp()
+        self.availability = ipam.SubnetAvailability(
+            [('10.0.0.2', '10.0.0.4'), ('10.0.0.10', '10.0.0.11')],
+            ['10.0.0.3', '10.0.0.10', '10.0.1.1'])
+
+    def test_allocated_outside_pools_ignored(self):
+        self.assertEqual(5, self.availability.size)
+        self.assertEqual(2, len(self.availability.allocated))
+
+    def test_get_random_free(self):
+        free = set()
+        for i in range(50):
+            free.add(self.availability.get_random_free(4))
+        self.assertEqual(set(['10.0.0.2', '10.0.0.4', '10.0.0.11']), free)
+
+    def test_get_random_free_walks_dense_pools(self):
+        self.availability.add('10.0.0.2')
+        self.availability.add('10.0.0.4')
+        with mock.patch.object(ipam.SubnetAvailability, 'RANDOM_PROBES', 0):
+            self.assertEqual('10.0.0.11',
+                             self.availability.get_random_free(4))
+
+    def test_get_random_free_walks_ipv6_pools(self):
+        availability = ipam.SubnetAvailability(
+            [('fe80::2', 'fe80::ffff:ffff:ffff:fffe')], ['fe80::2'])
+        with contextlib.nested(
+            mock.patch.object(ipam.SubnetAvailability, 'RANDOM_PROBES', 0),
+            mock.patch.object(ipam.random, 'randrange', return_value=0)
+        ):
+            self.assertEqual('fe80::3', availability.get_random_free(6))
+
+    def test_get_random_free_full(self):
+        for ip_address in ('10.0.0.2', '10.0.0.4', '10.0.0.11'):
+            self.availability.add(ip_address)
+        self.assertIsNone(self.availability.get_random_free(4))
+        self.availability.remove('10.0.0.4')
+        self.assertEqual('10.0.0.4', self.availability.get_random_free(4))
+
+
+class TestRandomIpamBackend(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestRandomIpamBackend, self).setUp()
+        cfg.CONF.set_override('ipam_driver',
+                              'quantum.db.ipam.RandomIpamBackend')
+        self.addCleanup(ipam._backends.clear)
+
+    def _port_ip(self, port):
+        return port['port']['fixed_ips'][0]['ip_address']
+
+    def test_allocate_whole_pool(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with contextlib.nested(*[self.port(subnet=subnet)
+                                     for i in range(5)]) as ports:
+                self.assertEqual(
+                    set(['10.0.0.%s' % i for i in range(2, 7)]),
+                    set(self._port_ip(port) for port in ports))
+                res = self._create_port(self.fmt,
+                                        subnet['subnet']['network_id'])
+                self.assertEqual(409, res.status_int)
+
+    def test_allocate_retries_on_conflict(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet,
+                           fixed_ips=[{'ip_address': '10.0.0.4'}]):
+                backend = ipam.get_backend()
+                # The address was allocated by another server.
+                availability = backend._load_subnet(
+                    context.get_admin_context(), subnet['subnet']['id'])
+                availability.remove('10.0.0.4')
+                with mock.patch.object(ipam.SubnetAvailability,
+                                       'get_random_free',
+                                       side_effect=['10.0.0.4', '10.0.0.5']):
+                    with self.port(subnet=subnet) as port:
+                        self.assertEqual('10.0.0.5', self._port_ip(port))
+
+    def test_allocate_reloads_stale_subnet(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet) as port:
+                subnet_id = subnet['subnet']['id']
+                ip_address = self._port_ip(port)
+                backend = ipam.get_backend()
+                # Pretend the pool is full, as seen by a server which missed
+                # the release of the addresses.
+                for i in range(2, 7):
+                    backend._subnets[subnet_id].add('10.0.0.%s' % i)
+                with self.port(subnet=subnet) as port2:
+                    self.assertNotEqual(ip_address, self._port_ip(port2))
+                self.assertIn(int(netaddr.IPAddress(ip_address)),
+                              backend._subnets[subnet_id].allocated)
+
+    def test_recycle_ip(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet) as port:
+                plugin = QuantumManager.get_plugin()
+                ctx = context.get_admin_context()
+                subnet_id = subnet['subnet']['id']
+                ip_address = self._port_ip(port)
+                backend = ipam.get_backend()
+                with ctx.session.begin(subtransactions=True):
+                    plugin._recycle_ip(ctx, subnet['subnet']['network_id'],
+                                       subnet_id, ip_address)
+                self.assertEqual(set(),
+                                 backend._subnets[subnet_id].allocated)
+                qry = ctx.session.query(models_v2.IPAllocation)
+                self.assertEqual(0, qry.filter_by(
+                    subnet_id=subnet_id).count())
+
+    def test_no_availability_ranges(self):
+        with self.subnet() as subnet:
+            ctx = context.get_admin_context()
+            qry = ctx.session.query(models_v2.IPAvailabilityRange)
+            self.assertEqual(0, qry.join(models_v2.IPAllocationPool).filter_by(
+                subnet_id=subnet['subnet']['id']).count())
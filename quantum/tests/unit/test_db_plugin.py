@@ -23,6 +23,7 @@ import random
 
 import mock
 from oslo.config import cfg
+import sqlalchemy
 import testtools
 from testtools import matchers
 import webob.exc
@@ -1752,6 +1753,61 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     self.assertEqual(update_context._recycled_networks,
                                      set([subnet['subnet']['network_id']]))
 
+    def _hold_expired_ips(self, subnet, ports):
+        for port in ports:
+            self._delete('ports', port['port']['id'])
+        expired = timeutils.utcnow() + datetime.timedelta(seconds=300)
+        return mock.patch.object(timeutils, 'utcnow', return_value=expired)
+
+    def _availability_ranges(self, ctx, subnet_id):
+        qry = ctx.session.query(models_v2.IPAvailabilityRange).join(
+            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id)
+        return sorted((r['first_ip'], r['last_ip']) for r in qry)
+
+    def test_recycle_expired_ips_merges_ranges(self):
+        cfg.CONF.set_override('dhcp_lease_duration', 120)
+        plugin = QuantumManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet_id = subnet['subnet']['id']
+            ports = [self._make_port(self.fmt, subnet['subnet']['network_id'])
+                     for i in range(4)]
+            with self._hold_expired_ips(subnet, [ports[0], ports[1],
+                                                 ports[3]]):
+                self.assertEqual([('10.0.0.6', '10.0.0.6')],
+                                 self._availability_ranges(ctx, subnet_id))
+                with mock.patch.object(plugin, '_recycle_ip') as recycle_ip:
+                    with ctx.session.begin(subtransactions=True):
+                        plugin._recycle_expired_ip_allocations(
+                            ctx, subnet['subnet']['network_id'])
+                    self.assertFalse(recycle_ip.called)
+            self.assertEqual([('10.0.0.2', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.6')],
+                             self._availability_ranges(ctx, subnet_id))
+            qry = ctx.session.query(models_v2.IPAllocation)
+            self.assertEqual(['10.0.0.4'], [allocation['ip_address'] for
+                                            allocation in qry])
+            self._delete('ports', ports[2]['port']['id'])
+
+    def test_recycle_expired_ips_in_background(self):
+        cfg.CONF.set_override('dhcp_lease_duration', 120)
+        cfg.CONF.set_override('ip_recycle_interval', 10)
+        plugin = QuantumManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            port = self._make_port(self.fmt, subnet['subnet']['network_id'])
+            with self._hold_expired_ips(subnet, [port]):
+                with ctx.session.begin(subtransactions=True):
+                    plugin._recycle_expired_ip_allocations(
+                        ctx, subnet['subnet']['network_id'])
+                qry = ctx.session.query(models_v2.IPAllocation)
+                self.assertEqual(1, qry.count())
+                plugin.recycle_expired_ip_allocations(ctx)
+                self.assertEqual(0, qry.count())
+            self.assertEqual([('10.0.0.2', '10.0.0.6')],
+                             self._availability_ranges(
+                                 ctx, subnet['subnet']['id']))
+
     def test_max_fixed_ips_exceeded(self):
         with self.subnet(gateway_ip='10.0.0.3',
                          cidr='10.0.0.0/24') as subnet:
@@ -3425,6 +3481,104 @@ class TestSubnetsV2(QuantumDbPluginV2TestCase):
         self.assertEqual(res.status_int, 204)
 
 
+class TestCollectionFieldsV2(QuantumDbPluginV2TestCase):
+    """Lists of the base plugin only load the requested columns."""
+
+    def test_list_ports_with_column_fields(self):
+        plugin = QuantumManager.get_plugin()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as ports:
+                with mock.patch.object(plugin,
+                                       '_make_port_dict') as make_dict:
+                    res = self._list(
+                        'ports', query_params='fields=id&fields=mac_address')
+                    self.assertFalse(make_dict.called)
+                self.assertEqual(
+                    sorted((p['port']['id'], p['port']['mac_address'])
+                           for p in ports),
+                    sorted((p['id'], p['mac_address']) for p in res['ports']))
+                self.assertEqual(set(['id', 'mac_address']),
+                                 set(res['ports'][0]))
+
+    def test_list_networks_with_column_fields(self):
+        plugin = QuantumManager.get_plugin()
+        with self.network(name='net1') as network:
+            with mock.patch.object(plugin,
+                                   '_make_network_dict') as make_dict:
+                res = self._list('networks',
+                                 query_params='fields=id&fields=name')
+                self.assertFalse(make_dict.called)
+            self.assertEqual([{'id': network['network']['id'],
+                               'name': 'net1'}], res['networks'])
+
+    def test_list_ports_with_relationship_fields(self):
+        with self.port() as port:
+            res = self._list('ports',
+                             query_params='fields=id&fields=fixed_ips')
+            self.assertEqual([{'id': port['port']['id'],
+                               'fixed_ips': port['port']['fixed_ips']}],
+                             res['ports'])
+
+
+class TestCollectionQueriesV2(QuantumDbPluginV2TestCase):
+    """Lists of the base plugin do not issue one query per object."""
+
+    def setUp(self):
+        super(TestCollectionQueriesV2, self).setUp()
+        self.statements = []
+        # The engine, along with the listener, is disposed of by clear_db.
+        sqlalchemy.event.listen(db._ENGINE, 'before_cursor_execute',
+                                self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def _count_list_queries(self, collection):
+        del self.statements[:]
+        self._list(collection)
+        return len(self.statements)
+
+    def test_list_ports_query_count(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet):
+                count = self._count_list_queries('ports')
+                with contextlib.nested(*[self.port(subnet=subnet)
+                                         for i in range(4)]):
+                    self.assertEqual(count, self._count_list_queries('ports'))
+
+    def test_list_networks_query_count(self):
+        with self.subnet():
+            count = self._count_list_queries('networks')
+            with contextlib.nested(self.subnet(cidr='10.0.1.0/24'),
+                                   self.subnet(cidr='10.0.2.0/24')):
+                self.assertEqual(count,
+                                 self._count_list_queries('networks'))
+
+
+class TestModelQueryOptions(base.BaseTestCase):
+
+    def test_options_of_all_plugin_classes_apply(self):
+        class FakeMixin(object):
+            _model_query_options = {models_v2.Network: ['mixin']}
+
+        class FakePlugin(db_base_plugin_v2.QuantumDbPluginV2, FakeMixin):
+            pass
+
+        FakePlugin.register_model_query_options(models_v2.Network,
+                                                ['plugin'])
+        plugin = FakePlugin.__new__(FakePlugin)
+        base_plugin = db_base_plugin_v2.QuantumDbPluginV2.__new__(
+            db_base_plugin_v2.QuantumDbPluginV2)
+        options = plugin._get_model_query_options(models_v2.Network)
+        base_options = base_plugin._get_model_query_options(
+            models_v2.Network)
+        self.assertEqual(set(base_options + ['mixin', 'plugin']),
+                         set(options))
+        self.assertNotIn('mixin', base_options)
+        self.assertNotIn('plugin', base_options)
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -64,6 +64,52 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
 
+    def test_get_networks_info(self):
+        # the plugin returns new dicts on each call
+        self.plugin.get_networks.side_effect = lambda *args, **kwargs: [
+            dict(id='a'), dict(id='b')]
+        self.plugin.get_subnets.side_effect = lambda *args, **kwargs: [
+            dict(id='s2', network_id='a'), dict(id='s1', network_id='a')]
+        self.plugin.get_ports.side_effect = lambda *args, **kwargs: [
+            dict(id='p1', network_id='b')]
+
+        retval = self.callbacks.get_networks_info(mock.Mock(),
+                                                  network_ids=['a', 'b'])
+
+        networks = dict((network['id'], network) for network in retval)
+        self.assertEqual(['s1', 's2'],
+                         [subnet['id'] for subnet in networks['a']['subnets']])
+        self.assertEqual([], networks['a']['ports'])
+        self.assertEqual([], networks['b']['subnets'])
+        self.assertEqual(['p1'],
+                         [port['id'] for port in networks['b']['ports']])
+        self.assertNotEqual(networks['a']['revision'],
+                            networks['b']['revision'])
+        self.plugin.assert_has_calls(
+            [mock.call.get_networks(mock.ANY,
+                                    filters=dict(id=['a', 'b'])),
+             mock.call.get_subnets(mock.ANY,
+                                   filters=dict(network_id=['a', 'b'])),
+             mock.call.get_ports(mock.ANY,
+                                 filters=dict(network_id=['a', 'b']))])
+        return networks
+
+    def test_get_networks_info_unchanged(self):
+        networks = self.test_get_networks_info()
+        revisions = {'a': networks['a']['revision'], 'b': 'old'}
+
+        retval = self.callbacks.get_networks_info(mock.Mock(),
+                                                  network_ids=['a', 'b'],
+                                                  revisions=revisions)
+
+        self.assertEqual(['b'], [network['id'] for network in retval])
+        self.assertEqual(networks['b']['revision'], retval[0]['revision'])
+
+    def test_get_networks_info_no_networks(self):
+        self.assertEqual([], self.callbacks.get_networks_info(
+            mock.Mock(), network_ids=[]))
+        self.assertFalse(self.plugin.get_networks.called)
+
     def _test_get_dhcp_port_helper(self, port_retval, other_expectations=[],
                                    update_port=None, create_port=None):
         subnets_retval = [dict(id='a', enable_dhcp=True),
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 import sys
@@ -261,27 +262,38 @@ class TestDhcpAgent(base.BaseTestCase):
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
             mock_plugin.get_active_networks.return_value = active_networks
+            networks = [FakeModel(net_id) for net_id in active_networks]
+            mock_plugin.get_networks_info.return_value = networks
             plug.return_value = mock_plugin
 
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
 
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['refresh_dhcp_helper', 'disable_dhcp_helper', 'cache']])
+                 ['configure_dhcp_for_network', 'disable_dhcp_helper',
+                  'cache']])
 
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
                 mocks['cache'].get_network_ids.return_value = known_networks
+                mocks['cache'].get_network_by_id.side_effect = (
+                    lambda net_id: FakeModel(net_id, revision='rev'))
                 dhcp.sync_state()
 
-                exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
+                exp_configure = [mock.call(network) for network in networks]
 
                 diff = set(known_networks) - set(active_networks)
                 exp_disable = [mock.call(net_id) for net_id in diff]
 
+                exp_revisions = dict(
+                    (net_id, 'rev') for net_id in
+                    set(known_networks) & set(active_networks))
+
                 mocks['cache'].assert_has_calls([mock.call.get_network_ids()])
-                mocks['refresh_dhcp_helper'].assert_has_called(exp_refresh)
-                mocks['disable_dhcp_helper'].assert_has_called(exp_disable)
+                mock_plugin.get_networks_info.assert_called_once_with(
+                    active_networks, exp_revisions)
+                mocks['configure_dhcp_for_network'].assert_has_calls(
+                    exp_configure)
+                mocks['disable_dhcp_helper'].assert_has_calls(exp_disable)
 
     def test_sync_state_initial(self):
         self._test_sync_state_helper([], ['a'])
@@ -292,6 +304,75 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_disabled_net(self):
         self._test_sync_state_helper(['b'], ['a'])
 
+    def test_sync_state_without_bulk_network_info(self):
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks.return_value = ['a']
+            mock_plugin.get_networks_info.side_effect = AttributeError
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp, 'refresh_dhcp_helper') as refresh:
+                dhcp.sync_state()
+            refresh.assert_called_once_with('a')
+            self.assertFalse(dhcp.needs_resync)
+
+    def test_sync_state_retries_failed_reload(self):
+        old_network = FakeModel('a', subnets=[fake_subnet1], ports=[],
+                                revision='rev1')
+        network = FakeModel('a', subnets=[fake_subnet1], ports=[],
+                            revision='rev2')
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks.return_value = ['a']
+            mock_plugin.get_networks_info.return_value = [network]
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            dhcp.cache.put(old_network)
+            self.driver.return_value.reload_allocations.side_effect = [
+                RuntimeError, None]
+            with mock.patch.object(dhcp_agent.LOG, 'exception'):
+                dhcp.sync_state()
+            self.assertTrue(dhcp.needs_resync)
+            self.assertEqual('rev1',
+                             dhcp.cache.get_network_by_id('a').revision)
+
+            dhcp.sync_state()
+            mock_plugin.get_networks_info.assert_called_with(
+                ['a'], {'a': 'rev1'})
+            self.assertEqual(
+                2, self.driver.return_value.reload_allocations.call_count)
+            self.assertEqual('rev2',
+                             dhcp.cache.get_network_by_id('a').revision)
+
+    def test_configure_dhcp_for_network(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        network = FakeModel('a')
+        with contextlib.nested(
+            mock.patch.object(dhcp, 'cache'),
+            mock.patch.object(dhcp, '_enable_dhcp'),
+            mock.patch.object(dhcp, '_refresh_dhcp')
+        ) as (cache, enable, refresh):
+            cache.get_network_by_id.return_value = None
+            dhcp.configure_dhcp_for_network(network)
+            enable.assert_called_once_with(network)
+            cache.get_network_by_id.return_value = old_network = (
+                FakeModel('a'))
+            dhcp.configure_dhcp_for_network(network)
+            refresh.assert_called_once_with(old_network, network)
+
+    def test_configure_dhcp_for_network_error(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        with contextlib.nested(
+            mock.patch.object(dhcp, '_enable_dhcp',
+                              side_effect=RuntimeError),
+            mock.patch.object(dhcp_agent.LOG, 'exception')
+        ) as (enable, log):
+            dhcp.configure_dhcp_for_network(FakeModel('a'))
+        self.assertTrue(log.called)
+        self.assertTrue(dhcp.needs_resync)
+
     def test_sync_state_plugin_error(self):
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
@@ -692,26 +773,65 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
     def test_port_update_end(self):
         payload = dict(port=vars(fake_port2))
         self.cache.get_network_by_id.return_value = fake_network
-        self.dhcp.port_update_end(None, payload)
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
+        spawn_after.assert_called_once_with(
+            1, self.dhcp._reload_allocations, fake_network.id)
+        self.assertFalse(self.call_driver.called)
+
+    def test_port_update_end_coalesced(self):
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_update_end(None, payload)
+        self.assertEqual(2, self.cache.put_port.call_count)
+        self.assertEqual(1, spawn_after.call_count)
+        self.assertEqual(set([fake_network.id]), self.dhcp.pending_reloads)
+
+    def test_port_update_end_no_reload_interval(self):
+        cfg.CONF.set_override('reload_allocations_interval', 0)
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.port_update_end(None, payload)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_reload_allocations(self):
+        self.dhcp.pending_reloads.add(fake_network.id)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp._reload_allocations(fake_network.id)
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
+        self.assertEqual(set(), self.dhcp.pending_reloads)
+
+    def test_reload_allocations_deleted_network(self):
+        self.dhcp.pending_reloads.add(fake_network.id)
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._reload_allocations(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(set(), self.dhcp.pending_reloads)
 
     def test_port_delete_end(self):
         payload = dict(port_id=fake_port2.id)
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
 
-        self.dhcp.port_delete_end(None, payload)
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_delete_end(None, payload)
 
         self.cache.assert_has_calls(
             [mock.call.get_port_by_id(fake_port2.id),
              mock.call.get_network_by_id(fake_network.id),
              mock.call.remove_port(fake_port2)])
-        self.call_driver.assert_called_once_with('reload_allocations',
-                                                 fake_network)
+        spawn_after.assert_called_once_with(
+            1, self.dhcp._reload_allocations, fake_network.id)
 
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
@@ -754,6 +874,16 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                                               network_id='netid',
                                               host='foo')
 
+    def test_get_networks_info(self):
+        self.call.return_value = [dict(a=1)]
+        retval = self.proxy.get_networks_info(['netid'], {'netid': 'rev'})
+        self.assertEqual(retval[0].a, 1)
+        self.assertTrue(self.call.called)
+        self.make_msg.assert_called_once_with('get_networks_info',
+                                              network_ids=['netid'],
+                                              revisions={'netid': 'rev'},
+                                              host='foo')
+
     def test_get_dhcp_port(self):
         self.call.return_value = dict(a=1)
         retval = self.proxy.get_dhcp_port('netid', 'devid')
@@ -0,0 +1,100 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from quantum.agent.linux import ipset_manager
+from quantum.tests import base
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+
+    def _assert_restored(self, lines):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join(lines) + '\n',
+            root_helper='sudo')
+        self.execute.reset_mock()
+
+    def test_get_set_name(self):
+        name = ipset_manager.get_set_name('IPv6', '0123456789' * 4)
+        self.assertTrue(name.startswith('qsg-IPv6-'))
+        self.assertEqual(ipset_manager.IPSET_NAME_MAX_LENGTH, len(name))
+        # groups whose ids share a long prefix get distinct sets
+        self.assertNotEqual(
+            name, ipset_manager.get_set_name('IPv6', '0123456789' * 3))
+        self.assertNotEqual(
+            name, ipset_manager.get_set_name('IPv4', '0123456789' * 4))
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members(
+            {'IPv4fake_sgid': ('IPv4', ['10.0.0.2', '10.0.0.1'])})
+        self._assert_restored(['create IPv4fake_sgid hash:ip family inet',
+                               'flush IPv4fake_sgid',
+                               'add IPv4fake_sgid 10.0.0.1',
+                               'add IPv4fake_sgid 10.0.0.2'])
+        self.assertEqual({'IPv4fake_sgid': set(['10.0.0.1', '10.0.0.2'])},
+                         self.ipset.sets)
+
+    def test_set_members_sends_differences(self):
+        self.ipset.set_members(
+            {'IPv6fake_sgid': ('IPv6', ['fe80::1', 'fe80::2'])})
+        self.execute.reset_mock()
+        self.ipset.set_members(
+            {'IPv6fake_sgid': ('IPv6', ['fe80::2', 'fe80::3'])})
+        self._assert_restored(['add IPv6fake_sgid fe80::3',
+                               'del IPv6fake_sgid fe80::1'])
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members({'IPv4fake_sgid': ('IPv4', ['10.0.0.1'])})
+        self.execute.reset_mock()
+        self.ipset.set_members({'IPv4fake_sgid': ('IPv4', ['10.0.0.1'])})
+        self.ipset.set_members({})
+        self.assertFalse(self.execute.called)
+
+    def test_destroy_sets(self):
+        self.ipset.set_members({'IPv4fake_sgid': ('IPv4', [])})
+        self.execute.reset_mock()
+        self.ipset.destroy_sets(['IPv4fake_sgid', 'IPv4unknown'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', 'IPv4fake_sgid'], root_helper='sudo')
+        self.assertEqual({}, self.ipset.sets)
+
+    def test_destroy_stale_sets(self):
+        self.ipset.set_members({'qsg-IPv4-current': ('IPv4', [])})
+        self.execute.reset_mock()
+        self.execute.return_value = ('qsg-IPv4-current\nqsg-IPv6-stale\n'
+                                     'other\n')
+        self.ipset.destroy_stale_sets()
+        self.execute.assert_has_calls([
+            mock.call(['ipset', 'list', '-name'], root_helper='sudo'),
+            mock.call(['ipset', 'destroy', 'qsg-IPv6-stale'],
+                      root_helper='sudo')])
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual({'qsg-IPv4-current': set()}, self.ipset.sets)
+
+    def test_destroy_sets_failure(self):
+        self.ipset.set_members({'IPv4fake_sgid': ('IPv4', [])})
+        self.execute.side_effect = RuntimeError()
+        self.ipset.destroy_sets(['IPv4fake_sgid'])
+        self.assertEqual({}, self.ipset.sets)
@@ -20,6 +20,7 @@ from mock import call
 from oslo.config import cfg
 
 from quantum.agent.common import config as a_cfg
+from quantum.agent.linux import ipset_manager
 from quantum.agent.linux.iptables_firewall import IptablesFirewallDriver
 from quantum.tests import base
 from quantum.tests.unit import test_api_v2
@@ -30,6 +31,7 @@ FAKE_PREFIX = {'IPv4': '10.0.0.0/24',
                'IPv6': 'fe80::0/48'}
 FAKE_IP = {'IPv4': '10.0.0.1',
            'IPv6': 'fe80::1'}
+FAKE_SET = ipset_manager.get_set_name('IPv4', 'fake_sgid')
 
 
 class IptablesFirewallTestCase(base.BaseTestCase):
@@ -914,3 +916,84 @@ class IptablesFirewallTestCase(base.BaseTestCase):
             pass
         self.iptables_inst.assert_has_calls([call.defer_apply_on(),
                                              call.defer_apply_off()])
+
+
+class IptablesFirewallIpsetTestCase(IptablesFirewallTestCase):
+    def setUp(self):
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        self.iptables_inst.iptables_apply_deferred = False
+        self.ipset_execute = mock.Mock()
+        self.firewall.ipset.execute = self.ipset_execute
+        self.firewall._stale_sets_destroyed = True
+
+    def _fake_port_with_remote_group(self):
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'ingress',
+                                         'remote_group_id': 'fake_sgid'}]
+        return port
+
+    def test_prepare_port_filter_with_remote_group(self):
+        self.firewall.update_security_group_members(
+            {'fake_sgid': {'IPv4': ['10.0.0.2'], 'IPv6': []}})
+        # the set is not created before being referenced
+        self.assertFalse(self.ipset_execute.called)
+        self.firewall.prepare_port_filter(self._fake_port_with_remote_group())
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev',
+            '-j RETURN -m set --match-set %s src' % FAKE_SET)
+        self.ipset_execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='create %s hash:ip family inet\n'
+                          'flush %s\n'
+                          'add %s 10.0.0.2\n' % (FAKE_SET, FAKE_SET, FAKE_SET),
+            root_helper=mock.ANY)
+
+    def test_first_apply_destroys_stale_sets(self):
+        self.firewall._stale_sets_destroyed = False
+        self.ipset_execute.return_value = 'qsg-IPv4-stale\n%s\n' % FAKE_SET
+        self.firewall.prepare_port_filter(self._fake_port_with_remote_group())
+        self.ipset_execute.assert_has_calls([
+            call(['ipset', 'list', '-name'], root_helper=mock.ANY),
+            call(['ipset', 'destroy', 'qsg-IPv4-stale'],
+                 root_helper=mock.ANY)])
+        self.ipset_execute.reset_mock()
+        self.firewall.update_port_filter(self._fake_port_with_remote_group())
+        self.assertFalse(self.ipset_execute.called)
+        self.assertEqual([FAKE_SET], self.firewall.ipset.sets.keys())
+
+    def test_update_security_group_members(self):
+        self.firewall.prepare_port_filter(self._fake_port_with_remote_group())
+        self.ipset_execute.reset_mock()
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_security_group_members(
+            {'fake_sgid': {'IPv4': ['10.0.0.2', '10.0.0.3'], 'IPv6': []},
+             'other_sgid': {'IPv4': ['10.0.0.4'], 'IPv6': []}})
+        self.ipset_execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='add %s 10.0.0.2\n'
+                          'add %s 10.0.0.3\n' % (FAKE_SET, FAKE_SET),
+            root_helper=mock.ANY)
+        self.assertFalse(self.v4filter_inst.add_rule.called)
+
+    def test_remove_port_filter_destroys_set(self):
+        port = self._fake_port_with_remote_group()
+        self.firewall.prepare_port_filter(port)
+        self.ipset_execute.reset_mock()
+        self.firewall.remove_port_filter(port)
+        self.ipset_execute.assert_called_once_with(
+            ['ipset', 'destroy', FAKE_SET], root_helper=mock.ANY)
+        self.assertEqual({}, self.firewall.ipset.sets)
+        self.assertEqual({}, self.firewall.sg_members)
+
+    def test_defer_apply_destroys_sets_after_apply(self):
+        port = self._fake_port_with_remote_group()
+        self.firewall.prepare_port_filter(port)
+        self.ipset_execute.reset_mock()
+        self.iptables_inst.iptables_apply_deferred = True
+        with self.firewall.defer_apply():
+            self.firewall.remove_port_filter(port)
+            self.assertFalse(self.ipset_execute.called)
+        self.ipset_execute.assert_called_once_with(
+            ['ipset', 'destroy', FAKE_SET], root_helper=mock.ANY)
@@ -83,19 +83,47 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump,
                               root_helper=self.root_helper).AndReturn(None)
 
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n:%s-filter - [0:0]\n'
+                                             '-X %s-filter\nCOMMIT\n'
+                                             % (bn, bn)),
+                              root_helper=self.root_helper).AndReturn(None)
+
+        self.mox.ReplayAll()
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.apply()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_remove_chain_with_rules(self):
+        bn = iptables_manager.binary_name
         self.iptables.execute(['iptables-save', '-t', 'filter'],
                               root_helper=self.root_helper).AndReturn('')
 
+        nat_dump = (':%s-OUTPUT - [0:0]\n:%s-snat - [0:0]\n:%s-PREROUTING -'
+                    ' [0:0]\n:%s-float-snat - [0:0]\n:%s-POSTROUTING - [0:0]'
+                    '\n:quantum-postrouting-bottom - [0:0]\n-A PREROUTING -j'
+                    ' %s-PREROUTING\n-A OUTPUT -j %s-OUTPUT\n-A POSTROUTING '
+                    '-j %s-POSTROUTING\n-A POSTROUTING -j quantum-postroutin'
+                    'g-bottom\n-A quantum-postrouting-bottom -j %s-snat\n-A '
+                    '%s-snat -j %s-float-snat\n' % (bn, bn, bn, bn, bn, bn,
+                    bn, bn, bn, bn, bn))
+
         self.iptables.execute(['iptables-restore'],
                               process_input=(':%s-FORWARD - [0:0]\n:%s-INPUT'
-                              ' - [0:0]\n:%s-local - [0:0]\n:%s-OUTPUT - [0:'
-                              '0]\n:quantum-filter-top - [0:0]\n-A FORWARD -'
-                              'j quantum-filter-top\n-A OUTPUT -j quantum-fi'
-                              'lter-top\n-A quantum-filter-top -j %s-local\n'
-                              '-A INPUT -j %s-INPUT\n-A OUTPUT -j %s-OUTPUT'
-                              '\n-A FORWARD -j %s-FORWARD\n' % (bn, bn, bn, bn,
-                              bn, bn, bn, bn)), root_helper=self.root_helper
-                              ).AndReturn(None)
+                              ' - [0:0]\n:%s-local - [0:0]\n:%s-filter - [0:'
+                              '0]\n:%s-OUTPUT - [0:0]\n:quantum-filter-top -'
+                              ' [0:0]\n-A FORWARD -j quantum-filter-top\n-A '
+                              'OUTPUT -j quantum-filter-top\n-A quantum-filt'
+                              'er-top -j %s-local\n-A INPUT -j %s-INPUT\n-A '
+                              'OUTPUT -j %s-OUTPUT\n-A FORWARD -j %s-FORWARD'
+                              '\n-A %s-filter -j DROP\n' % (bn, bn, bn, bn,
+                              bn, bn, bn, bn, bn, bn)),
+                              root_helper=self.root_helper).AndReturn(None)
 
         self.iptables.execute(['iptables-save', '-t', 'nat'],
                               root_helper=self.root_helper).AndReturn('')
@@ -104,9 +132,18 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump,
                               root_helper=self.root_helper).AndReturn(None)
 
+        # The rules of the chain are still in the kernel: the chain is
+        # flushed before being deleted
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n:%s-filter - [0:0]\n'
+                                             '-X %s-filter\nCOMMIT\n'
+                                             % (bn, bn)),
+                              root_helper=self.root_helper).AndReturn(None)
+
         self.mox.ReplayAll()
 
         self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
         self.iptables.apply()
 
         self.iptables.ipv4['filter'].remove_chain('filter')
@@ -148,25 +185,11 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'filter'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=(':%s-FORWARD - [0:0]\n:%s-INPUT -'
-                              ' [0:0]\n:%s-local - [0:0]\n:%s-OUTPUT - [0:0]\n'
-                              ':quantum-filter-top - [0:0]\n-A FORWARD -j quan'
-                              'tum-filter-top\n-A OUTPUT -j quantum-filter-top'
-                              '\n-A quantum-filter-top -j %s-local\n-A INPUT -'
-                              'j %s-INPUT\n-A OUTPUT -j %s-OUTPUT\n-A FORWARD '
-                              '-j %s-FORWARD\n' % (bn, bn, bn, bn, bn, bn, bn,
-                              bn)), root_helper=self.root_helper
-                              ).AndReturn(None)
-
-        self.iptables.execute(['iptables-save', '-t', 'nat'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=nat_dump,
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n:%s-INPUT - [0:0]\n'
+                                             ':%s-filter - [0:0]\n'
+                                             '-X %s-filter\nCOMMIT\n' %
+                                             (bn, bn, bn)),
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -226,28 +249,13 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               bn, bn, bn, bn, bn, bn, bn, bn, bn, bn, bn)),
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'filter'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=filter_dump,
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*nat\n:%s-PREROUTING - [0:0]\n'
+                                             ':%s-nat - [0:0]\n'
+                                             '-X %s-nat\nCOMMIT\n' %
+                                             (bn, bn, bn)),
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'nat'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=(':%s-float-snat - [0:0]\n:%s-POST'
-                              'ROUTING - [0:0]\n:%s-PREROUTING - [0:0]\n:%s-OU'
-                              'TPUT - [0:0]\n:%s-snat - [0:0]\n:quantum-postro'
-                              'uting-bottom - [0:0]\n-A PREROUTING -j %s-PRERO'
-                              'UTING\n-A OUTPUT -j %s-OUTPUT\n-A POSTROUTING -'
-                              'j %s-POSTROUTING\n-A POSTROUTING -j quantum-pos'
-                              'trouting-bottom\n-A quantum-postrouting-bottom '
-                              '-j %s-snat\n-A %s-snat -j %s-float-snat\n' % (
-                              bn, bn, bn, bn, bn, bn, bn, bn, bn, bn, bn)
-                              ), root_helper=self.root_helper).AndReturn(None)
-
         self.mox.ReplayAll()
         self.iptables.ipv4['nat'].add_chain('nat')
         self.iptables.ipv4['nat'].add_rule('PREROUTING',
@@ -270,6 +278,100 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.iptables.apply()
         self.mox.VerifyAll()
 
+    def _replay_full_apply(self, filter_dump=None, nat_dump=None):
+        self.iptables.execute(['iptables-save', '-t', 'filter'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=filter_dump or mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.iptables.execute(['iptables-save', '-t', 'nat'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=nat_dump or mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+
+    def test_apply_unchanged_tables_is_noop(self):
+        self._replay_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_only_sends_changed_chains(self):
+        bn = iptables_manager.binary_name
+        self._replay_full_apply()
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n:%s-filter - [0:0]\n'
+                                             '-A %s-filter -j DROP\nCOMMIT\n'
+                                             % (bn, bn)),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.ipv4['filter'].add_chain('accept')
+        self.iptables.ipv4['filter'].add_rule('accept', '-j ACCEPT')
+        self.iptables.apply()
+
+        # Rebuilding a chain with the same rules doesn't touch iptables.
+        self.iptables.ipv4['filter'].remove_chain('accept')
+        self.iptables.ipv4['filter'].add_chain('accept')
+        self.iptables.ipv4['filter'].add_rule('accept', '-j ACCEPT')
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_unwrapped_rule_restores_table(self):
+        self._replay_full_apply()
+        self.iptables.execute(['iptables-save', '-t', 'filter'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_failed_update_restores_table(self):
+        self._replay_full_apply()
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper
+                              ).AndRaise(RuntimeError())
+        self.iptables.execute(['iptables-save', '-t', 'filter'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_modify_rules_keeps_top_rules_first(self):
+        table = self.iptables.ipv4['filter']
+        current_lines = ['*filter', ':FORWARD ACCEPT [0:0]',
+                         '-A FORWARD -j ACCEPT',
+                         '-A FORWARD -j quantum-filter-top', 'COMMIT']
+        new_lines = self.iptables._modify_rules(current_lines, table)
+        forward_rules = [line for line in new_lines
+                         if line.startswith('-A FORWARD')]
+        self.assertEqual('-A FORWARD -j quantum-filter-top', forward_rules[0])
+        self.assertEqual(1, forward_rules.count(
+            '-A FORWARD -j quantum-filter-top'))
+        self.assertIn('-A FORWARD -j ACCEPT', forward_rules)
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
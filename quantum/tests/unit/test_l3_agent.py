@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 
 import mock
@@ -169,46 +170,71 @@ class TestBasicRouterOperations(base.BaseTestCase):
     def testAgentRemoveExternalGateway(self):
         self._test_external_gateway_action('remove')
 
-    def _test_floating_ip_action(self, action):
+    def _test_process_router_floating_ips(self, ex_gw_port):
         router_id = _uuid()
         ri = l3_agent.RouterInfo(router_id, self.conf.root_helper,
                                  self.conf.use_namespaces, None)
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        floating_ip = '20.0.0.100'
-        fixed_ip = '10.0.0.23'
-        ex_gw_port = {'fixed_ips': [{'ip_address': '20.0.0.30',
-                                     'subnet_id': _uuid()}],
-                      'subnet': {'gateway_ip': '20.0.0.1'},
-                      'id': _uuid(),
-                      'mac_address': 'ca:fe:de:ad:be:ef',
-                      'ip_cidr': '20.0.0.30/24'}
-        interface_name = agent.get_external_device_name(ex_gw_port['id'])
-
-        if action == 'add':
-            self.device_exists.return_value = False
-            agent.floating_ip_added(ri, ex_gw_port, floating_ip, fixed_ip)
-            arping_cmd = ['arping', '-A', '-U',
-                          '-I', interface_name,
-                          '-c', self.conf.send_arp_for_ha,
-                          floating_ip]
-            if self.conf.use_namespaces:
-                self.mock_ip.netns.execute.assert_any_call(
-                    arping_cmd, check_exit_code=True)
+        remapped = {'id': _uuid(), 'floating_ip_address': '20.0.0.101',
+                    'fixed_ip_address': '10.0.0.24', 'port_id': _uuid()}
+        removed = {'id': _uuid(), 'floating_ip_address': '20.0.0.102',
+                   'fixed_ip_address': '10.0.0.25', 'port_id': _uuid()}
+        ri.floating_ips = [remapped, removed]
+        for fip in ri.floating_ips:
+            for chain, rule in agent.floating_forward_rules(
+                    fip['floating_ip_address'], fip['fixed_ip_address']):
+                ri.iptables_manager.ipv4['nat'].add_rule(chain, rule)
+        added = [{'id': _uuid(), 'floating_ip_address': '20.0.0.%s' % i,
+                  'fixed_ip_address': '10.0.0.%s' % i, 'port_id': _uuid()}
+                 for i in (103, 104)]
+        ri.router = {l3_constants.FLOATINGIP_KEY:
+                     added + [dict(remapped, fixed_ip_address='10.0.0.26')]}
+        with contextlib.nested(
+            mock.patch('quantum.agent.linux.ip_lib.IPDevice'),
+            mock.patch.object(ri.iptables_manager, '_apply'),
+            mock.patch('eventlet.spawn_n')
+        ) as (device_cls, iptables_apply, spawn_n):
+            device = device_cls.return_value
+            device.addr.list.return_value = [{'cidr': '20.0.0.30/24'},
+                                             {'cidr': '20.0.0.101/32'},
+                                             {'cidr': '20.0.0.102/32'}]
+            agent.process_router_floating_ips(ri, ex_gw_port)
+            iptables_apply.assert_called_once_with()
+            if ex_gw_port:
+                interface_name = agent.get_external_device_name(
+                    ex_gw_port['id'])
+                device.addr.update.assert_called_once_with(
+                    adds=[(4, '20.0.0.103/32', '20.0.0.103'),
+                          (4, '20.0.0.104/32', '20.0.0.104')],
+                    deletes=[(4, '20.0.0.102/32')])
+                spawn_n.assert_has_calls(
+                    [mock.call(agent._send_gratuitous_arp_packet, ri,
+                               interface_name, '20.0.0.103'),
+                     mock.call(agent._send_gratuitous_arp_packet, ri,
+                               interface_name, '20.0.0.104')])
             else:
-                self.utils_exec.assert_any_call(
-                    check_exit_code=True, root_helper=self.conf.root_helper)
-
-        elif action == 'remove':
-            self.device_exists.return_value = True
-            agent.floating_ip_removed(ri, ex_gw_port, floating_ip, fixed_ip)
+                self.assertFalse(device.addr.update.called)
+                self.assertFalse(spawn_n.called)
+        nat_rules = ' '.join([str(rule) for rule
+                              in ri.iptables_manager.ipv4['nat'].rules])
+        if ex_gw_port:
+            self.assertEqual(sorted([fip['id'] for fip in added] +
+                                    [remapped['id']]),
+                             sorted([fip['id'] for fip in ri.floating_ips]))
+            self.assertIn('-d 20.0.0.101 -j DNAT --to 10.0.0.26', nat_rules)
         else:
-            raise Exception("Invalid action %s" % action)
+            self.assertEqual([], ri.floating_ips)
+        self.assertNotIn('-d 20.0.0.102 -j DNAT --to 10.0.0.25', nat_rules)
+        self.assertNotIn('-d 20.0.0.101 -j DNAT --to 10.0.0.24', nat_rules)
 
-    def testAgentAddFloatingIP(self):
-        self._test_floating_ip_action('add')
+    def testProcessRouterFloatingIPs(self):
+        self._test_process_router_floating_ips(
+            {'id': _uuid(),
+             'fixed_ips': [{'ip_address': '20.0.0.30',
+                            'subnet_id': _uuid()}]})
 
-    def testAgentRemoveFloatingIP(self):
-        self._test_floating_ip_action('remove')
+    def testProcessRouterFloatingIPsGatewayRemoved(self):
+        self._test_process_router_floating_ips(None)
 
     def _check_agent_method_called(self, agent, calls, namespace):
         if namespace:
@@ -384,12 +410,163 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
 
         agent.router_deleted(None, routers[0]['id'])
+        agent.router_pool.waitall()
         # verify that remove is called
         self.assertEqual(self.mock_ip.get_devices.call_count, 1)
 
         self.device_exists.assert_has_calls(
             [mock.call(self.conf.external_network_bridge)])
 
+    def _router_with_revision(self, agent, revision):
+        ex_net_id = _uuid()
+        self.plugin_api.get_external_network_id.return_value = ex_net_id
+        ex_gw_port = {'id': _uuid(),
+                      'network_id': ex_net_id,
+                      'mac_address': 'ca:fe:de:ad:be:ee',
+                      'fixed_ips': [{'ip_address': '19.4.4.4',
+                                     'subnet_id': _uuid()}],
+                      'subnet': {'cidr': '19.4.4.0/24',
+                                 'gateway_ip': '19.4.4.1'}}
+        router = {'id': _uuid(),
+                  'admin_state_up': True,
+                  'routes': [],
+                  'revision': revision,
+                  'external_gateway_info': {'network_id': ex_net_id},
+                  'gw_port': ex_gw_port}
+        agent._process_routers([router])
+        agent.router_pool.waitall()
+        return agent.router_info[router['id']]
+
+    def testRouterDeltaUpdated(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        ri = self._router_with_revision(agent, 1)
+        internal_port = {'id': _uuid(),
+                         'network_id': _uuid(),
+                         'admin_state_up': True,
+                         'fixed_ips': [{'ip_address': '35.4.4.4',
+                                        'subnet_id': _uuid()}],
+                         'mac_address': 'ca:fe:de:ad:be:ef',
+                         'subnet': {'cidr': '35.4.4.0/24',
+                                    'gateway_ip': '35.4.4.1'}}
+        fip = {'id': _uuid(),
+               'floating_ip_address': '8.8.8.8',
+               'fixed_ip_address': '35.4.4.5',
+               'port_id': _uuid()}
+
+        def update_floating_ips(ri, ex_gw_port, removed, added):
+            for fip in removed:
+                ri.floating_ips.remove(fip)
+            ri.floating_ips.extend(added)
+
+        with contextlib.nested(
+            mock.patch.object(agent, 'internal_network_added'),
+            mock.patch.object(agent, '_update_floating_ips',
+                              side_effect=update_floating_ips),
+            mock.patch.object(agent, 'process_router')
+        ) as (net_added, update_fips, process_router):
+            agent.router_delta_updated(None, {
+                'router_id': ri.router_id,
+                'revision': 2,
+                'delta': {
+                    l3_constants.INTERFACE_KEY: {'updated': [internal_port]},
+                    l3_constants.FLOATINGIP_KEY: {'updated': [fip]}}})
+            agent.router_pool.waitall()
+            net_added.assert_called_once_with(
+                ri, ri.ex_gw_port, internal_port['network_id'],
+                internal_port['id'], '35.4.4.4/24',
+                internal_port['mac_address'])
+            update_fips.assert_called_once_with(ri, ri.ex_gw_port, [], [fip])
+            self.assertEqual([internal_port],
+                             ri.router[l3_constants.INTERFACE_KEY])
+            self.assertEqual([fip], ri.router[l3_constants.FLOATINGIP_KEY])
+
+            agent.router_delta_updated(None, {
+                'router_id': ri.router_id,
+                'revision': 3,
+                'delta': {
+                    l3_constants.FLOATINGIP_KEY: {'removed': [fip['id']]}}})
+            agent.router_pool.waitall()
+            update_fips.assert_called_with(ri, ri.ex_gw_port, [fip], [])
+            self.assertEqual([], ri.router[l3_constants.FLOATINGIP_KEY])
+            self.assertEqual([], ri.floating_ips)
+            self.assertFalse(process_router.called)
+        self.assertEqual(3, ri.revision)
+        self.assertFalse(agent.fullsync)
+
+    def testRouterDeltaUpdatedIgnoresStaleRevision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        ri = self._router_with_revision(agent, 2)
+        with mock.patch.object(agent, '_process_router_delta') as process:
+            agent.router_delta_updated(None, {'router_id': ri.router_id,
+                                              'revision': 2,
+                                              'delta': {}})
+            agent.router_pool.waitall()
+            self.assertFalse(process.called)
+        self.assertEqual(2, ri.revision)
+        self.assertFalse(agent.fullsync)
+
+    def testRouterDeltaUpdatedRevisionGap(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        ri = self._router_with_revision(agent, 2)
+        with mock.patch.object(agent, '_process_router_delta') as process:
+            agent.router_delta_updated(None, {'router_id': ri.router_id,
+                                              'revision': 4,
+                                              'delta': {}})
+            agent.router_pool.waitall()
+            self.assertFalse(process.called)
+        self.assertEqual(2, ri.revision)
+        self.assertTrue(agent.fullsync)
+
+    def testProcessRoutersIgnoresStaleRouter(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = self._router_with_revision(agent, 3)
+        router = ri.router
+        stale_router = dict(router, revision=2)
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent._process_routers([stale_router])
+            agent.router_pool.waitall()
+            self.assertFalse(process_router.called)
+        self.assertIs(router, ri.router)
+        self.assertEqual(3, ri.revision)
+
+    def testRpcUpdatesGoBeforeSync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        routers = [{'id': _uuid(),
+                    'admin_state_up': True,
+                    'routes': [],
+                    'external_gateway_info': {}} for i in range(3)]
+        self.plugin_api.get_routers.return_value = routers[:2]
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent._sync_routers_task(agent.context)
+            agent.routers_updated(None, routers[2:])
+            agent.router_pool.waitall()
+        self.assertEqual([r['id'] for r in routers[2:] + routers[:2]],
+                         [c[0][0].router_id
+                          for c in process_router.call_args_list])
+        self.assertFalse(agent.fullsync)
+        self.assertEqual(0, len(agent.router_queue))
+        self.assertEqual(3, agent.updates_processed)
+
+    def testFailedRouterUpdateTriggersSync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        self.plugin_api.get_external_network_id.return_value = None
+        routers = [{'id': _uuid(),
+                    'admin_state_up': True,
+                    'routes': [],
+                    'external_gateway_info': {}} for i in range(2)]
+        with mock.patch.object(agent, 'process_router',
+                               side_effect=[RuntimeError, None]):
+            agent.routers_updated(None, routers)
+            agent.router_pool.waitall()
+        self.assertTrue(agent.fullsync)
+        self.assertEqual(set(r['id'] for r in routers),
+                         set(agent.router_info))
+
     def testDestroyNamespace(self):
 
         class FakeDev(object):
@@ -430,6 +607,36 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.assertEqual(agent._destroy_router_namespace.call_count, 1)
 
 
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def test_pop_most_urgent_first(self):
+        self.queue.add('r1', l3_agent.PRIORITY_SYNC, 'sync1')
+        self.queue.add('r2', l3_agent.PRIORITY_SYNC, 'sync2')
+        self.queue.add('r2', l3_agent.PRIORITY_RPC, 'rpc2')
+        self.queue.add('r3', l3_agent.PRIORITY_RPC, 'rpc3')
+        self.assertEqual(4, len(self.queue))
+        self.assertEqual(('r2', ['sync2', 'rpc2']), self.queue.pop())
+        self.assertEqual(('r3', ['rpc3']), self.queue.pop())
+        self.assertEqual(('r1', ['sync1']), self.queue.pop())
+        self.assertEqual((None, []), self.queue.pop())
+        self.assertEqual(0, len(self.queue))
+
+    def test_busy_router_not_popped(self):
+        self.queue.add('r1', l3_agent.PRIORITY_RPC, 'update1')
+        self.assertEqual(('r1', ['update1']), self.queue.pop())
+        self.queue.add('r1', l3_agent.PRIORITY_RPC, 'update2')
+        self.queue.add('r1', l3_agent.PRIORITY_RPC, 'update3')
+        self.assertEqual((None, []), self.queue.pop())
+        self.queue.done('r1')
+        self.assertEqual(('r1', ['update2', 'update3']), self.queue.pop())
+        self.queue.done('r1')
+        self.assertEqual((None, []), self.queue.pop())
+
+
 class TestL3AgentEventHandler(base.BaseTestCase):
 
     def setUp(self):
@@ -1555,7 +1555,8 @@ class L3NatDBTestCase(L3NatTestCaseBase):
                                           r['router']['id'],
                                           None,
                                           p['port']['id'])
-        self.assertEqual(2, notifyApi.routers_updated.call_count)
+        self.assertEqual(2, notifyApi.router_delta_updated.call_count)
+        self.assertFalse(notifyApi.routers_updated.called)
 
     def test_interfaces_op_agent(self):
         with self.router() as r:
@@ -1565,13 +1566,34 @@ class L3NatDBTestCase(L3NatTestCaseBase):
     def _test_floatingips_op_agent(self, notifyApi):
         with self.floatingip_with_assoc():
             pass
-        # add gateway, add interface, associate, deletion of floatingip,
-        # delete gateway, delete interface
-        self.assertEqual(6, notifyApi.routers_updated.call_count)
+        # add gateway, delete gateway
+        self.assertEqual(2, notifyApi.routers_updated.call_count)
+        # add interface, associate, deletion of floatingip, delete interface
+        self.assertEqual(4, notifyApi.router_delta_updated.call_count)
 
     def test_floatingips_op_agent(self):
         self._test_notify_op_agent(self._test_floatingips_op_agent)
 
+    def _test_floatingips_delta_op_agent(self, notifyApi):
+        with self.floatingip_with_assoc() as fip:
+            fip = fip['floatingip']
+            router_id = fip['router_id']
+            # add gateway and add interface came before
+            notifyApi.router_delta_updated.assert_called_with(
+                mock.ANY, router_id, 3,
+                {l3_constants.FLOATINGIP_KEY: {'updated': [fip]}})
+            plugin = QuantumManager.get_plugin()
+            routers = plugin.get_sync_data(context.get_admin_context(),
+                                           [router_id])
+            self.assertEqual(3, routers[0]['revision'])
+        notifyApi.router_delta_updated.assert_has_calls([
+            mock.call(mock.ANY, router_id, 4,
+                      {l3_constants.FLOATINGIP_KEY: {'removed': [fip['id']]}})
+        ])
+
+    def test_floatingips_delta_op_agent(self):
+        self._test_notify_op_agent(self._test_floatingips_delta_op_agent)
+
     def test_l3_agent_routers_query_interfaces(self):
         with self.router() as r:
             with self.port(no_delete=True) as p:
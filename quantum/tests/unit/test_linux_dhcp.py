@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 
@@ -598,6 +599,40 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def test_reload_allocations_unchanged(self):
+        with contextlib.nested(
+            mock.patch.object(dhcp.Dnsmasq, '_replace_file_if_changed'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map')
+        ) as (replace, ip_map):
+            ip_map.return_value = {}
+            dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                              namespace='qdhcp-ns')
+            dm.reload_allocations()
+        self.assertEqual(2, replace.call_count)
+        self.assertFalse(self.execute.called)
+
+    def _test_replace_file_if_changed(self, open_mock, changed):
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network())
+        with mock.patch('__builtin__.open', open_mock, create=True):
+            dm._replace_file_if_changed('/foo/host', 'new data')
+        if changed:
+            self.safe.assert_called_once_with('/foo/host', 'new data')
+        else:
+            self.assertFalse(self.safe.called)
+        self.assertEqual(changed, dm._files_changed)
+
+    def test_replace_file_if_changed_same_content(self):
+        self._test_replace_file_if_changed(
+            mock.mock_open(read_data='new data'), False)
+
+    def test_replace_file_if_changed_new_content(self):
+        self._test_replace_file_if_changed(
+            mock.mock_open(read_data='old data'), True)
+
+    def test_replace_file_if_changed_no_file(self):
+        self._test_replace_file_if_changed(
+            mock.Mock(side_effect=IOError), True)
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('quantum.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
@@ -18,6 +18,7 @@
 import mock
 
 from quantum.agent.linux import ip_lib
+from quantum.agent.linux import utils
 from quantum.common import exceptions
 from quantum.tests import base
 
@@ -512,6 +513,25 @@ class TestIpAddrCommand(TestIPCmdBase):
         self.addr_cmd.flush()
         self._assert_sudo([], ('flush', 'tap0'))
 
+    def test_update(self):
+        device = ip_lib.IPDevice('tap0', 'sudo', namespace='ns')
+        with mock.patch.object(utils, 'execute_batch') as execute_batch:
+            device.addr.update(adds=[(4, '10.0.0.5/32', '10.0.0.5')],
+                               deletes=[(4, '10.0.0.4/32')])
+            execute_batch.assert_called_once_with(
+                [['ip', 'netns', 'exec', 'ns', 'ip', '-4', 'addr', 'del',
+                  '10.0.0.4/32', 'dev', 'tap0'],
+                 ['ip', 'netns', 'exec', 'ns', 'ip', '-4', 'addr', 'add',
+                  '10.0.0.5/32', 'brd', '10.0.0.5', 'scope', 'global',
+                  'dev', 'tap0']],
+                root_helper='sudo')
+
+    def test_update_nothing(self):
+        device = ip_lib.IPDevice('tap0', 'sudo')
+        with mock.patch.object(utils, 'execute_batch') as execute_batch:
+            device.addr.update()
+            self.assertFalse(execute_batch.called)
+
     def test_list(self):
         expected = [
             dict(ip_version=4, scope='global',
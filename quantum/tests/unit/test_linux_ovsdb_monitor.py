@@ -0,0 +1,81 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from quantum.agent.linux import ovsdb_monitor
+from quantum.tests import base
+
+
+HEADINGS = ['row', 'action', 'name', 'ofport', 'external_ids']
+TAP1_IDS = ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                    ['iface-id', 'port1']]]
+
+
+class TestInterfaceMonitor(base.BaseTestCase):
+    def setUp(self):
+        super(TestInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.InterfaceMonitor('sudo')
+
+    def _output(self, *data):
+        self.monitor._process_output({'headings': HEADINGS,
+                                      'data': list(data)})
+
+    def test_get_cmd(self):
+        self.assertEqual(['sudo', 'ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport,external_ids', '--format=json'],
+                         self.monitor._get_cmd())
+
+    def test_initial_rows(self):
+        self._output(['uuid1', 'initial', 'tap1', 1, TAP1_IDS],
+                     ['uuid2', 'initial', 'br-int', 65534, ['map', []]])
+        interfaces = sorted(self.monitor.get_interfaces(),
+                            key=lambda iface: iface['name'])
+        self.assertEqual(
+            [{'name': 'br-int', 'ofport': 65534, 'external_ids': {}},
+             {'name': 'tap1', 'ofport': 1,
+              'external_ids': {'attached-mac': 'fa:16:3e:00:00:01',
+                               'iface-id': 'port1'}}],
+            interfaces)
+        self.assertTrue(self.monitor.wait_for_updates(0))
+
+    def test_insert_and_delete(self):
+        self._output(['uuid1', 'insert', 'tap1', ['set', []], TAP1_IDS])
+        self.assertEqual(['tap1'], [iface['name'] for iface in
+                                    self.monitor.get_interfaces()])
+        self._output(['uuid1', 'delete', 'tap1', 1, TAP1_IDS])
+        self.assertEqual([], self.monitor.get_interfaces())
+
+    def test_modify_uses_new_row(self):
+        self._output(['uuid1', 'initial', 'tap1', ['set', []], TAP1_IDS])
+        self._output(['uuid1', 'old', None, ['set', []], None],
+                     ['uuid1', 'new', 'tap1', 5, TAP1_IDS])
+        self.assertEqual(5, self.monitor.rows['uuid1']['ofport'])
+
+    def test_wait_for_updates_times_out(self):
+        self.assertFalse(self.monitor.wait_for_updates(0))
+
+    def test_stop_kills_leaf_process(self):
+        process = mock.Mock()
+        process.pid = 10
+        process.poll.return_value = None
+        self.monitor._process = process
+        with mock.patch('quantum.agent.linux.utils.execute') as execute:
+            execute.side_effect = ['11\n', '', '']
+            self.monitor.stop()
+        execute.assert_called_with(['kill', '-9', '11'], 'sudo')
+        self.assertFalse(self.monitor.is_active())
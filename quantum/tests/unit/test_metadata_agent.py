@@ -37,6 +37,47 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 5
+    metadata_cache_size = 1000
+    nova_metadata_pool_size = 16
+    quantum_client_pool_size = 4
+
+
+class TestTTLCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestTTLCache, self).setUp()
+        self.cache = agent.TTLCache(2, 5)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1},
+                         self.cache.get_stats())
+
+    def test_expiry(self):
+        with mock.patch.object(agent.time, 'time') as time_fn:
+            time_fn.return_value = 100
+            self.cache.put('a', 1)
+            time_fn.return_value = 104
+            self.assertEqual(1, self.cache.get('a'))
+            time_fn.return_value = 105
+            self.assertIsNone(self.cache.get('a'))
+            self.assertEqual(0, self.cache.get_stats()['size'])
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_disabled(self):
+        cache = agent.TTLCache(2, 0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -96,23 +137,25 @@ class TestMetadataProxyHandler(base.BaseTestCase):
                 auth_url=FakeConf.auth_url,
                 password=FakeConf.admin_password,
                 auth_strategy=FakeConf.auth_strategy,
-                auth_token=None,
+                token=None,
                 endpoint_url=None)
         ]
 
         if router_id:
-            expected.append(
+            expected.extend([
                 mock.call().list_ports(
                     device_id=router_id,
                     device_owner='network:router_interface'
-                )
-            )
+                ),
+                mock.call().httpclient.get_auth_info()
+            ])
 
-        expected.append(
+        expected.extend([
             mock.call().list_ports(
                 network_id=networks or [],
-                fixed_ips=['ip_address=192.168.1.1'])
-        )
+                fixed_ips=['ip_address=192.168.1.1']),
+            mock.call().httpclient.get_auth_info()
+        ])
 
         self.qclient.assert_has_calls(expected)
 
@@ -180,6 +223,65 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             self._get_instance_id_helper(headers, ports, networks=['the_id'])
         )
 
+    def test_get_instance_id_cached(self):
+        headers = {'X-Quantum-Router-ID': 'the_id',
+                   'X-Forwarded-For': '192.168.1.1'}
+        req = mock.Mock(headers=headers)
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = [
+            {'ports': [{'network_id': 'net1'}]},
+            {'ports': [{'device_id': 'device_id'}]},
+            {'ports': [{'device_id': 'device_id2'}]}]
+
+        self.assertEqual('device_id', self.handler._get_instance_id(req))
+        self.assertEqual('device_id', self.handler._get_instance_id(req))
+        self.assertEqual(2, list_ports.call_count)
+        self.assertEqual(1, self.qclient.call_count)
+
+        # the networks of the router are still known for another address
+        headers['X-Forwarded-For'] = '192.168.1.2'
+        self.assertEqual('device_id2', self.handler._get_instance_id(req))
+        list_ports.assert_called_with(
+            network_id=['net1'], fixed_ips=['ip_address=192.168.1.2'])
+        self.assertEqual(
+            {'instances': {'hits': 1, 'misses': 2, 'size': 2},
+             'routers': {'hits': 1, 'misses': 1, 'size': 1}},
+            self.handler.get_cache_stats())
+
+    def test_quantum_clients_share_auth_info(self):
+        qclient = self.qclient.return_value
+        qclient.list_ports.return_value = {'ports': []}
+        qclient.httpclient.get_auth_info.return_value = {
+            'auth_token': 'token', 'endpoint_url': 'url'}
+
+        self.handler._list_ports(device_id='a')
+        with self.handler._qclient_pool.item():
+            # the first client is in use, another one is created
+            self.handler._list_ports(device_id='b')
+        self.handler._list_ports(device_id='c')
+
+        self.assertEqual(2, self.qclient.call_count)
+        self.qclient.assert_called_with(
+            username=FakeConf.admin_user,
+            tenant_name=FakeConf.admin_tenant_name,
+            region_name=FakeConf.auth_region,
+            auth_url=FakeConf.auth_url,
+            password=FakeConf.admin_password,
+            auth_strategy=FakeConf.auth_strategy,
+            token='token',
+            endpoint_url='url')
+
+    def test_get_instance_id_no_match_not_cached(self):
+        headers = {'X-Quantum-Network-ID': 'the_id',
+                   'X-Forwarded-For': '192.168.1.1'}
+        req = mock.Mock(headers=headers)
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = [{'ports': []},
+                                  {'ports': [{'device_id': 'device_id'}]}]
+
+        self.assertIsNone(self.handler._get_instance_id(req))
+        self.assertEqual('device_id', self.handler._get_instance_id(req))
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -208,6 +310,17 @@ class TestMetadataProxyHandler(base.BaseTestCase):
 
                 return retval
 
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={}, method='GET', body='')
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            self.handler._proxy_request('the_id', req)
+            self.handler._proxy_request('the_id', req)
+            mock_http.assert_called_once_with()
+            self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def test_proxy_request_post(self):
         self.assertEqual('content',
                          self._proxy_request_test_helper(method='POST'))
@@ -208,8 +208,66 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
+                # the rules are grouped by security group, in no given order
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2['security_group']['id'])
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                port_rpc = info['devices'][port_id1]
+                expected = [{'direction': 'egress', 'ethertype': 'IPv4',
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': 'IPv6',
+                             'security_group_id': sg1_id},
+                            {'direction': u'ingress',
+                             'protocol': u'tcp', 'ethertype': u'IPv4',
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
                 self.assertEqual(port_rpc['security_group_rules'],
                                  expected)
+                self.assertEqual(port_rpc['security_group_source_groups'],
+                                 [sg2_id])
+                self.assertEqual(info['sg_member_ips'],
+                                 {sg2_id: {'IPv4': ['10.0.0.3'],
+                                           'IPv6': []}})
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
@@ -388,8 +446,9 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
-                self.assertEqual(port_rpc['security_group_rules'],
-                                 expected)
+                # the rules are grouped by security group, in no given order
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
@@ -447,6 +506,13 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         fake_devices = {'fake_device': self.fake_device}
         self.firewall.ports = fake_devices
         rpc.security_group_rules_for_devices.return_value = fake_devices
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
+
+    def _run_scheduled_refresh(self):
+        self.spawn_after.assert_called_once_with(
+            self.agent.refresh_firewall_delay,
+            self.agent._refresh_scheduled_devices)
+        self.agent._refresh_scheduled_devices()
 
     def test_prepare_and_remove_devices_filter(self):
         self.agent.prepare_devices_filter(['fake_device'])
@@ -464,33 +530,86 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_rule_updated(['fake_sgid1', 'fake_sgid3'])
-        self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self._run_scheduled_refresh()
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['fake_device']))
 
     def test_security_groups_rule_not_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_rule_updated(['fake_sgid3', 'fake_sgid4'])
-        self.agent.refresh_firewall.assert_has_calls([])
+        self.assertFalse(self.spawn_after.called)
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_groups_rule_updated_removed_device(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.remove_devices_filter(['fake_device'])
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.assertFalse(self.spawn_after.called)
 
     def test_security_groups_member_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_member_updated(['fake_sgid2', 'fake_sgid3'])
-        self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+        self._run_scheduled_refresh()
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['fake_device']))
 
     def test_security_groups_member_not_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_member_updated(['fake_sgid3', 'fake_sgid4'])
-        self.agent.refresh_firewall.assert_has_calls([])
+        self.assertFalse(self.spawn_after.called)
+        self.assertFalse(self.agent.refresh_firewall.called)
 
     def test_security_groups_provider_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.security_groups_provider_updated()
+        self._run_scheduled_refresh()
+        self.agent.refresh_firewall.assert_called_once_with(None)
+
+    def test_security_groups_updates_coalesced(self):
+        fake_device2 = {'device': 'fake_device2',
+                        'security_groups': ['fake_sgid3'],
+                        'security_group_source_groups': [],
+                        'security_group_rules': []}
+        # also returned by the rpc mock
+        self.firewall.ports['fake_device2'] = fake_device2
+        self.agent.prepare_devices_filter(['fake_device', 'fake_device2'])
+        self.firewall.reset_mock()
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.agent.security_groups_rule_updated(['fake_sgid2'])
+        self.agent.security_groups_rule_updated(['fake_sgid3'])
+        self._run_scheduled_refresh()
+        self.assertEqual(1, self.firewall.defer_apply.call_count)
+        self.firewall.update_port_filter.assert_has_calls(
+            [call(self.fake_device), call(fake_device2)], any_order=True)
+        self.assertEqual(2, self.firewall.update_port_filter.call_count)
+
+    def test_security_groups_updated_during_refresh(self):
+        def refresh_firewall(device_ids):
+            if refresh_firewall.calls == 0:
+                self.agent.security_groups_provider_updated()
+            refresh_firewall.calls += 1
+
+        refresh_firewall.calls = 0
+        self.agent.refresh_firewall = mock.Mock(side_effect=refresh_firewall)
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self._run_scheduled_refresh()
         self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+            [call(set(['fake_device'])), call(None)])
+        self.assertFalse(self.agent.refresh_scheduled)
+
+    def test_refresh_firewall_devices(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.refresh_firewall(['fake_device', 'unknown_device'])
+        # the devices which are not filtered are not requested
+        self.assertEqual((None, ['fake_device']),
+                         self.agent.plugin_rpc.mock_calls[-1][1])
+        self.firewall.update_port_filter.assert_called_once_with(
+            self.fake_device)
 
     def test_refresh_firewall(self):
         self.agent.prepare_devices_filter(['fake_port_id'])
@@ -502,6 +621,56 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls(calls)
 
 
+class SecurityGroupAgentIpsetRpcTestCase(SecurityGroupAgentRpcTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentIpsetRpcTestCase, self).setUp()
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.sg_member_ips = {'fake_sgid2': {'IPv4': ['10.0.0.3'],
+                                             'IPv6': []}}
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.return_value = {
+            'devices': rpc.security_group_rules_for_devices.return_value,
+            'sg_member_ips': self.sg_member_ips}
+
+    def test_prepare_devices_filter_updates_members(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_members(self.sg_member_ips),
+             call.defer_apply(),
+             call.prepare_port_filter(self.fake_device)])
+
+    def test_refresh_firewall(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.refresh_firewall()
+        calls = [call.update_security_group_members(self.sg_member_ips),
+                 call.defer_apply(),
+                 call.prepare_port_filter(self.fake_device),
+                 call.update_security_group_members(self.sg_member_ips),
+                 call.defer_apply(),
+                 call.update_port_filter(self.fake_device)]
+        self.firewall.assert_has_calls(calls)
+
+    def test_security_groups_member_updated(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.firewall.reset_mock()
+        self.agent.security_groups_member_updated(['fake_sgid2', 'fake_sgid3'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.assert_called_with(
+            None, ['fake_device'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            self.sg_member_ips)
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.firewall.reset_mock()
+        self.agent.security_groups_member_updated(['fake_sgid3', 'fake_sgid4'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
@@ -524,6 +693,17 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1003,6 +1183,9 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
             group='SECURITYGROUP')
         self.addCleanup(mock.patch.stopall)
         self.addCleanup(self.mox.UnsetStubs)
+        # refresh the firewall without waiting for other notifications
+        mock.patch('eventlet.spawn_after',
+                   side_effect=lambda delay, func: func()).start()
 
         self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
         self.agent.context = None
@@ -1014,6 +1197,8 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         self.iptables = self.agent.firewall.iptables
         self.mox.StubOutWithMock(self.iptables, "execute")
 
+        self.applied_filters = None
+
         self.rpc = mock.Mock()
         self.agent.plugin_rpc = self.rpc
         rule1 = [{'direction': 'ingress',
@@ -1086,6 +1271,34 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         return mox.Regex(value)
 
     def _replay_iptables(self, v4_filter, v6_filter):
+        if self.applied_filters is None:
+            self._replay_iptables_full(v4_filter, v6_filter)
+        else:
+            # Once the tables have been restored, only changed chains are
+            # sent; check that the whole in-memory ruleset matches.
+            if v4_filter != self.applied_filters[0]:
+                self._replay_iptables_noflush('iptables', self.iptables.ipv4,
+                                              v4_filter)
+            if v6_filter != self.applied_filters[1]:
+                self._replay_iptables_noflush('ip6tables',
+                                              self.iptables.ipv6, v6_filter)
+        self.applied_filters = (v4_filter, v6_filter)
+
+    def _replay_iptables_noflush(self, cmd, tables, expected):
+        regex = self._regex(expected)
+
+        def _check(process_input):
+            filter_rules = self.iptables._modify_rules([''],
+                                                       tables['filter'])
+            return (process_input.startswith('*filter\n') and
+                    regex.equals('\n'.join(filter_rules)))
+
+        self.iptables.execute(
+            ['%s-restore' % cmd, '--noflush'],
+            process_input=mox.Func(_check),
+            root_helper=self.root_helper).AndReturn('')
+
+    def _replay_iptables_full(self, v4_filter, v6_filter):
         self.iptables.execute(
             ['iptables-save', '-t', 'filter'],
             root_helper=self.root_helper).AndReturn('')
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import errno
 import os
 import socket
 import urllib2
@@ -111,6 +113,94 @@ class TestWSGIServer(base.BaseTestCase):
 
         server.stop()
 
+    def test_start_multiple_workers(self):
+        server = wsgi.Server("test_workers")
+        with contextlib.nested(
+            mock.patch.object(wsgi.common_service, 'ProcessLauncher'),
+            mock.patch.object(wsgi.signal, 'signal'),
+            mock.patch.object(server, 'pool')
+        ) as (launcher_cls, mock_signal, mock_pool):
+            server.start(None, 0, host="127.0.0.1", workers=2)
+            launcher = launcher_cls.return_value
+            self.assertEqual(1, launcher.launch_service.call_count)
+            args, kwargs = launcher.launch_service.call_args
+            self.assertIsInstance(args[0], wsgi.WorkerService)
+            self.assertEqual({'workers': 2}, kwargs)
+            mock_signal.assert_called_once_with(wsgi.signal.SIGHUP,
+                                                server._restart_workers)
+            self.assertFalse(mock_pool.spawn.called)
+
+            server.stop()
+            self.assertFalse(launcher.running)
+            server.wait()
+            launcher.wait.assert_called_once_with()
+            self.assertFalse(mock_pool.waitall.called)
+
+    def test_restart_workers(self):
+        server = wsgi.Server("test_workers")
+        server._launcher = mock.Mock()
+        server._launcher.children = {1001: None, 1002: None}
+        with mock.patch.object(wsgi.os, 'kill') as mock_kill:
+            mock_kill.side_effect = [OSError(errno.ESRCH, 'gone'), None]
+            server._restart_workers(wsgi.signal.SIGHUP, None)
+            self.assertEqual(
+                sorted([mock.call(1001, wsgi.signal.SIGHUP),
+                        mock.call(1002, wsgi.signal.SIGHUP)]),
+                sorted(mock_kill.call_args_list))
+
+
+class TestWorkerService(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestWorkerService, self).setUp()
+        self.server = mock.Mock()
+        self.service = wsgi.WorkerService(self.server, 'app')
+
+    def test_start(self):
+        with contextlib.nested(
+            mock.patch.object(self.service, '_reset_rpc_connection_pool'),
+            mock.patch.object(wsgi.signal, 'signal')
+        ) as (mock_reset, mock_signal):
+            self.service.start()
+            mock_reset.assert_called_once_with()
+            mock_signal.assert_called_once_with(
+                wsgi.signal.SIGHUP, self.service._handle_sighup)
+            self.server.pool.spawn.assert_called_once_with(
+                self.server._run, 'app', self.server._socket)
+
+    def test_sighup_stops_server(self):
+        with contextlib.nested(
+            mock.patch.object(self.service, '_reset_rpc_connection_pool'),
+            mock.patch.object(wsgi.signal, 'signal'),
+            mock.patch.object(wsgi.eventlet, 'spawn_n')
+        ) as (mock_reset, mock_signal, mock_spawn_n):
+            self.service.start()
+            self.service._handle_sighup(wsgi.signal.SIGHUP, None)
+            mock_spawn_n.assert_called_once_with(self.service.stop)
+            self.service.stop()
+            self.server.pool.spawn.return_value.kill.assert_called_once_with()
+            self.service.wait()
+            self.server.pool.waitall.assert_called_once_with()
+
+    def test_reset_rpc_connection_pool(self):
+        parent_pool = mock.Mock()
+
+        class FakeConnection(object):
+            pool = parent_pool
+
+        impl = mock.Mock(Connection=FakeConnection)
+        with mock.patch.object(wsgi.rpc, '_get_impl', return_value=impl):
+            self.service._reset_rpc_connection_pool()
+        # The connections of the parent process are not closed
+        self.assertFalse(parent_pool.method_calls)
+        self.assertIsInstance(FakeConnection.pool, wsgi.rpc_amqp.Pool)
+        self.assertIs(FakeConnection, FakeConnection.pool.connection_cls)
+
+    def test_reset_rpc_connection_pool_without_pool(self):
+        impl = mock.Mock(spec=[])
+        with mock.patch.object(wsgi.rpc, '_get_impl', return_value=impl):
+            self.service._reset_rpc_connection_pool()
+
 
 class SerializerTest(base.BaseTestCase):
     def test_serialize_unknown_content_type(self):
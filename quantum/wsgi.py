@@ -20,6 +20,7 @@ Utility methods for working with WSGI servers
 """
 import errno
 import os
+import signal
 import socket
 import ssl
 import sys
@@ -39,6 +40,9 @@ from quantum.common import exceptions as exception
 from quantum import context
 from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
+from quantum.openstack.common import rpc
+from quantum.openstack.common.rpc import amqp as rpc_amqp
+from quantum.openstack.common import service as common_service
 
 socket_opts = [
     cfg.IntOpt('backlog',
@@ -81,12 +85,53 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Wraps a Server to run it in a worker process."""
+
+    def __init__(self, service, application):
+        self._service = service
+        self._application = application
+        self._server = None
+
+    def start(self):
+        # The RPC connection pool inherited from the parent process is
+        # replaced by an empty one, without closing its connections which
+        # are still used by the parent; the DB connections are dropped on
+        # checkout by quantum.db.api.ForkSafetyListener.
+        self._reset_rpc_connection_pool()
+        signal.signal(signal.SIGHUP, self._handle_sighup)
+        self._server = self._service.pool.spawn(self._service._run,
+                                                self._application,
+                                                self._service._socket)
+
+    @staticmethod
+    def _reset_rpc_connection_pool():
+        connection_cls = getattr(rpc._get_impl(), 'Connection', None)
+        if getattr(connection_cls, 'pool', None):
+            connection_cls.pool = rpc_amqp.Pool(cfg.CONF, connection_cls)
+
+    def _handle_sighup(self, signo, frame):
+        # Stop accepting connections; the worker exits once the requests
+        # in progress are served, and the parent process restarts it.
+        eventlet.spawn_n(self.stop)
+
+    def wait(self):
+        self._service.pool.waitall()
+
+    def stop(self):
+        if self._server:
+            self._server.kill()
+            self._server = None
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
     def __init__(self, name, threads=1000):
         self.pool = eventlet.GreenPool(threads)
         self.name = name
+        self._launcher = None
+        self._server = None
 
     def _get_socket(self, host, port, backlog):
         bind_addr = (host, port)
@@ -165,8 +210,13 @@ class Server(object):
 
         return sock
 
-    def start(self, application, port, host='0.0.0.0'):
-        """Run a WSGI server with the given application."""
+    def start(self, application, port, host='0.0.0.0', workers=0):
+        """Run a WSGI server with the given application.
+
+        With workers > 0, the socket is shared by that many worker
+        processes, which are restarted when they exit. A SIGHUP makes
+        the workers restart once they have served their current requests.
+        """
         self._host = host
         self._port = port
         backlog = CONF.backlog
@@ -174,7 +224,22 @@ class Server(object):
         self._socket = self._get_socket(self._host,
                                         self._port,
                                         backlog=backlog)
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        if workers < 1:
+            self._server = self.pool.spawn(self._run, application,
+                                           self._socket)
+        else:
+            self._launcher = common_service.ProcessLauncher()
+            signal.signal(signal.SIGHUP, self._restart_workers)
+            self._launcher.launch_service(
+                WorkerService(self, application), workers=workers)
+
+    def _restart_workers(self, signo, frame):
+        for pid in self._launcher.children:
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except OSError as exc:
+                if exc.errno != errno.ESRCH:
+                    raise
 
     @property
     def host(self):
@@ -185,12 +250,19 @@ class Server(object):
         return self._socket.getsockname()[1] if self._socket else self._port
 
     def stop(self):
-        self._server.kill()
+        if self._launcher:
+            # the workers are stopped by ProcessLauncher.wait()
+            self._launcher.running = False
+        else:
+            self._server.kill()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if self._launcher:
+                self._launcher.wait()
+            else:
+                self.pool.waitall()
         except KeyboardInterrupt:
             pass
 
@@ -0,0 +1,113 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the IPAM backends allocating addresses on a single /16.
+
+usage: ipam_benchmark.py [sql_connection] [count ...]
+
+Each run creates a network with a 10.0.0.0/16 subnet and then creates
+count ports concurrently, one green thread per port, through
+QuantumDbPluginV2. The default database is an in-memory sqlite
+database, where the green threads share a single connection and the
+transactions do not overlap; point sql_connection to MySQL to measure
+row lock contention.
+"""
+
+import os
+import sys
+import time
+
+import eventlet
+from oslo.config import cfg
+
+from quantum.api.v2.attributes import ATTR_NOT_SPECIFIED
+from quantum.common import config  # noqa
+from quantum import context
+from quantum.db import api as db
+from quantum.db import db_base_plugin_v2
+from quantum.db import ipam
+
+
+BACKENDS = ['quantum.db.ipam.RangeIpamBackend',
+            'quantum.db.ipam.RandomIpamBackend']
+POOL_SIZE = 100
+
+
+def _create_port(plugin, network_id, failures):
+    try:
+        plugin.create_port(context.get_admin_context(),
+                           {'port': {'tenant_id': 'bench',
+                                     'network_id': network_id,
+                                     'name': '',
+                                     'admin_state_up': True,
+                                     'device_id': '',
+                                     'device_owner': '',
+                                     'mac_address': ATTR_NOT_SPECIFIED,
+                                     'fixed_ips': ATTR_NOT_SPECIFIED}})
+    except Exception:
+        failures.append(sys.exc_info()[1])
+
+
+def run(backend, count):
+    cfg.CONF.set_override('ipam_driver', backend)
+    ipam._backends.clear()
+    db.configure_db()
+    plugin = db_base_plugin_v2.QuantumDbPluginV2()
+    ctx = context.get_admin_context()
+    network = plugin.create_network(
+        ctx, {'network': {'tenant_id': 'bench', 'name': 'bench',
+                          'admin_state_up': True, 'shared': False}})
+    plugin.create_subnet(
+        ctx, {'subnet': {'tenant_id': 'bench', 'name': 'bench',
+                         'network_id': network['id'], 'ip_version': 4,
+                         'cidr': '10.0.0.0/16', 'enable_dhcp': False,
+                         'gateway_ip': ATTR_NOT_SPECIFIED,
+                         'allocation_pools': ATTR_NOT_SPECIFIED,
+                         'dns_nameservers': ATTR_NOT_SPECIFIED,
+                         'host_routes': ATTR_NOT_SPECIFIED}})
+
+    failures = []
+    pool = eventlet.GreenPool(POOL_SIZE)
+    start = time.time()
+    for i in xrange(count):
+        pool.spawn_n(_create_port, plugin, network['id'], failures)
+    pool.waitall()
+    elapsed = time.time() - start
+    db.clear_db()
+    return elapsed, len(failures)
+
+
+def main():
+    args = sys.argv[1:]
+    sql_connection = args and not args[0].isdigit() and args.pop(0)
+    cfg.CONF(args=[], project='quantum')
+    cfg.CONF.set_override('sql_connection',
+                          sql_connection or 'sqlite://',
+                          'DATABASE')
+    cfg.CONF.set_override('policy_file',
+                          os.path.join(os.path.dirname(__file__), os.pardir,
+                                       'etc', 'policy.json'))
+    for count in [int(arg) for arg in args] or [1000, 10000]:
+        for backend in BACKENDS:
+            elapsed, failures = run(backend, count)
+            print('%-40s %6d ports %8.2fs %6.1f ports/s %d failures' %
+                  (backend.rsplit('.', 1)[1], count, elapsed,
+                   count / elapsed, failures))
+
+
+if __name__ == '__main__':
+    main()